@@ -1,6 +1,9 @@
 #!/usr/bin/env python
 
 from medgen.api import *
+from medgen.log import log_to_console
+
+log_to_console()
 
 _EOL = '\r\n'
 
@@ -1,6 +1,8 @@
 # from __future__ import absolute_import
 ##########################################################################################
+from ..log       import log
 from ..db.medgen import MedGenDB
+from ..db.shared import shared, lazy_method
 
 ##########################################################################################
 #
@@ -26,27 +28,31 @@ def _define_medgen_concept(cui):
     http://www.ncbi.nlm.nih.gov/books/NBK159970/#_MedGen_Data_Model_
 
     :param cui: UMLS unique concept id
-    :return: Definition string
+    :return: dict CUI, DEF, SAB and url, or None if the concept has no definition
     """
-    try:
-        concept_def = MedGenDB().concept_definition(cui)
-        concept_def['url'] = _medgen_url(cui)
-
-        return concept_def
-    except:
+    concept_def = shared(MedGenDB).concept_definition(cui, fields=('CUI', 'DEF', 'SAB'))
+    if concept_def is None:
+        log.debug('no MedGen definition for %s' % cui)
         return None
 
+    concept_def = dict(concept_def)
+    concept_def['url'] = _medgen_url(cui)
+    return concept_def
+
 ##########################################################################################
 #
 #       API
 #
 ##########################################################################################
 
-ConceptName = MedGenDB().concept_name
+ConceptName = lazy_method(MedGenDB, 'concept_name')
 ConceptDefinition  = _define_medgen_concept
-ConceptRelations   = MedGenDB().concept_relations
-ConceptSources     = MedGenDB().concept_sources
+ConceptRelations   = lazy_method(MedGenDB, 'concept_relations')
+ConceptSources     = lazy_method(MedGenDB, 'concept_sources')
+ConceptNeighbors   = lazy_method(MedGenDB, 'concept_neighbors')
+RelatedConcepts    = lazy_method(MedGenDB, 'related_concepts')
 ConceptURL         = _medgen_url
+Concepts           = lazy_method(MedGenDB, 'concepts_many')
 
 # ALIAS
 Define  = ConceptDefinition
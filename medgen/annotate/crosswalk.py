@@ -0,0 +1,13 @@
+# from __future__ import absolute_import
+##########################################################################################
+from ..db.crosswalk import IdentifierCrosswalk
+from ..db.shared    import lazy_method
+
+
+##########################################################################################
+#
+#       API
+#
+##########################################################################################
+
+Crosswalk = lazy_method(IdentifierCrosswalk, 'convert')
@@ -3,6 +3,7 @@
 from ..db.medgen     import MedGenDB
 from ..db.clinvar    import ClinVarDB
 from ..parse.concept import Concept
+from ..db.shared     import lazy_method
 
 
 ##########################################################################################
@@ -11,6 +12,10 @@ from ..parse.concept import Concept
 #
 ##########################################################################################
 
-DiseaseName     = ClinVarDB().disease_name
-DiseaseSubtypes = MedGenDB().disease_subtypes
-DiseaseParents  = MedGenDB().disease_parents
\ No newline at end of file
+DiseaseName     = lazy_method(ClinVarDB, 'disease_name')
+DiseaseSubtypes = lazy_method(MedGenDB, 'disease_subtypes')
+DiseaseParents  = lazy_method(MedGenDB, 'disease_parents')
+
+DiseaseAncestors       = lazy_method(MedGenDB, 'disease_ancestors')
+DiseaseDescendants     = lazy_method(MedGenDB, 'disease_descendants')
+DiseaseCommonAncestors = lazy_method(MedGenDB, 'disease_common_ancestors')
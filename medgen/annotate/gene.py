@@ -1,11 +1,15 @@
 # from __future__ import absolute_import
 ##########################################################################################
+import threading
+from copy import copy
 from collections import OrderedDict
 
 from ..log        import log
 from ..db.gene    import GeneDB
 from ..db.hugo    import HugoDB
 from ..db.clinvar import ClinVarDB
+from ..db.shared  import shared, lazy_method
+from ..parse.gene import Gene
 
 ##########################################################################################
 #
@@ -13,40 +17,46 @@ from ..db.clinvar import ClinVarDB
 #
 ##########################################################################################
 
-def _gene_locus_databases(gene):
+def _parse_locus_databases(gene, row):
     """
-    Get Locus Specific Databases for Gene
     :param gene: hugo gene name
-    :return: array of LSDBs from Hugo Gene, the official source of gene names.
+    :param row: hugo_info row with LocusSpecificDatabases and pubmeds
+    :return: OrderedDict Gene, LocusSpecificDatabases (name -> url) and pubmeds
     """
-    try:
-        row = HugoDB().get_locus_specific_databases(gene)
+    parsed = OrderedDict()
+    parsed['Gene'] = str(gene)
 
-        parsed = OrderedDict()
-        parsed['Gene'] = str(gene)
+    dbs  = OrderedDict()
+    text = row['LocusSpecificDatabases']
 
-        dbs  = OrderedDict()
-        text = row['LocusSpecificDatabases']
+    if text is not None and len(text) > 1:
+        for csv in text.split(','):
+            (name, url) = csv.split('|')
+            dbs[name] = url
 
-        if text is not None and len(text) > 1:
-            for csv in text.split(','):
-                (name, url) = csv.split('|')
-                dbs[name] = url
+    parsed['LocusSpecificDatabases'] = dbs
 
-        parsed['LocusSpecificDatabases'] = dbs
+    pubmds = []
+    text = row['pubmeds']
 
-        pubmds = []
-        text = row['pubmeds']
+    if text is not None and len(text) > 0:
+        for pmid in text.split(','):
+            pmid = pmid.strip(' ')
+            pubmds.append(str(pmid)) # @TODO: MetaPub?
+            #pubmds.append(PubMed(pmid)) # @TODO: MetaPub?
 
-        if text is not None and len(text) > 0:
-            for pmid in text.split(','):
-                pmid = pmid.strip(' ')
-                pubmds.append(str(pmid)) # @TODO: MetaPub?
-                #pubmds.append(PubMed(pmid)) # @TODO: MetaPub?
+        parsed['pubmeds'] = pubmds
 
-            parsed['pubmeds'] = pubmds
+    return parsed
 
-        return parsed
+def _gene_locus_databases(gene):
+    """
+    Get Locus Specific Databases for Gene
+    :param gene: hugo gene name
+    :return: array of LSDBs from Hugo Gene, the official source of gene names.
+    """
+    try:
+        return _parse_locus_databases(gene, shared(HugoDB).get_locus_specific_databases(gene))
     except Exception as e:
         msg = 'Failed to fetch LocusSpecificDatabases for gene_symbol'
         log.error(msg)
@@ -64,7 +74,7 @@ def _gene_synonyms(gene):
        log.warn('Could not get HGNC GeneName synonyms' )
        return None
     else:
-       aliases = GeneDB().get_gene_synonyms(gene)
+       aliases = shared(GeneDB).get_gene_synonyms(gene)
 
        if (aliases is None) or (len(aliases) < 1):
            raise Exception('could not retrieve gene SYNONYMS for '+gene)
@@ -89,7 +99,7 @@ def _gene_preferred(gene):
     if gene is None:
        return None
     else:
-       aliases = GeneDB().get_gene_synonyms(gene)
+       aliases = shared(GeneDB).get_gene_synonyms(gene)
 
        if (aliases is None) or (len(aliases) < 1):
            raise Exception('could not retrieve PREFERRED gene name for '+gene)
@@ -99,23 +109,129 @@ def _gene_preferred(gene):
 
     return sorted(prefered)
 
+##########################################################################################
+#
+#       Gene panels
+#
+##########################################################################################
+
+def _gene_ids(genes):
+    return [gene.id for gene in genes]
+
+def _panel_info(genes):
+    return shared(GeneDB).get_gene_info_many(_gene_ids(genes))
+
+def _panel_synonyms(genes):
+    synonyms = {}
+    for gene_id, row in shared(GeneDB).get_gene_info_many(_gene_ids(genes), fields=('Symbol', 'Synonyms')).items():
+        if row is not None:
+            names = set([row['Symbol']] + (row['Synonyms'] or '').split('|'))
+            synonyms[gene_id] = sorted(name for name in names if name and name != '-')
+    return synonyms
+
+def _panel_locus_databases(genes):
+    rows = shared(HugoDB).get_locus_specific_databases_many(gene.name for gene in genes if gene.name)
+    return dict((gene.id, _parse_locus_databases(gene.name, rows[str(gene.name)]))
+                for gene in genes if rows.get(str(gene.name)) is not None)
+
+def _panel_clinical_significance(genes):
+    return shared(ClinVarDB).gene_to_clinical_significance_type_frequency_many(_gene_ids(genes))
+
+# facet -> (dataset, function(resolved genes) -> dict GeneID -> annotation, value for genes without one)
+GENE_PANEL_FACETS = OrderedDict([
+    ('info',                  ('gene',    _panel_info, None)),
+    ('synonyms',              ('gene',    _panel_synonyms, [])),
+    ('pubmed',                ('gene',    lambda genes: shared(GeneDB).gene2pubmed_many(_gene_ids(genes)), [])),
+    ('mim',                   ('gene',    lambda genes: shared(GeneDB).gene2mim_many(_gene_ids(genes)), [])),
+    ('function',              ('gene',    lambda genes: shared(GeneDB).gene_function_many(_gene_ids(genes)), [])),
+    ('locus_db',              ('hugo',    _panel_locus_databases, None)),
+    ('conditions',            ('clinvar', lambda genes: shared(ClinVarDB).gene2condition_many(_gene_ids(genes)), [])),
+    ('clinical_significance', ('clinvar', _panel_clinical_significance, [])),
+])
+
+def annotate_gene_panel(genes, facets=None):
+    """
+    Annotate a gene panel in bulk: the genes are resolved once, each facet is one batched
+    query for all genes, and the facets of different datasets (gene, hugo, clinvar) run
+    concurrently, one thread per dataset.
+
+    Facets and the per-gene call they batch:
+        info (GeneInfo), synonyms (GeneSynonyms, from gene_info Symbol and Synonyms),
+        pubmed (Gene2PubMed), mim (Gene2MIM), function (Gene2Function), locus_db (Gene2LocusDB),
+        conditions (Gene2ConditionSource), clinical_significance (Gene2ClinicalSignificance)
+
+        panel = annotate_gene_panel(['BRCA1', 'BRCA2', 4292], facets=['info', 'clinical_significance'])
+        panel['BRCA1']['clinical_significance']
+
+    :param genes: Entrez GeneIDs and/or HGNC gene names
+    :param facets: facet names (default all of GENE_PANEL_FACETS)
+    :return: OrderedDict gene -> dict GeneID, Symbol and one entry per facet, in input order
+    """
+    facets = list(facets or GENE_PANEL_FACETS)
+    unknown = [facet for facet in facets if facet not in GENE_PANEL_FACETS]
+    if unknown:
+        raise ValueError('unknown gene panel facets: %s' % ', '.join(unknown))
+
+    genes = list(genes)
+    resolved = Gene.resolve_many(genes)
+    known = [gene for gene in resolved if gene.id is not None]
+
+    datasets = OrderedDict()
+    for facet in facets:
+        datasets.setdefault(GENE_PANEL_FACETS[facet][0], []).append(facet)
+
+    found = {}
+    errors = []
+
+    def annotate(dataset_facets):
+        for facet in dataset_facets:
+            try:
+                found[facet] = GENE_PANEL_FACETS[facet][1](known) if known else {}
+            except Exception as e:
+                log.error('gene panel facet %s failed: %s' % (facet, e))
+                errors.append(e)
+                return
+
+    threads = [threading.Thread(target=annotate, args=(dataset_facets,), name='medgen-panel-%s' % dataset)
+               for dataset, dataset_facets in datasets.items()]
+    for thread in threads[1:]:
+        thread.start()
+    if threads:
+        annotate(datasets.values()[0])
+    for thread in threads[1:]:
+        thread.join()
+    if errors:
+        raise errors[0]
+
+    panel = OrderedDict()
+    for gene, resolved_gene in zip(genes, resolved):
+        annotations = {'GeneID': resolved_gene.id, 'Symbol': resolved_gene.name}
+        for facet in facets:
+            annotations[facet] = found[facet].get(resolved_gene.id, copy(GENE_PANEL_FACETS[facet][2]))
+        panel[gene] = annotations
+    return panel
+
 ##########################################################################################
 #
 #       API
 #
 ##########################################################################################
 
-Gene2PubMed      = GeneDB().gene2pubmed
-Gene2Function    = GeneDB().gene_function
+Gene2PubMed      = lazy_method(GeneDB, 'gene2pubmed')
+Gene2Function    = lazy_method(GeneDB, 'gene_function')
 Gene2LocusDB     = _gene_locus_databases
 
-Gene2MIM                  = GeneDB().gene2mim
-Gene2ConditionSource      = ClinVarDB().gene2condition
-Gene2ClinicalSignificance = ClinVarDB().gene_to_clinical_significance_type_frequency
+Gene2MIM                  = lazy_method(GeneDB, 'gene2mim')
+Gene2ConditionSource      = lazy_method(ClinVarDB, 'gene2condition')
+Gene2ClinicalSignificance = lazy_method(ClinVarDB, 'gene_to_clinical_significance_type_frequency')
+Gene2ClinicalSignificanceMany = lazy_method(ClinVarDB, 'gene_to_clinical_significance_type_frequency_many')
+GenesWithClinicalSignificance = lazy_method(ClinVarDB, 'genes_with_clinical_significance')
+
+GenePanel = annotate_gene_panel
 
-GeneInfo          = GeneDB().get_gene_info
-GeneID            = GeneDB().get_gene_id
-GeneName          = GeneDB().get_gene_name
+GeneInfo          = lazy_method(GeneDB, 'get_gene_info')
+GeneID            = lazy_method(GeneDB, 'get_gene_id')
+GeneName          = lazy_method(GeneDB, 'get_gene_name')
 GeneSynonyms      = _gene_synonyms
 GeneNamePreferred = _gene_preferred
 
@@ -1,7 +1,9 @@
 # from __future__ import absolute_import
 
-import requests, json, urllib
+import json
 from ..db.clinvar import ClinVarDB
+from ..db.pubmed  import PubMedDB
+from ..db.shared  import shared
 from ..log import log, IS_DEBUG_ENABLED
 
 ##########################################################################################
@@ -9,7 +11,6 @@ from ..log import log, IS_DEBUG_ENABLED
 #   Functions
 #
 ##########################################################################################
-from medgen.annotate.pubmed import PMCID2Article
 
 
 def _ncbi_variant_report_service(hgvs_text):
@@ -20,6 +21,8 @@ def _ncbi_variant_report_service(hgvs_text):
     :param hgvs_text: ( c.DNA | r.RNA | p.Protein | g.Genomic )
     :return: JSON (dictionary)
     """
+    import urllib
+    import requests
     #r = requests.post("http://www.ncbi.nlm.nih.gov/projects/SNP/VariantAnalyzer/var_rep.cgi", data={"annot1": hgvs_text})
     hgvs_text = str(hgvs_text)
     r = requests.get("http://www.ncbi.nlm.nih.gov/projects/SNP/VariantAnalyzer/var_rep.cgi?annot1={}".format(urllib.quote(hgvs_text)))
@@ -94,9 +97,9 @@ def _clinvar_variant_accession(hgvs_text):
     :return: RCVAccession "Reference ClinVar Accession"
     """
     try:
-        return ClinVarDB().accession_for_hgvs_text(str(hgvs_text))
+        return shared(ClinVarDB).accession_for_hgvs_text(str(hgvs_text))
     except Exception, e:
-        log.debug("no clinvar accession for variant hgvs_text %s " % hgvs_text)
+        log.warn('clinvar accession lookup failed for %s: %s' % (hgvs_text, e))
 
 def _clinvar_variant_allele_id(hgvs_text):
     """
@@ -105,9 +108,9 @@ def _clinvar_variant_allele_id(hgvs_text):
     :return: AlleleID
     """
     try:
-        return ClinVarDB().allele_id_for_hgvs_text(hgvs_text)
+        return shared(ClinVarDB).allele_id_for_hgvs_text(hgvs_text)
     except Exception, e:
-        log.debug('no clinvar AlleleID for variant hgvs_text %s ' % hgvs_text)
+        log.warn('clinvar AlleleID lookup failed for %s: %s' % (hgvs_text, e))
 
 def _clinvar_variant_variation_id(hgvs_text):
     """
@@ -116,45 +119,40 @@ def _clinvar_variant_variation_id(hgvs_text):
     :return: VariationID
     """
     try:
-        return ClinVarDB().variation_id_for_hgvs_text(hgvs_text)
+        return shared(ClinVarDB).variation_id_for_hgvs_text(hgvs_text)
     except Exception, e:
-        log.debug('no clinvar VariationID for variant hgvs_text %s ' % hgvs_text)
+        log.warn('clinvar VariationID lookup failed for %s: %s' % (hgvs_text, e))
+
+def _citation_pmids(citations):
+    """
+    PMIDs of ClinVar citations: PubMed citation_ids as they are, PubMedCentral ones converted
+    in one batch (see PubMedDB.pmcid_to_pmid).
+    :param citations: var_citations rows
+    :return: list of PMID (int) or None, one per citation
+    """
+    pmcids = [cite['citation_id'] for cite in citations if cite['citation_source'] != 'PubMed']
+    converted = {}
+    if pmcids:
+        log.debug('found %d PubMedCentral PMCIDs, converting to PMID' % len(pmcids))
+        converted = shared(PubMedDB).pmcid_to_pmid(pmcids)
+    return [int(cite['citation_id']) if cite['citation_source'] == 'PubMed' else converted.get(cite['citation_id'])
+            for cite in citations]
 
 def _clinvar_variant2pubmed(hgvs_text):
     """
     Get PMID for clinvar variants using the AlleleID key.
     If the citation_source is PubMedCentral, first convert responses to PMID.
     :param hgvs_text: c.DNA
-    :return: list(PMID)
+    :return: set(PMID)
     """
-    pubmeds = []
-    citations = ClinVarDB().var_citations(hgvs_text)
-    if citations:
-        for cite in citations:
-            pmid = cite['citation_id']
-
-            if cite['citation_source'] == 'PubMed':
-                pubmeds.append(pmid)
-            else:
-                log.debug('found PubMedCentral PMCID, converting to PMID %s ' % str(pmid))
-                article = PMCID2Article(pmid)
-
-                if article is not None:
-                    pubmeds.append(int(article.pmid))
-
-    return set([int(entry) for entry in pubmeds])
+    citations = shared(ClinVarDB).var_citations(hgvs_text) or []
+    return set(pmid for pmid in _citation_pmids(citations) if pmid)
 
 
 def clinvar2pmid_with_accessions(hgvs_list):
-    ret = []
-    citations = ClinVarDB().var_citations(hgvs_list)
-    if citations:
-        for cite in citations:
-            article_id = cite['citation_id']
-            pmid = article_id if cite['citation_source'] == 'PubMed' else PMCID2Article(article_id).pmid
-            if pmid:
-                ret.append({"hgvs_text": cite['hgvs_text'], "pmid": pmid, "accession": cite['RCVaccession']})
-    return ret
+    citations = shared(ClinVarDB).var_citations(hgvs_list) or []
+    return [{"hgvs_text": cite['hgvs_text'], "pmid": pmid, "accession": cite['RCVaccession']}
+            for cite, pmid in zip(citations, _citation_pmids(citations)) if pmid]
 
 
 ##########################################################################################
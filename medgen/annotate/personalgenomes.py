@@ -1,6 +1,7 @@
 # from __future__ import absolute_import
 ##########################################################################################
 from ..db.personalgenomes import PersonalGenomesDB
+from ..db.shared import shared
 
 ##########################################################################################
 #
@@ -9,7 +10,7 @@ from ..db.personalgenomes import PersonalGenomesDB
 ##########################################################################################
 
 def _variant_to_bionotate(gene, amino_acid_position):
-    return PersonalGenomesDB().bionotate__gene_aa_pos(gene, amino_acid_position)
+    return shared(PersonalGenomesDB).bionotate__gene_aa_pos(gene, amino_acid_position)
 
 ##########################################################################################
 #
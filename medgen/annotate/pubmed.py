@@ -1,10 +1,10 @@
 #### common
 # from __future__ import absolute_import
 from collections import OrderedDict
+from ..db.pubmed import PubMedDB
+from ..db.shared import lazy_method
 
-#### metapub
-from metapub import PubMedFetcher, PubMedArticle
-from medgen.db.medgen import MedGenDB
+#### metapub is imported on first use: it is slow to import and only needed for eutils lookups
 
 ##########################################################################################
 #
@@ -19,6 +19,7 @@ def _pubmed_pmid_to_article(pmid):
     :param pmid: int or str
     :return: PubMedArticle
     """
+    from metapub import PubMedFetcher
     return PubMedFetcher('eutils').article_by_pmid(str(pmid))
 
 def _pubmed_central_pmcid_to_article(pmcid):
@@ -29,6 +30,7 @@ def _pubmed_central_pmcid_to_article(pmcid):
     :param pmcid:
     :return: PubMedArticle
     """
+    from metapub import PubMedFetcher
     return PubMedFetcher('eutils').article_by_pmcid(str(pmcid))
 
 ##########################################################################################
@@ -37,4 +39,5 @@ def _pubmed_central_pmcid_to_article(pmcid):
 #
 ##########################################################################################
 PMID2Article = _pubmed_pmid_to_article
-PMCID2Article = _pubmed_central_pmcid_to_article
\ No newline at end of file
+PMCID2Article = _pubmed_central_pmcid_to_article
+PMCID2PMID = lazy_method(PubMedDB, 'pmcid_to_pmid')
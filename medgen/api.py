@@ -26,10 +26,15 @@ from .annotate.gene    import GeneID, GeneName
 from .annotate.gene    import GeneInfo,    GeneSynonyms, GeneNamePreferred
 from .annotate.gene    import Gene2PubMed, Gene2LocusDB, Gene2Function
 from .annotate.gene    import Gene2MIM,    Gene2ConditionSource, Gene2ClinicalSignificance
+from .annotate.gene    import Gene2ClinicalSignificanceMany, GenesWithClinicalSignificance, GenePanel
 
 from .annotate.disease import DiseaseName, DiseaseParents, DiseaseSubtypes
+from .annotate.disease import DiseaseAncestors, DiseaseDescendants, DiseaseCommonAncestors
 from .annotate.concept import ConceptName, ConceptDefinition, ConceptRelations, ConceptSources, Define, Relate
+from .annotate.concept import ConceptNeighbors, RelatedConcepts, Concepts
 
-from .annotate.pubmed import PMCID2Article, PMID2Article
+from .annotate.crosswalk import Crosswalk
+
+from .annotate.pubmed import PMCID2Article, PMID2Article, PMCID2PMID
 
 ##########################################################################
@@ -17,16 +17,29 @@ CFGDIR = os.getenv('MEDGEN_CONFIG_DIR', default_config_dir)
 ENV = os.getenv('MEDGEN_ENV', 'default')
 
 
-log.info("MedGen Configuration Settings: ")
-log.info("CFGDIR: %s" % CFGDIR)
-log.info("ENV: %s" % ENV)
-
-
 def _get_config(dirname=CFGDIR, env=ENV):
+    log.info("MedGen Configuration Settings: ")
+    log.info("CFGDIR: %s" % dirname)
+    log.info("ENV: %s" % env)
+
     config = ConfigParser.ConfigParser()
     configs = [os.path.join(dirname, x) for x in os.listdir(dirname) if x.find(env) > -1]
     config.read(configs)
     return config
 
-config = _get_config()
+
+class _LazyConfig(object):
+    """
+    Stands in for the ConfigParser: config files are listed and read on first access,
+    so importing medgen does not touch the filesystem.
+    """
+    def __init__(self):
+        self._config = None
+
+    def __getattr__(self, name):
+        if self._config is None:
+            self._config = _get_config()
+        return getattr(self._config, name)
+
+config = _LazyConfig()
 
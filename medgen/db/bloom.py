@@ -0,0 +1,196 @@
+from __future__ import absolute_import
+
+import os
+import math
+import struct
+import hashlib
+import threading
+
+from ..log import log
+from .epoch import dataset_epoch, on_epoch_change
+
+##########################################################################################
+#
+#       Bloom filter
+#
+##########################################################################################
+
+_TWO_U64 = struct.Struct('<QQ')
+
+def fold_key(value):
+    """
+    Filter key: upper case utf-8, like the case insensitive collation of the filtered columns.
+    """
+    if isinstance(value, unicode):
+        value = value.encode('utf-8')
+    return str(value).upper()
+
+class BloomFilter(object):
+    """
+    Bit array answering "definitely absent" or "maybe present" for a set of keys,
+    with a false positive rate of error_rate at capacity keys. Absent keys never test present.
+    """
+    def __init__(self, capacity, error_rate=0.01):
+        """
+        :param capacity: number of keys the filter is sized for
+        :param error_rate: false positive rate at capacity
+        """
+        capacity = max(int(capacity), 1)
+        self.bits = max(int(math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2)), 8)
+        self.hashes = max(int(round(self.bits / float(capacity) * math.log(2))), 1)
+        self.count = 0
+        self._array = bytearray((self.bits + 7) // 8)
+
+    def _positions(self, key):
+        # double hashing: k positions from the two halves of one md5 digest
+        first, second = _TWO_U64.unpack(hashlib.md5(key).digest())
+        bits = self.bits
+        return [(first + i * second) % bits for i in range(self.hashes)]
+
+    def add(self, key):
+        """
+        :param key: str, see fold_key
+        """
+        array = self._array
+        for position in self._positions(key):
+            array[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+
+    def __contains__(self, key):
+        array = self._array
+        for position in self._positions(key):
+            if not array[position >> 3] & (1 << (position & 7)):
+                return False
+        return True
+
+    def size(self):
+        """
+        :return: bytes used by the bit array
+        """
+        return len(self._array)
+
+
+class KeyFilter(object):
+    """
+    Bloom filter over one lookup column of a dataset, built at a given load epoch.
+    """
+    def __init__(self, bloom, epoch):
+        self.bloom = bloom
+        self.epoch = epoch
+
+    def might_contain(self, value):
+        """
+        :return: False if value is definitely not in the column
+        """
+        return fold_key(value) in self.bloom
+
+def build_key_filter(db, keys, epoch=None, error_rate=0.01):
+    """
+    :param db: SQLData to read the keys from
+    :param keys: function(db) -> iterable of column values (None is skipped)
+    :param epoch: dataset epoch the keys are read at
+    :param error_rate: false positive rate
+    :return: KeyFilter
+    """
+    values = set(fold_key(value) for value in keys(db) if value is not None)
+    bloom = BloomFilter(len(values), error_rate)
+    for value in values:
+        bloom.add(value)
+    return KeyFilter(bloom, epoch)
+
+##########################################################################################
+#
+#       Filters per dataset, rebuilt after a reload
+#
+##########################################################################################
+
+_filters = {}
+_builds = {}
+_filters_lock = threading.Lock()
+
+def _enabled(db):
+    from .dataset import config_option
+    return config_option(db._cfg_section, 'bloom_filters', 'false').lower() in ('true', 'yes', 'on', '1')
+
+def _build(key, db, keys, epoch, error_rate):
+    try:
+        key_filter = build_key_filter(db, keys, epoch, error_rate)
+    except Exception as e:
+        log.warn('could not build %s filter for %s: %s' % (key[3], key[2], e))
+    else:
+        with _filters_lock:
+            _filters[key] = key_filter
+        log.info('built %s filter for %s: %d keys, %d bytes' % (key[3], key[2], key_filter.bloom.count,
+                                                                key_filter.bloom.size()))
+    finally:
+        with _filters_lock:
+            _builds.pop(key, None)
+
+def get_key_filter(db, name, keys, wait=False):
+    """
+    Bloom filter named name over db's dataset, enabled with "bloom_filters: true".
+    The first call, and the first call after the dataset is reloaded, start a background
+    build; until it finishes there is no filter and callers query the database as usual.
+
+    :param db: SQLData
+    :param name: filter name, like 'clinvar_hgvs'
+    :param keys: function(db) -> iterable of the column values to filter on
+    :param wait: build in this thread instead of the background
+    :return: KeyFilter for the current epoch, or None
+    """
+    if not _enabled(db):
+        return None
+    key = (db._db_host, db._db_port, db._db_name, name)
+    epoch = dataset_epoch(db)
+    key_filter = _filters.get(key)
+    if key_filter is not None and key_filter.epoch == epoch:
+        return key_filter
+
+    from .dataset import config_option
+    error_rate = float(config_option(db._cfg_section, 'bloom_error_rate', 0.01))
+    if wait:
+        _build(key, db, keys, epoch, error_rate)
+    else:
+        with _filters_lock:
+            build = _builds.get(key)
+            # a build started before fork() is not running in this process
+            if build is not None and build[1] == os.getpid() and build[0].is_alive():
+                return None
+            thread = threading.Thread(target=_build, args=(key, db, keys, epoch, error_rate),
+                                      name='medgen-filter-%s' % name)
+            thread.daemon = True
+            _builds[key] = (thread, os.getpid())
+        thread.start()
+        return None
+
+    key_filter = _filters.get(key)
+    return key_filter if key_filter is not None and key_filter.epoch == epoch else None
+
+def maybe_present(db, name, keys, values):
+    """
+    values that may be in the filtered column: the definite misses are dropped,
+    so callers only query the database for the rest.
+
+    :param values: lookup values
+    :return: list of values (all of them when there is no filter)
+    """
+    key_filter = get_key_filter(db, name, keys)
+    if key_filter is None:
+        return list(values)
+    return [value for value in values if key_filter.might_contain(value)]
+
+@on_epoch_change
+def _drop_filters(key, old_epoch, new_epoch):
+    with _filters_lock:
+        for filter_key in list(_filters):
+            if filter_key[:3] == key:
+                del _filters[filter_key]
+
+def filter_stats():
+    """
+    :return: dict of 'dataset.name' to keys and bytes of each built filter
+    """
+    with _filters_lock:
+        filters = list(_filters.items())
+    return dict(('%s.%s' % (key[2], key[3]), {'keys': key_filter.bloom.count, 'bytes': key_filter.bloom.size()})
+                for key, key_filter in filters)
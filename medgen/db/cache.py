@@ -0,0 +1,235 @@
+from __future__ import absolute_import
+
+import sys
+import time
+import functools
+import threading
+from collections import OrderedDict
+
+from ..log import log
+from .diskcache import get_disk_cache, disk_caches
+from .epoch import dataset_epoch, on_epoch_change
+
+##########################################################################################
+#
+#       LRU + TTL cache
+#
+##########################################################################################
+
+class LRUCache(object):
+    """
+    Thread safe least-recently-used cache with time-to-live expiry.
+
+    Bounded by number of entries and optionally by approximate size in bytes.
+    Empty results (None, [], {}) are cached as negative entries with their own, usually shorter, TTL.
+    Cached values are shared between callers and must not be modified.
+    """
+    def __init__(self, name, max_entries=10000, max_bytes=0, ttl=3600, negative_ttl=300):
+        """
+        :param name: name reported in stats, like 'gene.GeneDB.gene2pubmed'
+        :param max_entries: maximum number of entries (0: unbounded)
+        :param max_bytes: maximum approximate size of cached values (0: unbounded)
+        :param ttl: seconds a result stays valid (0: forever)
+        :param negative_ttl: seconds an empty result stays valid (0: not cached)
+        """
+        self.name = name
+        self.max_entries = int(max_entries)
+        self.max_bytes = int(max_bytes)
+        self.ttl = float(ttl)
+        self.negative_ttl = float(negative_ttl)
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._stats = {'hits': 0, 'misses': 0, 'negative_hits': 0, 'evictions': 0, 'expired': 0}
+
+    def get(self, key):
+        """
+        :return: (found, value)
+        """
+        with self._lock:
+            entry = self._entries.pop(key, None)
+            if entry is None:
+                self._stats['misses'] += 1
+                return False, None
+            value, expires, negative, size = entry
+            if expires and expires < time.time():
+                self._bytes -= size
+                self._stats['expired'] += 1
+                self._stats['misses'] += 1
+                return False, None
+            self._entries[key] = entry
+            self._stats['negative_hits' if negative else 'hits'] += 1
+            return True, value
+
+    def set(self, key, value):
+        negative = is_empty(value)
+        ttl = self.negative_ttl if negative else self.ttl
+        if negative and not ttl:
+            return
+        size = approx_size(value) if self.max_bytes else 0
+        if self.max_bytes and size > self.max_bytes:
+            return
+
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._bytes -= old[3]
+            self._entries[key] = (value, time.time() + ttl if ttl else 0, negative, size)
+            self._bytes += size
+            while self._entries and ((self.max_entries and len(self._entries) > self.max_entries) or
+                                     (self.max_bytes and self._bytes > self.max_bytes)):
+                _, evicted = self._entries.popitem(last=False)
+                self._bytes -= evicted[3]
+                self._stats['evictions'] += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def stats(self):
+        """
+        :return: dict hits, negative_hits, misses, evictions, expired, entries, bytes
+        """
+        with self._lock:
+            stats = dict(self._stats)
+            stats['entries'] = len(self._entries)
+            stats['bytes'] = self._bytes
+        return stats
+
+
+def is_empty(value):
+    return value is None or (isinstance(value, (list, tuple, dict, set)) and len(value) == 0)
+
+def approx_size(value):
+    """
+    Approximate memory footprint of query results: rows, lists of rows, strings and numbers.
+    """
+    if isinstance(value, dict):
+        return sys.getsizeof(value) + sum(approx_size(k) + approx_size(v) for k, v in value.items())
+    if isinstance(value, (list, tuple, set)):
+        return sys.getsizeof(value) + sum(approx_size(v) for v in value)
+    return sys.getsizeof(value)
+
+##########################################################################################
+#
+#       Memoization of SQLData read methods
+#
+##########################################################################################
+
+_caches = {}
+_caches_lock = threading.Lock()
+
+def _cache_for(db, name):
+    """
+    One cache per database (host, port, dataset) and method, shared by every instance.
+    Limits are read from the db's config section: cache_max_entries, cache_max_bytes, cache_ttl, cache_negative_ttl.
+    """
+    key = (db._db_host, db._db_port, db._db_name, name)
+    cache = _caches.get(key)
+    if cache is None:
+        from .dataset import config_option
+        section = db._cfg_section
+        with _caches_lock:
+            cache = _caches.get(key)
+            if cache is None:
+                cache = _caches[key] = LRUCache('%s.%s' % (db._db_name, name),
+                                                max_entries=config_option(section, 'cache_max_entries', 10000),
+                                                max_bytes=config_option(section, 'cache_max_bytes', 0),
+                                                ttl=config_option(section, 'cache_ttl', 3600),
+                                                negative_ttl=config_option(section, 'cache_negative_ttl', 300))
+    return cache
+
+def _disk_ttl(db):
+    from .dataset import config_option
+    return float(config_option(db._cfg_section, 'disk_cache_ttl', 86400))
+
+def cached(func):
+    """
+    Memoize a SQLData read method on its positional and keyword arguments.
+
+        class GeneDB(SQLData):
+            @cached
+            def gene2pubmed(self, ncbi_gene_id):
+                ...
+
+    Results are looked up in the process's LRUCache, then in the host's DiskCache when
+    cache_dir is configured, then in the database. Keys include the dataset's load epoch
+    (medgen.db.epoch); a reload invalidates that dataset's entries in both. While the epoch
+    cannot be read, calls go straight to the database.
+    Calls with unhashable arguments (lists, dicts) go straight to the database.
+    The undecorated method stays available as method.uncached.
+    """
+    @functools.wraps(func)
+    def wrapper(self, *args, **kwargs):
+        key = (args, tuple(sorted(kwargs.items()))) if kwargs else args
+        try:
+            hash(key)
+        except TypeError:
+            return func(self, *args, **kwargs)
+
+        # entries are tagged with the dataset's load epoch, so results fetched before a reload are never served after it.
+        # while the epoch is unknown nothing is cached: such entries could never be invalidated
+        epoch = dataset_epoch(self)
+        if epoch is None:
+            return func(self, *args, **kwargs)
+        key = (epoch, key)
+        name = '%s.%s' % (self.__class__.__name__, func.__name__)
+        cache = _cache_for(self, name)
+        found, value = cache.get(key)
+        if found:
+            return value
+
+        disk = get_disk_cache(self._cfg_section)
+        if disk is not None:
+            signature = (self._db_host, self._db_port, name, key)
+            found, value = disk.get(self._db_name, signature)
+            if found:
+                cache.set(key, value)
+                return value
+
+        value = func(self, *args, **kwargs)
+        cache.set(key, value)
+        if disk is not None:
+            disk.set(self._db_name, signature, value, cache.negative_ttl if is_empty(value) else _disk_ttl(self))
+        return value
+
+    wrapper.uncached = func
+    return wrapper
+
+def cache_stats():
+    """
+    :return: dict of cache name to LRUCache.stats()
+    """
+    with _caches_lock:
+        caches = list(_caches.values())
+    return dict((cache.name, cache.stats()) for cache in caches)
+
+def clear_caches(dataset=None):
+    """
+    Drop cached results, for one dataset (database name) or all of them,
+    from memory and from every disk cache this process has opened.
+    """
+    with _caches_lock:
+        caches = [cache for key, cache in _caches.items() if dataset is None or key[2] == dataset]
+    for cache in caches:
+        cache.clear()
+    for disk in disk_caches():
+        disk.clear(dataset)
+    log.debug('cleared %d caches for %s' % (len(caches), dataset or 'all datasets'))
+
+@on_epoch_change
+def _invalidate(key, old_epoch, new_epoch):
+    """
+    Dataset reloaded: drop its entries, which can no longer be hit anyway, to free memory and disk.
+    """
+    host, port, dataset = key
+    with _caches_lock:
+        caches = [cache for cache_key, cache in _caches.items() if cache_key[:3] == key]
+    for cache in caches:
+        cache.clear()
+    for disk in disk_caches():
+        disk.clear(dataset)
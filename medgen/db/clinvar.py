@@ -1,10 +1,51 @@
 # from __future__ import absolute_import
-
-from .dataset import SQLData
+import os
+
+from .dataset import SQLData, select_fields, config_option
+from .cache import cached
+from .epoch import dataset_epoch
+from .hgvs_index import get_hgvs_index
+from .bloom import maybe_present
+from .significance import get_significance_matrix, have_numpy
 from ..parse.concept import Concept
 from ..parse.gene import Gene
 from ..log import log, IS_DEBUG_ENABLED
 
+CLINVAR_ID_COLUMNS = ['VariationID', 'AlleleID', 'RCVaccession']
+
+def _fold(value):
+    """
+    Key for matching inputs to result rows the way the case insensitive MySQL collation matched them.
+    """
+    return value.upper() if isinstance(value, basestring) else value
+
+def _group_rows(rows, column):
+    """
+    :return: dict folded column value -> list of rows, in result order
+    """
+    groups = {}
+    for row in rows:
+        groups.setdefault(_fold(row[column]), []).append(row)
+    return groups
+
+def _hgvs_text_keys(db):
+    return db.iter_list('select hgvs_text from clinvar_hgvs', 'hgvs_text')
+
+def _variant_summary_keys(db):
+    for hgvs_c, hgvs_p in db.fetch_iter('select HGVS_c, HGVS_p from variant_summary', chunk_size=10000, row_format='tuple'):
+        yield hgvs_c
+        yield hgvs_p
+
+def _unique_rows(rows):
+    seen = set()
+    unique = []
+    for row in rows:
+        key = tuple(sorted(row.items()))
+        if key not in seen:
+            seen.add(key)
+            unique.append(row)
+    return unique
+
 ##########################################################################################
 #
 #       SQLData Class
@@ -19,6 +60,31 @@ class ClinVarDB(SQLData):
     def __init__(self):
         super(ClinVarDB, self).__init__(config_section='clinvar')
 
+    def hgvs_index(self):
+        """
+        Memory mapped clinvar_hgvs index named by "hgvs_index" in the clinvar config section,
+        or None if it is not configured, missing, or exported before the last ClinVar reload.
+        :return: HGVSIndex
+        """
+        path = config_option(self._cfg_section, 'hgvs_index', '')
+        if not path:
+            return None
+        return get_hgvs_index(os.path.expanduser(path), dataset_epoch(self))
+
+    def significance_matrix(self):
+        """
+        Gene x ClinicalSignificance variant counts, used by the clinical significance methods
+        when "significance_matrix: true" in the clinvar config section and numpy is installed.
+        :return: SignificanceMatrix, or None
+        """
+        if config_option(self._cfg_section, 'significance_matrix', 'false').lower() not in ('true', 'yes', 'on', '1'):
+            return None
+        if not have_numpy():
+            log.warn('significance_matrix is enabled but numpy is not installed')
+            return None
+        return get_significance_matrix(self)
+
+    @cached
     def clinvar_ids(self, hgvs_text, id_column='VariationID'):
         """
         Get clinvar identifier for HGVS text label.
@@ -29,12 +95,31 @@ class ClinVarDB(SQLData):
         :param id_column: 'VariationID', 'AlleleID', or 'RCVaccession'
         :return: clinvar identifer 'VariationID', 'AlleleID', or 'RCVaccession'
         """
-        res = self.fetchall(
-            " select distinct %s as ID " % id_column +
+        return self.clinvar_ids_many([hgvs_text], id_column)[0][1]
+
+    def clinvar_ids_many(self, hgvs_texts, id_column='VariationID'):
+        """
+        Batch clinvar_ids: answered from the HGVS index file when one is configured and current,
+        otherwise indexed "hgvs_text in (...)" lookups, a chunk of inputs per query.
+
+        :param hgvs_texts: iterable of c.DNA, r.RNA, p.Protein, or g.Genomic
+        :param id_column: 'VariationID', 'AlleleID', or 'RCVaccession'
+        :return: list of (hgvs_text, list of identifiers), in input order including duplicates
+        """
+        if id_column not in CLINVAR_ID_COLUMNS:
+            raise ValueError('id_column must be one of %s' % ', '.join(CLINVAR_ID_COLUMNS))
+
+        hgvs_texts = list(hgvs_texts)
+        index = self.hgvs_index()
+        if index is not None:
+            return [(hgvs_text, index.ids(hgvs_text, id_column)) for hgvs_text in hgvs_texts]
+
+        groups = _group_rows(self.fetchall_in(
+            " select distinct hgvs_text, %s as ID " % id_column +
             " from clinvar_hgvs " +
-            " where hgvs_text = '%s'" % hgvs_text)
+            " where hgvs_text in ({})", maybe_present(self, 'clinvar_hgvs', _hgvs_text_keys, hgvs_texts)), 'hgvs_text')
 
-        return [entry['ID'] for entry in res]
+        return [(hgvs_text, [entry['ID'] for entry in groups.get(_fold(hgvs_text), [])]) for hgvs_text in hgvs_texts]
 
     def accession_for_hgvs_text(self, hgvs_text):
         """
@@ -60,16 +145,30 @@ class ClinVarDB(SQLData):
         """
         return self.clinvar_ids(hgvs_text, 'VariationID')
 
+    @cached
     def hgvs_text_for_variation_id(self, variation_id):
         """
         Get hgvs_text for the specified NCBI Variant
         :param variation_id: Identifier preferred by NCBI ClinVar for a given Variant
         :return: arry of hgvs_text like ['NM_000530.6:c.233C>A']
         """
-        res = self.fetchall("select distinct hgvs_text as ID from clinvar_hgvs where VariationID = %s " % str(variation_id))
+        return self.hgvs_text_for_variation_id_many([variation_id])[0][1]
 
-        return [entry['ID'] for entry in res]
+    def hgvs_text_for_variation_id_many(self, variation_ids):
+        """
+        Batch hgvs_text_for_variation_id.
+        :param variation_ids: iterable of VariationIDs
+        :return: list of (variation_id, list of hgvs_text), in input order including duplicates
+        """
+        variation_ids = list(variation_ids)
+        groups = _group_rows(self.fetchall_in(
+            "select distinct VariationID, hgvs_text from clinvar_hgvs where VariationID in ({}) ",
+            [int(variation_id) for variation_id in variation_ids]), 'VariationID')
 
+        return [(variation_id, [entry['hgvs_text'] for entry in groups.get(int(variation_id), [])])
+                for variation_id in variation_ids]
+
+    @cached
     def variant_summary(self, hgvs_c, hgvs_r=None, hgvs_p=None):
         """
         Get summary of a variant using the HGVS text label.
@@ -115,9 +214,26 @@ class ClinVarDB(SQLData):
         :return: variant summary as described in the clinvar TSV download file.
         """
         if IS_DEBUG_ENABLED:
-            log.debug('hgvs_c '+str(hgvs_c))
-            log.debug('hgvs_r '+str(hgvs_r))
-            log.debug('hgvs_p '+str(hgvs_p))
+            log.debug('hgvs_c %s' % (hgvs_c,))
+            log.debug('hgvs_r %s' % (hgvs_r,))
+            log.debug('hgvs_p %s' % (hgvs_p,))
+
+        return self.variant_summary_many([(hgvs_c, hgvs_r, hgvs_p)])[0][1]
+
+    def variant_summary_many(self, variants):
+        """
+        Batch variant_summary: HGVS_c and HGVS_p "in (...)" lookups, a chunk of variants per query.
+
+        :param variants: iterable of hgvs_c strings or (hgvs_c, hgvs_r, hgvs_p) tuples
+        :return: list of (variant, variant summary rows), in input order including duplicates
+        """
+        variants = list(variants)
+        synonyms = [variant if isinstance(variant, tuple) else (variant, None, None) for variant in variants]
+
+        coding = set(name for hgvs_c, hgvs_r, _ in synonyms for name in (hgvs_c, hgvs_r) if name is not None)
+        protein = set(hgvs_p for _, _, hgvs_p in synonyms if hgvs_p is not None)
+        coding = maybe_present(self, 'variant_summary', _variant_summary_keys, coding)
+        protein = maybe_present(self, 'variant_summary', _variant_summary_keys, protein)
 
         _select = """
              Select distinct TestedInGTR,
@@ -129,22 +245,19 @@ class ClinVarDB(SQLData):
 
         _from   = """ From variant_summary """
 
-        _where  = """ Where   (HGVS_c = '@c') or
-                              (HGVS_c = '@r') or
-                              (HGVS_p = '@p') """
-
-        _where = _where.\
-            replace('@c', str(hgvs_c)).\
-            replace('@r', str(hgvs_r)).\
-            replace('@p', str(hgvs_p))
-
-        _sql = ' '+ _select + _from + _where
-
-        if IS_DEBUG_ENABLED:
-            log.debug(str( _sql   ))
+        by_c = _group_rows(self.fetchall_in(' ' + _select + _from + " Where HGVS_c in ({}) ", coding), 'HGVS_c')
+        by_p = _group_rows(self.fetchall_in(' ' + _select + _from + " Where HGVS_p in ({}) ", protein), 'HGVS_p')
 
-        return self.fetchall(_sql)
+        results = []
+        for variant, (hgvs_c, hgvs_r, hgvs_p) in zip(variants, synonyms):
+            rows = []
+            for name, groups in ((hgvs_c, by_c), (hgvs_r, by_c), (hgvs_p, by_p)):
+                if name is not None:
+                    rows.extend(groups.get(_fold(name), []))
+            results.append((variant, _unique_rows(rows)))
+        return results
 
+    @cached
     def var_citations(self, hgvs_text):
         """
         Get citations for clinvar entries using an HGVS text label.
@@ -163,18 +276,34 @@ class ClinVarDB(SQLData):
         |    15044 |           5 | 267606829 |    0 | PubMed          |    20818383 |
         +----------+-------------+-----------+------+-----------------+-------------+
 
-        :param hgvs_text: c.DNA, r.RNA, p.Protein, g.Genomic
+        :param hgvs_text: c.DNA, r.RNA, p.Protein, g.Genomic, or a list of them
         :return: citations from ClinVar
         """
         if isinstance(hgvs_text, basestring):
             hgvs_text = [hgvs_text]
 
-        hgvs_clause = " or ".join(map(lambda x: " H.hgvs_text = '{}' ".format(x), hgvs_text))
-        sql = "select C.citation_id, C.citation_source, H.RCVaccession, H.hgvs_text from clinvar_hgvs H, var_citations C where H.VariationID = C.VariationID and ({})".format(hgvs_clause)
-        return self.fetchall(sql)
+        seen = set()
+        unique = [text for text in hgvs_text if not (_fold(text) in seen or seen.add(_fold(text)))]
+        return [row for _, rows in self.var_citations_many(unique) for row in rows]
+
+    def var_citations_many(self, hgvs_texts):
+        """
+        Batch var_citations.
+        :param hgvs_texts: iterable of c.DNA, r.RNA, p.Protein, g.Genomic
+        :return: list of (hgvs_text, citation rows), in input order including duplicates
+        """
+        hgvs_texts = list(hgvs_texts)
+        groups = _group_rows(self.fetchall_in(
+            "select C.citation_id, C.citation_source, H.RCVaccession, H.hgvs_text "
+            "from clinvar_hgvs H, var_citations C "
+            "where H.VariationID = C.VariationID and H.hgvs_text in ({})",
+            maybe_present(self, 'clinvar_hgvs', _hgvs_text_keys, hgvs_texts)), 'hgvs_text')
+
+        return [(hgvs_text, groups.get(_fold(hgvs_text), [])) for hgvs_text in hgvs_texts]
 
 
-    def molecular_consequences(self, hgvs_text):
+    @cached
+    def molecular_consequences(self, hgvs_text, fields=None):
         """
          Get Molecular Consequences for hgvs variant.
          Not all clinvar variants have known consequences.
@@ -189,9 +318,24 @@ class ClinVarDB(SQLData):
         +--------------------+--------------+------+-----+---------+-------+
 
         :param hgvs_text:
+        :param fields: columns to return (default all)
         :return:
         """
-        return self.fetchall("select * from clinvar.molecular_consequences where hgvs_text='?'  ".replace("?", hgvs_text))
+        return self.molecular_consequences_many([hgvs_text], fields)[0][1]
+
+    def molecular_consequences_many(self, hgvs_texts, fields=None):
+        """
+        Batch molecular_consequences.
+        :param hgvs_texts: iterable of hgvs variants
+        :param fields: columns to return (default all); hgvs_text is always included
+        :return: list of (hgvs_text, consequence rows), in input order including duplicates
+        """
+        hgvs_texts = list(hgvs_texts)
+        groups = _group_rows(self.fetchall_in(
+            "select %s from clinvar.molecular_consequences where hgvs_text in ({}) " % select_fields(fields, ['hgvs_text']),
+            hgvs_texts), 'hgvs_text')
+
+        return [(hgvs_text, groups.get(_fold(hgvs_text), [])) for hgvs_text in hgvs_texts]
 
     def random_example_hgvs(self, num_examples=1):
         """
@@ -206,10 +350,11 @@ class ClinVarDB(SQLData):
             'select distinct(hgvs_text) as hgvs_text '
             'from molecular_consequences '
             'where hgvs_text '
-            'like "NM%" '
+            'like "NM%%" '
             'order by rand() '
-            'limit ' + str(num_examples)))
+            'limit %s', [int(num_examples)]))
 
+    @cached
     def disease_name(self, concept):
         """
         MedGen (including ClinVar) refers to this standard set of disease names.
@@ -219,10 +364,11 @@ class ClinVarDB(SQLData):
         return self.fetchall(
          "select * "
          "from disease_names "
-         "where ConceptID = '%s'" % Concept(concept).umls_cui)
+         "where ConceptID = %s", [Concept(concept).umls_cui])
 
     #TODO: @nthmost: refactor with medgen-services
-    def gene2condition(self, gene_id):
+    @cached
+    def gene2condition(self, gene_id, fields=None):
         """
         gene2condition is a MedGen linked source spanning MedGen, ClinVar, GTR, OMIM, and HPO.
 
@@ -241,21 +387,35 @@ class ClinVarDB(SQLData):
         +--------------+---------------+------+-----+---------+-------+
 
         :param gene_id: Entrez Gene ID
+        :param fields: columns to return (default all), e.g. ('ConceptID', 'DiseaseName')
         :return: condition information from gene_condition_source_id
         """
         return self.fetchall(
-            " select * from gene_condition_source_id where GeneID = ?".replace('?',str(Gene(gene_id).id)))
+            " select {} from gene_condition_source_id where GeneID = %s".format(select_fields(fields)), [Gene(gene_id).id])
+
+    def gene2condition_many(self, gene_ids, fields=None):
+        """
+        Batch gene2condition for Entrez GeneIDs, one "GeneID in (...)" query.
+        :param gene_ids: Entrez Gene IDs
+        :param fields: columns to return (default all, GeneID is always included)
+        :return: dict GeneID -> list of gene_condition_source_id rows
+        """
+        return self.fetchall_by(" select {} from gene_condition_source_id where GeneID in ({{}})".format(
+            select_fields(fields, ['GeneID'])), 'GeneID', [int(gene_id) for gene_id in gene_ids])
 
-    def gene2condition_for_concept(self, concept_id):
+    @cached
+    def gene2condition_for_concept(self, concept_id, fields=None):
         """
         See gene2condition. Input is a concept rather than Gene.
         :param concept_id: MedGen concept id (CUI)
+        :param fields: columns to return (default all)
         :return: MedGen linked entry
         """
         return self.fetchall(
-            " select * from gene_condition_source_id where ConceptID = '?' ".replace('?',str(concept_id)))
+            " select {} from gene_condition_source_id where ConceptID = %s ".format(select_fields(fields)), [str(concept_id)])
 
 
+    @cached
     def gene_summary(self, gene):
         """
         Get ClinVar gene summary
@@ -279,9 +439,20 @@ class ClinVarDB(SQLData):
         :param gene: NCBI Gene ID or hugo gene name
         :return: dictionary with counts of Submissions and Alleles
         """
-        return self.fetchrow("select * from gene_specific_summary where GeneID = ? limit 1".replace('?', str(Gene(gene).id)))
-
+        return self.fetchrow("select * from gene_specific_summary where GeneID = %s limit 1", [self._gene_id(gene)])
 
+    def _gene_id(self, gene, matrix=None):
+        """
+        GeneID of gene, from the significance matrix's symbols when possible instead of a GeneDB lookup.
+        """
+        matrix = matrix or self.significance_matrix()
+        if matrix is not None and isinstance(gene, basestring):
+            gene_id = matrix.gene_id(gene)
+            if gene_id is not None:
+                return gene_id
+        return Gene(gene).id
+
+    @cached
     def gene_to_clinical_significance_type_frequency(self, gene):
         """
         Get clinical significance for a gene.
@@ -305,23 +476,88 @@ class ClinVarDB(SQLData):
         :param gene: NCBI Gene ID or hugo gene name
         :return: dict containing ClinicalSignificance and the number of variants (cnt_variants)
         """
-        gene = Gene(gene)
-        return self.fetchall(" select ClinicalSignificance, count(*) as cnt_variants "
-                             " from variant_summary "
-                             " where GeneID = ? "
-                             " group by ClinicalSignificance "
-                             " order by cnt_variants    desc "
-                             .replace('?', str(gene.id)) )
+        return self.gene_to_clinical_significance_type_frequency_many([gene])[gene]
+
+    def gene_to_clinical_significance_type_frequency_many(self, genes):
+        """
+        Batch gene_to_clinical_significance_type_frequency: read from the significance matrix
+        when enabled, otherwise one "GeneID in (...)" aggregation for all genes.
+
+        :param genes: iterable of NCBI Gene IDs or hugo gene names
+        :return: dict gene -> list of dict ClinicalSignificance and cnt_variants, most frequent first
+        """
+        genes = list(genes)
+        matrix = self.significance_matrix()
+        if matrix is not None:
+            return dict((gene, matrix.frequency(self._gene_id(gene, matrix))) for gene in genes)
+
+        gene_ids = dict(zip(genes, Gene.ids_many(genes)))
+        rows = self.fetchall_in(" select GeneID, ClinicalSignificance, count(*) as cnt_variants "
+                                " from variant_summary "
+                                " where GeneID in ({}) "
+                                " group by GeneID, ClinicalSignificance ",
+                                [gene_id for gene_id in gene_ids.values() if gene_id is not None])
+        by_gene = {}
+        for row in sorted(rows, key=lambda row: -row['cnt_variants']):
+            by_gene.setdefault(row['GeneID'], []).append({'ClinicalSignificance': row['ClinicalSignificance'],
+                                                          'cnt_variants': row['cnt_variants']})
+        return dict((gene, by_gene.get(gene_ids[gene], [])) for gene in genes)
+
+    def genes_with_clinical_significance(self, significance, min_variants=1):
+        """
+        Genes with at least min_variants ClinVar variants of a clinical significance,
+        e.g. genes_with_clinical_significance(['Pathogenic', 'Likely pathogenic'], 5)
+
+        :param significance: ClinicalSignificance or list of them
+        :param min_variants: minimum number of variants (of all the significances together)
+        :return: list of GeneID, most variants first
+        """
+        matrix = self.significance_matrix()
+        if matrix is not None:
+            return matrix.genes_with(significance, min_variants)
+
+        if isinstance(significance, basestring):
+            significance = [significance]
+        significance = list(significance)
+        return [row['GeneID'] for row in self.fetchall(
+            " select GeneID, count(*) as cnt_variants "
+            " from variant_summary "
+            " where ClinicalSignificance in (%s) and GeneID >= 0 " % ','.join(['%s'] * len(significance)) +
+            " group by GeneID "
+            " having count(*) >= %s "
+            " order by cnt_variants desc ", significance + [min_variants])]
+
+    def clinical_significance_totals(self):
+        """
+        Number of ClinVar variants of each clinical significance over all genes.
+        :return: dict ClinicalSignificance -> number of variants
+        """
+        matrix = self.significance_matrix()
+        if matrix is not None:
+            return matrix.totals()
+        return dict((row['ClinicalSignificance'], row['cnt_variants']) for row in self.fetchall(
+            " select ClinicalSignificance, count(*) as cnt_variants "
+            " from variant_summary "
+            " where GeneID >= 0 "
+            " group by ClinicalSignificance "))
 
 
     # TODO: deprecated
+    @cached
     def select_clinvar_gene_list_for_cui(self, cui):
         """
         select ClinVar genes associated with MedGen CUI
         :param cui:
         :return:
         """
-        return self.list_genes("select Symbol as gene_name from gene_condition_source_id where ConceptID = '%s' " % cui)
+        return self.list_genes("select Symbol as gene_name from gene_condition_source_id where ConceptID = %s ", [cui])
+
+    def dataset_epoch(self):
+        """
+        Load log epoch plus the latest version_info row, which the ClinVar loader writes on every release.
+        """
+        return super(ClinVarDB, self).dataset_epoch() + (self.get_version(),)
+
     def get_version(self):
         '''
         Get the ClinVar version
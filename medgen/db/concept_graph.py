@@ -0,0 +1,113 @@
+from __future__ import absolute_import
+
+from .graph import Graph, shared_graph
+
+##########################################################################################
+#
+#       MedGen concept relation graph
+#
+##########################################################################################
+
+def _as_set(values):
+    if values is None:
+        return None
+    return set([values] if isinstance(values, basestring) else values)
+
+class ConceptGraph(Graph):
+    """
+    MGREL held in memory: one edge CUI1 -> CUI2 per relationship, typed by its (REL, RELA) pair.
+    CUIs are numbered, each distinct (REL, RELA) is a 16 bit code, and the edges are CSR arrays in
+    both directions, so a concept's relations in either column are an array slice instead of an
+    "CUI1 = %s or CUI2 = %s" query.
+
+    Relationship filters take REL and/or RELA values (one or a list), e.g. rel='CHD' or
+    rela=['has_manifestation', 'manifestation_of']. Traversals default to direction 'both',
+    matching MedGenDB.concept_relations which returns rows with the concept in either column.
+    """
+    def relation_types(self, rel=None, rela=None):
+        """
+        :param rel: REL value(s) to keep (default all)
+        :param rela: RELA value(s) to keep (default all)
+        :return: list of (REL, RELA) edge types, None when nothing is filtered
+        """
+        rels, relas = _as_set(rel), _as_set(rela)
+        if rels is None and relas is None:
+            return None
+        return [edge_type for edge_type in self.edge_types
+                if (rels is None or edge_type[0] in rels) and (relas is None or edge_type[1] in relas)]
+
+    def related(self, cui, rel=None, rela=None, direction='both'):
+        """
+        :param cui: concept ID
+        :param rel: REL value(s) to follow (default all)
+        :param rela: RELA value(s) to follow (default all)
+        :param direction: 'forward' (CUI1 = cui), 'reverse' (CUI2 = cui) or 'both'
+        :return: list of related CUIs
+        """
+        return self.neighbors(cui, direction, self.relation_types(rel, rela))
+
+    def related_many(self, cuis, rel=None, rela=None, direction='both'):
+        """
+        Batch related.
+        :param cuis: concept IDs
+        :return: dict CUI -> list of related CUIs
+        """
+        edge_types = self.relation_types(rel, rela)
+        return dict((cui, self.neighbors(cui, direction, edge_types)) for cui in cuis)
+
+    def relations(self, cui, rel=None, rela=None):
+        """
+        The MGREL relationships of cui, as compact tuples.
+        :param cui: concept ID
+        :param rel: REL value(s) to keep (default all)
+        :param rela: RELA value(s) to keep (default all)
+        :return: list of (CUI1, REL, RELA, CUI2) with cui as CUI1 or CUI2
+        """
+        node = self.node(cui)
+        if node is None:
+            return []
+        codes = self.type_codes(self.relation_types(rel, rela))
+        labels, edge_types = self.labels, self.edge_types
+        relations = []
+        for csr, forward in ((self.forward, True), (self.reverse, False)):
+            for position in xrange(csr.indptr[node], csr.indptr[node + 1]):
+                code = csr.codes[position]
+                if codes is not None and code not in codes:
+                    continue
+                other = labels[csr.indices[position]]
+                rel_type, rela_type = edge_types[code]
+                if forward:
+                    relations.append((cui, rel_type, rela_type, other))
+                elif other != cui:
+                    relations.append((other, rel_type, rela_type, cui))
+        return relations
+
+    def within(self, cui, hops=1, rel=None, rela=None, direction='both'):
+        """
+        Concepts reachable in at most hops relationships, e.g. within('C0006142', 2, rel=['RO']).
+        :param cui: concept ID
+        :param hops: maximum number of relationships
+        :param rel: REL value(s) to follow (default all)
+        :param rela: RELA value(s) to follow (default all)
+        :param direction: 'forward', 'reverse' or 'both'
+        :return: OrderedDict CUI -> hops, nearest first, not including cui
+        """
+        reached = self.walk(cui, direction, hops, self.relation_types(rel, rela))
+        reached.pop(cui, None)
+        return reached
+
+def build_concept_graph(db):
+    """
+    :param db: MedGenDB
+    :return: ConceptGraph of MGREL
+    """
+    rows = db.fetch_iter('select CUI1, CUI2, REL, RELA from MGREL', chunk_size=10000, row_format='tuple')
+    return ConceptGraph((cui1, cui2, (rel, rela or None)) for cui1, cui2, rel, rela in rows)
+
+def get_concept_graph(db):
+    """
+    The relation graph of db's medgen dataset, loaded on first use and again after the dataset is reloaded.
+    :param db: MedGenDB
+    :return: ConceptGraph
+    """
+    return shared_graph(db, 'concept_graph', build_concept_graph)
@@ -0,0 +1,251 @@
+from __future__ import absolute_import
+
+from collections import OrderedDict, deque
+
+from .graph import CSR
+from .epoch import shared_structure
+from .shared import shared
+from .gene import GeneDB
+from .medgen import MedGenDB
+from .clinvar import ClinVarDB
+
+##########################################################################################
+#
+#       Identifier namespaces
+#
+##########################################################################################
+
+def _text(value):
+    return value.strip() if isinstance(value, basestring) else str(value)
+
+def _integer(value):
+    value = int(value)
+    return value if value >= 0 else None
+
+def _rs(value):
+    value = _text(value)
+    return _integer(value[2:] if value.lower().startswith('rs') else value)
+
+def _code(value):
+    value = _text(value).upper()
+    return value if value and value != '-' else None
+
+def _cui(value):
+    value = _code(value)
+    return value if value and value.startswith('C') else None
+
+def _mim(value):
+    value = _text(value)
+    return _integer(value[4:] if value.upper().startswith('MIM:') else value)
+
+# namespace -> function(identifier) -> normalized identifier (the lookup key), or None if it is not one
+NAMESPACES = {
+    'GeneID': _integer,
+    'Symbol': _code,
+    'MIM': _mim,
+    'CUI': _cui,
+    'MedGenUID': _integer,
+    'VariationID': _integer,
+    'AlleleID': _integer,
+    'RCV': _code,
+    'rs': _rs,
+}
+
+def _split_rcvs(rows):
+    for allele_id, rcvs in rows:
+        for rcv in (rcvs or '').split(';'):
+            yield allele_id, rcv
+
+# (namespace, namespace, dataset class, select of the pairs, optional function(rows) -> pairs)
+MAPPINGS = [
+    ('GeneID', 'Symbol', GeneDB, 'select GeneID, Symbol from gene_info', None),
+    ('MIM', 'GeneID', GeneDB, 'select MIM, GeneID from mim2gene_medgen', None),
+    ('MIM', 'CUI', GeneDB, 'select MIM, MedGenCUI from mim2gene_medgen', None),
+    ('CUI', 'MedGenUID', MedGenDB, 'select ConceptID, MedGenUID from view_medgen_uid', None),
+    ('VariationID', 'AlleleID', ClinVarDB, 'select distinct VariationID, AlleleID from clinvar_hgvs', None),
+    ('AlleleID', 'rs', ClinVarDB, 'select AlleleID, rs from variant_summary', None),
+    ('AlleleID', 'RCV', ClinVarDB, 'select AlleleID, RCVaccession from variant_summary', _split_rcvs),
+    ('AlleleID', 'GeneID', ClinVarDB, 'select AlleleID, GeneID from variant_summary', None),
+]
+
+##########################################################################################
+#
+#       Two way identifier map
+#
+##########################################################################################
+
+class _Identifiers(object):
+    """
+    Numbers the identifiers of one side of a Mapping, by normalized identifier.
+    The first spelling seen of each (like a gene symbol's case) is the one returned.
+    """
+    def __init__(self, normalize):
+        self.normalize = normalize
+        self.values = []
+        self.numbers = {}
+
+    def key(self, value):
+        """
+        :return: normalized identifier, or None if value is not one
+        """
+        if value is None:
+            return None
+        try:
+            return self.normalize(value)
+        except (TypeError, ValueError):
+            return None
+
+    def add(self, value):
+        key = self.key(value)
+        if key is None:
+            return None
+        number = self.numbers.get(key)
+        if number is None:
+            number = self.numbers[key] = len(self.values)
+            self.values.append(value.strip() if isinstance(value, basestring) else value)
+        return number
+
+    def number(self, value):
+        return self.numbers.get(self.key(value))
+
+    def __len__(self):
+        return len(self.values)
+
+
+class Mapping(object):
+    """
+    Many to many map between the identifiers of two namespaces, numbered per side and held
+    as CSR arrays in both directions (left -> right and right -> left).
+    """
+    def __init__(self, left, right, pairs):
+        """
+        :param left: namespace of the first identifier of each pair
+        :param right: namespace of the second
+        :param pairs: iterable of (left identifier, right identifier); unusable identifiers (None, '-', -1) are skipped
+        """
+        self.namespaces = (left, right)
+        self._left, self._right = _Identifiers(NAMESPACES[left]), _Identifiers(NAMESPACES[right])
+        numbered = set()
+        for left_value, right_value in pairs:
+            left_number, right_number = self._left.add(left_value), self._right.add(right_value)
+            if left_number is not None and right_number is not None:
+                numbered.add((left_number, right_number, 0))
+        edges = sorted(numbered)
+        self._forward = CSR(len(self._left), edges)
+        self._reverse = CSR(len(self._right), sorted((right, left, code) for left, right, code in edges))
+        self.edge_count = len(edges)
+
+    def __len__(self):
+        return len(self._left) + len(self._right)
+
+    def targets(self, values, reverse=False):
+        """
+        :param values: identifiers of the left namespace (right if reverse)
+        :param reverse: map right to left
+        :return: set of identifiers of the other namespace
+        """
+        source, target = (self._right, self._left) if reverse else (self._left, self._right)
+        csr = self._reverse if reverse else self._forward
+        found = set()
+        for value in values:
+            number = source.number(value)
+            if number is not None:
+                found.update(target.values[other] for other in csr.neighbors(number))
+        return found
+
+##########################################################################################
+#
+#       Crosswalk
+#
+##########################################################################################
+
+class IdentifierCrosswalk(object):
+    """
+    Converts batches of identifiers between namespaces (see NAMESPACES) from memory:
+
+        IdentifierCrosswalk().convert([600185, 113705], 'MIM', 'Symbol')
+
+    Each table of MAPPINGS is loaded once per dataset (and again after the dataset is reloaded)
+    into a two way Mapping. Namespaces without a direct mapping are converted along the shortest
+    chain of mappings, e.g. MIM -> GeneID -> Symbol, or along an explicit via= chain.
+    """
+    def __init__(self, gene_db=None, medgen_db=None, clinvar_db=None):
+        """
+        :param gene_db: GeneDB (default the shared instance), likewise medgen_db and clinvar_db
+        """
+        self._dbs = {GeneDB: gene_db, MedGenDB: medgen_db, ClinVarDB: clinvar_db}
+
+    def _db(self, cls):
+        return self._dbs[cls] or shared(cls)
+
+    def mapping(self, left, right):
+        """
+        :return: (Mapping, reverse) for the direct mapping between two namespaces, or (None, None)
+        """
+        for spec in MAPPINGS:
+            if spec[:2] in ((left, right), (right, left)):
+                return self._load(spec), spec[:2] == (right, left)
+        return None, None
+
+    def _load(self, spec):
+        left, right, cls, select_sql, transform = spec
+
+        def build(db):
+            rows = db.fetch_iter(select_sql, chunk_size=10000, row_format='tuple')
+            return Mapping(left, right, transform(rows) if transform else rows)
+
+        return shared_structure(self._db(cls), 'crosswalk %s-%s' % (left, right), build)
+
+    def path(self, from_ns, to_ns):
+        """
+        Shortest chain of direct mappings between two namespaces.
+        :return: list of namespaces from from_ns to to_ns, or None if they are not connected
+        """
+        for namespace in (from_ns, to_ns):
+            if namespace not in NAMESPACES:
+                raise ValueError('unknown namespace %r, expected one of %s' % (namespace, ', '.join(sorted(NAMESPACES))))
+        previous = {from_ns: None}
+        queue = deque([from_ns])
+        while queue:
+            namespace = queue.popleft()
+            if namespace == to_ns:
+                path = []
+                while namespace is not None:
+                    path.append(namespace)
+                    namespace = previous[namespace]
+                return path[::-1]
+            for left, right, _, _, _ in MAPPINGS:
+                for source, target in ((left, right), (right, left)):
+                    if source == namespace and target not in previous:
+                        previous[target] = namespace
+                        queue.append(target)
+        return None
+
+    def convert(self, ids, from_ns, to_ns, via=None):
+        """
+        Convert identifiers, e.g. convert(['BRCA1', 'BRCA2'], 'Symbol', 'MIM') or
+        convert([15041], 'AlleleID', 'Symbol', via=['GeneID']).
+
+        :param ids: identifiers in from_ns (strings or ints; 'rs' and 'MIM:' prefixes are accepted)
+        :param from_ns: namespace of ids, one of NAMESPACES
+        :param to_ns: namespace to convert to
+        :param via: namespaces to pass through, in order (default the shortest chain)
+        :return: OrderedDict identifier -> sorted list of identifiers in to_ns, in input order
+        """
+        path = [from_ns] + list(via or []) + [to_ns] if via else self.path(from_ns, to_ns)
+        if path is None:
+            raise ValueError('no mapping from %s to %s' % (from_ns, to_ns))
+        hops = []
+        for left, right in zip(path, path[1:]):
+            mapping, reverse = self.mapping(left, right)
+            if mapping is None:
+                raise ValueError('no mapping between %s and %s' % (left, right))
+            hops.append((mapping, reverse))
+
+        converted = OrderedDict()
+        for value in ids:
+            found = [value]
+            for mapping, reverse in hops:
+                found = mapping.targets(found, reverse)
+            converted[value] = sorted(found)
+        return converted
@@ -2,35 +2,172 @@
 # from __future__ import absolute_import
 from __future__ import unicode_literals, print_function
 
-from pyrfc3339 import parse
-import MySQLdb as mdb
-import MySQLdb.cursors as cursors
-import PySQLPool
+import os
+import re
+import sqlite3
+import itertools
+import threading
+from contextlib import contextmanager
 
 from ..log import log, IS_DEBUG_ENABLED
+from ..exceptions import ConnectError
+from .pool import get_pool, pool_stats, commit_pools, open_cursor, mdb
+from .rows import format_rows, record_class, check_row_format
 
 DEFAULT_HOST = 'localhost'
 DEFAULT_USER = 'medgen'
 DEFAULT_PASS = 'medgen'
 DEFAULT_DATASET = 'medgen'
 
-SQLDATE_FMT = '%Y-%m-%d %H:%M:%S'
-def EscapeString(value):
-    value = value.encode("utf-8")
-    value = mdb.escape_string(value)
-    return '"{}"'.format(value)
+# values of the "backend" setting: a MySQL server, or a local file built by medgen.db.loaders
+BACKENDS = ('mysql', 'sqlite')
 
+SQLDATE_FMT = '%Y-%m-%d %H:%M:%S'
 def SQLdatetime(pydatetime_or_string):
     if hasattr(pydatetime_or_string, 'strftime'):
         dtobj = pydatetime_or_string
     else:
         # assume pyrfc3339 string
+        from pyrfc3339 import parse
         dtobj = parse(pydatetime_or_string)
     return dtobj.strftime(SQLDATE_FMT)
 
+# MySQL ER_NO_SUCH_TABLE
+_NO_SUCH_TABLE = 1146
+
+def missing_table(error):
+    """
+    :param error: exception raised by a query
+    :return: True if it is the driver's "table does not exist" error (MySQL 1146, SQLite "no such table")
+    """
+    if isinstance(error, sqlite3.OperationalError):
+        return 'no such table' in str(error)
+    if mdb is not None and isinstance(error, (mdb.ProgrammingError, mdb.OperationalError)):
+        return error.args[:1] == (_NO_SUCH_TABLE,)
+    return False
+
+def placeholders(count):
+    """
+    :return: '%s,%s,...' with count placeholders, for "where col in ({})" and multi-row values lists
+    """
+    return ','.join(['%s'] * count)
+
+_IDENTIFIER = re.compile(r'^[A-Za-z_][A-Za-z0-9_]*$')
+
+def select_fields(fields, required=()):
+    """
+    Select list for a fields= argument: the named columns, or '*' when fields is None.
+    Names are checked to be plain column identifiers, since they are spliced into the sql.
+
+        self.fetchall("select {} from gene_info where GeneID = %s".format(select_fields(fields)), [gene_id])
+
+    :param fields: column name or sequence of column names, or None for all columns
+    :param required: columns the method itself needs, added when fields leaves them out
+    :return: str
+    """
+    if fields is None:
+        return '*'
+    if isinstance(fields, basestring):
+        fields = [fields]
+    names = list(fields) + [column for column in required if column not in fields]
+    if not names:
+        raise ValueError('fields must name at least one column')
+    for name in names:
+        if not _IDENTIFIER.match(name):
+            raise ValueError('invalid column name %r in fields' % name)
+    return ', '.join('`%s`' % name for name in names)
+
+def config_option(section, option, default=None):
+    """
+    Read an optional setting, falling back to default when neither the section nor [DEFAULT] define it.
+    """
+    from ..config import config
+    if config.has_option(section, option):
+        return config.get(section, option)
+    return default
+
+def _dataset_names():
+    """
+    :return: dataset names of every config section, the qualifiers queries may use
+    """
+    from ..config import config
+    return sorted(set(config.get(section, 'dataset') for section in config.sections()
+                      if config.has_option(section, 'dataset')))
+
+def _literal_size(value):
+    """
+    Approximate length of value once rendered as a SQL literal.
+    """
+    if value is None:
+        return 5
+    if isinstance(value, unicode):
+        return len(value.encode('utf-8')) + 3
+    if isinstance(value, bytes):
+        return len(value) + 3
+    return len(str(value)) + 3
+
+class QueryResult(object):
+    """
+    Result of SQLData.execute: the fetched rows plus the cursor counters.
+    Attribute names follow the PySQLPool query object this replaces.
+    """
+    def __init__(self, cursor):
+        self.record = cursor.fetchall() if cursor.description else []
+        self.rowcount = cursor.rowcount
+        self.affectedRows = cursor.rowcount
+        self.lastInsertID = cursor.lastrowid or 0
+
+# connections pinned to a thread by SQLData.transaction(), keyed by (pool, dataset)
+_bound = threading.local()
+
+def _bound_connections():
+    if not hasattr(_bound, 'connections'):
+        _bound.connections = {}
+    return _bound.connections
+
+# max_allowed_packet per server, read once
+_max_packet = {}
+
+# unique names for join_keys temporary tables
+_join_tables = itertools.count()
+
+def _join_key_type(keys):
+    """
+    Column type and index for a join_keys temporary table holding keys.
+    """
+    if keys and all(isinstance(key, (int, long)) and not isinstance(key, bool) for key in keys):
+        return 'bigint', 'primary key (join_key)'
+    width = max([len(key if isinstance(key, basestring) else str(key)) for key in keys] or [1])
+    if width <= 255:
+        return 'varchar(%d)' % width, 'primary key (join_key)'
+    return 'varchar(%d)' % width, 'key (join_key(255))'
+
+def _stream(conn, select_sql, args, chunk_size, row_format):
+    """
+    Rows of select_sql from an unbuffered cursor on conn, chunk_size rows per fetch.
+    """
+    if row_format not in ('dict', 'tuple', 'record'):
+        raise ValueError("streamed rows can be 'dict', 'tuple' or 'record', not %r" % row_format)
+    cursor = conn.cursor('stream_dict' if row_format == 'dict' else 'stream')
+    try:
+        cursor.execute(select_sql, args)
+        make = None
+        if row_format == 'record':
+            make = record_class([desc[0] for desc in cursor.description])._make
+        while True:
+            rows = cursor.fetchmany(chunk_size)
+            if not rows:
+                break
+            for row in rows:
+                yield make(row) if make else row
+    finally:
+        cursor.close()
+
 class SQLData(object):
     """
     MySQL base class for config, select, insert, update, and delete of medgen linked databases.
+    With "backend: sqlite" the same queries run against the local file named by sqlite_path
+    (see medgen.db.sqlite and medgen.db.loaders).
      TODO: more documentation on config.
     """
     def __init__(self, *args, **kwargs):
@@ -42,15 +179,101 @@ class SQLData(object):
         self._db_pass = kwargs.get('db_pass', None) or config.get(self._cfg_section, 'db_pass')
         self._db_name = kwargs.get('dataset', None) or config.get(self._cfg_section, 'dataset')
         self.commitOnEnd = kwargs.get('commitOnEnd', True) or config.get(self._cfg_section, 'commitOnEnd')
+        self._db_port = int(kwargs.get('db_port', None) or config_option(self._cfg_section, 'db_port', 3306))
+
+        self._backend = kwargs.get('backend', None) or config_option(self._cfg_section, 'backend', 'mysql')
+        if self._backend not in BACKENDS:
+            raise ValueError('backend must be one of %s, not %r' % (', '.join(BACKENDS), self._backend))
+        if self._backend == 'sqlite':
+            # the database file stands in for the server in pool, epoch and cache keys
+            sqlite_path = kwargs.get('sqlite_path', None) or config_option(self._cfg_section, 'sqlite_path', '')
+            if not sqlite_path:
+                raise ValueError('backend sqlite needs sqlite_path')
+            self._db_host = os.path.abspath(os.path.expanduser(sqlite_path))
+            self._db_port = 0
+
+    def pool(self):
+        '''
+        Connection pool shared by every SQLData pointing at the same MySQL server (or SQLite file).
+        Sizes come from pool_min_size, pool_max_size, pool_keepalive and pool_timeout in the config section.
+        '''
+        section = self._cfg_section
+        if self._backend == 'sqlite':
+            from .sqlite import get_sqlite_pool
+            return get_sqlite_pool(self._db_host, _dataset_names(),
+                                   max_size=config_option(section, 'pool_max_size', 8),
+                                   keepalive=config_option(section, 'pool_keepalive', 300),
+                                   timeout=config_option(section, 'pool_timeout', 30))
+        return get_pool(self._db_host, self._db_user, self._db_pass, self._db_port,
+                        min_size=config_option(section, 'pool_min_size', 0),
+                        max_size=config_option(section, 'pool_max_size', 8),
+                        keepalive=config_option(section, 'pool_keepalive', 300),
+                        timeout=config_option(section, 'pool_timeout', 30))
 
     def connect(self):
-        return PySQLPool.getNewConnection(username=self._db_user, 
-                password=self._db_pass, host=self._db_host, db=self._db_name, charset='utf8', commitOnEnd=self.commitOnEnd)
+        '''
+        Check out a pooled connection to this dataset; returned to the pool when the block exits.
 
-    def cursor(self, execute_sql=None):
+            with db.connect() as conn:
+                cursor = conn.cursor()
+
+        Inside db.transaction() this is the connection pinned to the transaction.
+        '''
+        pool = self.pool()
+        pconn = _bound_connections().get((pool, self._db_name))
+        if pconn is not None:
+            return self._pinned(pconn)
+        return pool.connection(self._db_name, autocommit=bool(self.commitOnEnd))
+
+    @contextmanager
+    def _pinned(self, pconn):
+        yield pconn
+
+    @contextmanager
+    def transaction(self):
+        '''
+        Unit of work: every statement this thread sends to this dataset inside the block runs on one
+        connection with autocommit off, and is committed once when the block exits (rolled back on error).
+        Nested transaction() blocks join the outer one.
+
+            with db.transaction():
+                db.insert_many('medline_xml', rows)
+                db.update(...)
+        '''
+        pool = self.pool()
+        key = (pool, self._db_name)
+        bound = _bound_connections()
+        if key in bound:
+            yield self
+            return
+
+        pconn = pool.checkout(self._db_name, autocommit=False)
+        bound[key] = pconn
+        try:
+            yield self
+            pconn.commit()
+        except pool.disconnect_errors:
+            del bound[key]
+            pool.checkin(pconn, discard=True)
+            raise
+        except:
+            del bound[key]
+            try:
+                pconn.rollback()
+            finally:
+                pool.checkin(pconn)
+            raise
+        else:
+            del bound[key]
+            pool.checkin(pconn)
 
-        conn = self.connect()
-        cursor = conn.cursor(cursors.DictCursor)
+    def cursor(self, execute_sql=None):
+        '''
+        Open a dedicated (unpooled) connection; the caller owns it and must close it.
+        :return: [conn, DictCursor]
+        '''
+        conn = self.pool().connect_raw(self._db_name)
+        cursor = open_cursor(conn, 'dict')
 
         if execute_sql is not None:
             cursor.execute(execute_sql)
@@ -59,15 +282,137 @@ class SQLData(object):
 
     def commitPool(self):
         '''
-        Actively commit all transactions in the entire PySQLPool
+        Actively commit all transactions in every connection pool
         '''
-        PySQLPool.commitPool()
+        commit_pools()
 
-    def fetchall(self, select_sql):
+    def pool_stats(self):
+        '''
+        :return: checkouts, wait time, active and idle connections for this dataset's connection pool
+        '''
+        return self.pool().stats()
+
+    def fetchall(self, select_sql, args=None, row_format='dict'):
+        '''
+        :param select_sql: query, with %s placeholders for any bound parameters
+        :param args: sequence (or dict for %(name)s placeholders) of values bound by the driver
+        :param row_format: 'dict' (default), or a compact form (see medgen.db.rows):
+                           'tuple' (TupleRows: tuples plus one shared .columns header),
+                           'record' (namedtuple per query shape), 'columns' (ColumnRows: an array per column)
+        :return: list of rows (dict), or rows in row_format
+        '''
         log.debug(select_sql)
-        return self.execute(select_sql).record
+        if row_format == 'dict':
+            return self.execute(select_sql, args).record
+
+        check_row_format(row_format)
+        with self.connect() as conn:
+            cursor = conn.cursor()
+            try:
+                cursor.execute(select_sql, args)
+                columns = [desc[0] for desc in cursor.description or ()]
+                return format_rows(columns, list(cursor.fetchall()), row_format)
+            finally:
+                cursor.close()
+
+    def fetch_iter(self, select_sql, args=None, chunk_size=1000, row_format='dict'):
+        '''
+        Stream rows from an unbuffered server side cursor.
+        Rows are yielded as they arrive, so memory stays flat regardless of result size.
+
+        The generator holds its own pooled connection until it is exhausted or closed;
+        queries issued while iterating run on other connections (so it does not see
+        uncommitted writes of an enclosing transaction()).
+
+        :param select_sql: query, with %s placeholders for any bound parameters
+        :param args: bound parameters for select_sql
+        :param chunk_size: rows read from the socket per fetch
+        :param row_format: 'dict' (default), 'tuple' or 'record' (see fetchall)
+        :return: generator of rows (dict), or rows in row_format
+        '''
+        log.debug(select_sql)
+        with self.pool().connection(self._db_name, autocommit=bool(self.commitOnEnd)) as conn:
+            for row in _stream(conn, select_sql, args, chunk_size, row_format):
+                yield row
 
-    def fetchrow(self, select_sql):
+    def iter_list(self, select_sql, column, args=None):
+        '''
+        Stream the values of one column, see fetch_iter.
+        :param select_sql: query
+        :param column: name of column to yield
+        :param args: bound parameters for select_sql
+        :return: generator of column values
+        '''
+        for row in self.fetch_iter(select_sql, args):
+            yield row[column]
+
+    def scan(self, table, key, chunk=10000, columns='*', min_key=None):
+        '''
+        Walk a whole table in key order with keyset pagination:
+        each chunk is "where key > last_key order by key limit chunk", which the index on key serves directly.
+        No connection is held between chunks, so callers may do slow work per row.
+
+        :param table: table name
+        :param key: unique, indexed column to paginate on
+        :param chunk: rows per query
+        :param columns: select list, must include key
+        :param min_key: start after this key value (exclusive)
+        :return: generator of rows (dict)
+        '''
+        last_key = min_key
+        while True:
+            if last_key is None:
+                rows = self.fetchall('select {} from {} order by {} limit %s'.format(columns, table, key), [chunk])
+            else:
+                rows = self.fetchall('select {} from {} where {} > %s order by {} limit %s'.format(columns, table, key, key),
+                                     [last_key, chunk])
+            for row in rows:
+                yield row
+            if len(rows) < chunk:
+                break
+            last_key = rows[-1][key]
+
+    def join_keys(self, keys, sql_template, args=None, chunk_size=1000, row_format='dict'):
+        '''
+        Bulk lookup for large key sets: the keys are loaded into a session temporary table
+        (indexed column join_key, typed BIGINT or VARCHAR from the keys) and the caller's query
+        runs against it, so the server joins on an index instead of parsing a huge IN list.
+
+            for row in db.join_keys(hgvs_texts, "select H.* from {keys} K join clinvar_hgvs H on H.hgvs_text = K.join_key"):
+                ...
+
+        Like fetch_iter, rows are streamed and the generator holds its own pooled connection,
+        and the temporary table with it, until it is exhausted or closed.
+
+        :param keys: iterable of keys, duplicates are loaded once
+        :param sql_template: query with {keys} where the temporary table name goes (other braces must be doubled)
+        :param args: bound parameters for the query
+        :param chunk_size: rows read from the socket per fetch
+        :param row_format: 'dict' (default), 'tuple' or 'record' (see fetchall)
+        :return: generator of rows (dict), or rows in row_format
+        '''
+        keys = list(set(keys))
+        table = '_join_keys_%d' % next(_join_tables)
+        column_type, index = _join_key_type(keys)
+
+        with self.pool().connection(self._db_name, autocommit=True) as conn:
+            cursor = conn.cursor()
+            try:
+                cursor.execute('create temporary table {} (join_key {} not null, {}) default charset=utf8'.format(
+                    table, column_type, index))
+                for start in range(0, len(keys), chunk_size * 10):
+                    cursor.executemany('insert ignore into {} (join_key) values (%s)'.format(table),
+                                       [(key,) for key in keys[start:start + chunk_size * 10]])
+
+                select_sql = sql_template.format(keys=table)
+                log.debug(select_sql)
+                for row in _stream(conn, select_sql, args, chunk_size, row_format):
+                    yield row
+            finally:
+                cursor.execute('drop temporary table if exists {}'.format(table))
+                cursor.close()
+
+    def fetchrow(self, select_sql, args=None):
         '''
         If the query was successful:
             if 1 or more rows was returned, returns the first one
@@ -75,11 +420,11 @@ class SQLData(object):
         Else:
             raises Exception
         '''
-        results = self.fetchall(select_sql)
+        results = self.fetchall(select_sql, args)
         return results[0] if len(results) > 0 else None
 
-    def fetchID(self, select_sql, id_colname='ID'):
-        results = self.fetchrow(select_sql)
+    def fetchID(self, select_sql, id_colname='ID', args=None):
+        results = self.fetchrow(select_sql, args)
         if results is not None:
             if id_colname in results:
                 return results[id_colname]
@@ -87,22 +432,77 @@ class SQLData(object):
                 raise RuntimeError("No ID column found.  SQL query: %s" % select_sql)
         return None  # no results found
 
+    def fetchall_in(self, select_sql, values, chunk_size=1000, row_format='dict'):
+        """
+        Run a "where col in ({})" query for many values, chunk_size values per statement.
+        Above join_keys_threshold values (config, default 5000) the values are loaded with
+        join_keys and the IN list becomes a subquery on the temporary table.
+
+            db.fetchall_in("select GeneID, Symbol from gene_info where Symbol in ({})", symbols)
 
-    def list_concepts(self, select_sql):
+        :param select_sql: query with one '{}' where the placeholders go
+        :param values: values to bind, duplicates are queried once
+        :param chunk_size: maximum values per statement
+        :param row_format: 'dict' (default), 'tuple', 'record' or 'columns' (see fetchall)
+        :return: list of rows from all chunks, or rows in row_format
+        """
+        values = list(set(values))
+        chunk_size = min(chunk_size, self.pool().max_params or chunk_size)
+        compact = row_format != 'dict'
+        if len(values) > int(config_option(self._cfg_section, 'join_keys_threshold', 5000)):
+            if not compact:
+                return list(self.join_keys(values, select_sql.format('select join_key from {keys}')))
+            rows = list(self.join_keys(values, select_sql.format('select join_key from {keys}'), row_format='record'))
+            return format_rows(rows[0]._fields if rows else (), [tuple(row) for row in rows], row_format)
+
+        results = []
+        columns = ()
+        for start in range(0, len(values), chunk_size):
+            chunk = values[start:start + chunk_size]
+            rows = self.fetchall(select_sql.format(placeholders(len(chunk))), chunk, 'tuple' if compact else 'dict')
+            if compact:
+                columns = rows.columns
+            results.extend(rows)
+        return format_rows(columns, results, row_format) if compact else results
+
+    def fetchall_by(self, select_sql, column, values, chunk_size=1000):
+        """
+        fetchall_in with the rows grouped by the value they matched, for batch lookups
+        that answer per input:
+
+            db.fetchall_by("select GeneID, PMID from gene2pubmed where GeneID in ({})", 'GeneID', gene_ids)
+
+        :param select_sql: query with one '{}' where the placeholders go
+        :param column: result column holding the matched value (strings match case insensitively)
+        :param values: values to bind
+        :param chunk_size: maximum values per statement
+        :return: dict value -> list of rows, empty for values without rows
+        """
+        fold = lambda value: value.upper() if isinstance(value, basestring) else value
+        values = [value for value in values if value is not None]
+        groups = {}
+        for row in self.fetchall_in(select_sql, values, chunk_size):
+            groups.setdefault(fold(row[column]), []).append(row)
+        return dict((value, groups.get(fold(value), [])) for value in values)
+
+
+    def list_concepts(self, select_sql, args=None):
         """
         Fetch list of concepts
         :param select_sql: query
+        :param args: bound parameters for select_sql
         :return: list cui
         """
-        return self.fetchlist(select_sql, 'CUI')
+        return self.fetchlist(select_sql, 'CUI', args)
 
-    def list_genes(self, select_sql):
+    def list_genes(self, select_sql, args=None):
         """
         Fetch list of genes
         :param select_sql: query
+        :param args: bound parameters for select_sql
         :return: list HGNC
         """
-        return self.fetchlist(select_sql, 'gene_name')
+        return self.fetchlist(select_sql, 'gene_name', args)
 
     #UNUSED: confirmed not used anywhere in medgen-python or variant2pubmed
     #def fetchall_where(self, select_sql, _value, _key=SQLValues.tic('?')):
@@ -146,7 +546,122 @@ class SQLData(object):
         queryobj = self.execute(sql, values)
         return queryobj.lastInsertID
 
+    def max_allowed_packet(self):
+        '''
+        :return: the server's max_allowed_packet in bytes (read once per server)
+        '''
+        key = (self._db_host, self._db_port)
+        if key not in _max_packet:
+            _max_packet[key] = int(self.fetchID('select @@max_allowed_packet as ID'))
+        return _max_packet[key]
+
+    def _chunks(self, rows, fields):
+        '''
+        Split rows into batches whose multi-row statement stays under half of max_allowed_packet.
+        The margin covers escaping, which at worst doubles a string.
+        Batches also respect the backend's limit on bound parameters per statement.
+        '''
+        budget = self.max_allowed_packet() // 2
+        max_params = self.pool().max_params
+        max_rows = max(max_params // len(fields), 1) if max_params else None
+        chunk, size = [], 0
+        for row in rows:
+            values = [row.get(field) for field in fields]
+            row_size = 4 + sum(_literal_size(value) for value in values)
+            if chunk and (size + row_size > budget or len(chunk) == max_rows):
+                yield chunk
+                chunk, size = [], 0
+            chunk.append(values)
+            size += row_size
+        if chunk:
+            yield chunk
+
+    def _write_many(self, verb, tablename, rows, fields, suffix=''):
+        rows = iter(rows)
+        try:
+            first = next(rows)
+        except StopIteration:
+            return 0
+        fields = list(fields or first.keys())
+        row_sql = '({})'.format(placeholders(len(fields)))
+
+        affected = 0
+        with self.transaction():
+            for chunk in self._chunks(itertools.chain([first], rows), fields):
+                sql = '{} into {} ({}) values {}{}'.format(verb, tablename, ','.join(fields),
+                                                          ','.join([row_sql] * len(chunk)), suffix)
+                affected += self.execute(sql, [value for values in chunk for value in values]).affectedRows
+        return affected
+
+    def insert_many(self, tablename, rows, fields=None, ignore=False):
+        '''
+        Insert many rows with multi-row "insert ... values (...),(...)" statements,
+        sized to stay under max_allowed_packet and committed once.
+
+        :param tablename: name of table to receive new rows
+        :param rows: iterable of dict field=value (all rows share the same fields)
+        :param fields: columns to insert (default: keys of the first row)
+        :param ignore: use "insert ignore" to skip rows that collide with a unique key
+        :return: number of rows inserted
+        '''
+        return self._write_many('insert ignore' if ignore else 'insert', tablename, rows, fields)
 
+    def upsert_many(self, tablename, rows, fields=None, update_fields=None):
+        '''
+        Insert many rows, updating rows whose unique key already exists
+        ("insert ... on duplicate key update"). Batched and committed like insert_many.
+
+        :param tablename: name of table to receive new rows
+        :param rows: iterable of dict field=value (all rows share the same fields)
+        :param fields: columns to insert (default: keys of the first row)
+        :param update_fields: columns to overwrite on duplicate key (default: all inserted columns), each a
+                              name (set to the inserted value) or a (name, SQL expression) pair, assigned in order
+        :return: affected rows as reported by MySQL (1 per insert, 2 per update)
+        '''
+        rows = iter(rows)
+        try:
+            first = next(rows)
+        except StopIteration:
+            return 0
+        fields = list(fields or first.keys())
+        assignments = [field if isinstance(field, tuple) else (field, 'values({})'.format(field))
+                       for field in (update_fields or fields)]
+        suffix = ' on duplicate key update ' + ', '.join('{}={}'.format(field, expression)
+                                                         for field, expression in assignments)
+        return self._write_many('insert', tablename, itertools.chain([first], rows), fields, suffix)
+
+    def update_many(self, tablename, id_col_name, rows):
+        '''
+        Update many rows by id with executemany in one transaction (one commit for the batch).
+        :param tablename: name of table to update
+        :param id_col_name: name of the id column, every row must include it
+        :param rows: iterable of dict field=value
+        :return: number of rows updated
+        '''
+        by_fields = {}
+        for row in rows:
+            fields = tuple(sorted(k for k in row.keys() if k != id_col_name))
+            by_fields.setdefault(fields, []).append([row[k] for k in fields] + [row[id_col_name]])
+
+        affected = 0
+        with self.transaction():
+            for fields, values in by_fields.items():
+                sql = 'update {} set {} where {}=%s'.format(tablename, ', '.join('%s=%%s' % k for k in fields), id_col_name)
+                affected += self.executemany(sql, values)
+        return affected
+
+    def executemany(self, sql, seq_of_args):
+        '''
+        Execute sql once per args in seq_of_args on one connection.
+        :return: number of affected rows
+        '''
+        log.debug('SQL.executemany ' + sql)
+        with self.connect() as conn:
+            cursor = conn.cursor()
+            try:
+                return cursor.executemany(sql, seq_of_args) or 0
+            finally:
+                cursor.close()
 
     def update(self, tablename, id_col_name, row_id, field_value_dict):
         '''
@@ -155,26 +670,16 @@ class SQLData(object):
         :param: field_value_dict: map of field=value
         :return: row_id (integer) (returns 0 if insert failed)
         '''
-        fields = []
-        values = []
-
         clauses = []
+        values = []
 
         for k, v in field_value_dict.items():
-            clause = '%s=' % k
-            # surround strings and datetimes with quotation marks
-            if v == None:
-                clause += 'NULL'
-            elif hasattr(v, 'strftime'):
-                clause += '"%s"' % v.strftime(SQLDATE_FMT)
-            elif hasattr(v, 'lower'):
-                clause += EscapeString(v)  #surrounds strings with quotes and unicodes them.
-            else:
-                clause += unicode(v)
-            clauses.append(clause)
+            clauses.append('%s=%%s' % k)
+            values.append(v)
+        values.append(row_id)
 
-        sql = 'update %s set %s where %s=%i;' % (tablename, ', '.join(clauses), id_col_name, row_id)
-        queryobj = self.execute(sql)
+        sql = 'update %s set %s where %s=%%s;' % (tablename, ', '.join(clauses), id_col_name)
+        queryobj = self.execute(sql, values)
         # retrieve and return the row id of the insert. returns 0 if insert failed.
         return queryobj.lastInsertID
 
@@ -187,28 +692,20 @@ class SQLData(object):
         if len(field_value_dict) == 0:
             raise RuntimeError("Do not support delete without a WHERE clause")
 
-        where_sql = ''
+        clauses = []
+        values = []
+
         for k, v in field_value_dict.items():
             if v == None:
-                v = 'NULL'
-                where_sql += 'AND {} is NULL '.format(k)
-            # surround strings and datetimes with quotation marks
-            elif hasattr(v, 'strftime'):
-                v = '"%s"' % v.strftime(SQLDATE_FMT)
-                where_sql += 'AND {}={} '.format(k, v)
-            elif hasattr(v, 'lower'):
-                v = EscapeString(v)  # surrounds strings with quotes and unicodes them.
-                where_sql += 'AND {}={} '.format(k, v)
+                clauses.append('{} is NULL'.format(k))
             else:
-                v = unicode(v)
-                where_sql += 'AND {}={} '.format(k, v)
+                clauses.append('{}=%s'.format(k))
+                values.append(v)
 
-        where_sql = where_sql[len('AND '):]
-
-        sql = 'delete from {} where {};'.format(tablename, where_sql)
+        sql = 'delete from {} where {};'.format(tablename, ' AND '.join(clauses))
 
         log.debug(sql)
-        queryobj = self.execute(sql)
+        queryobj = self.execute(sql, values)
         # retrieve and return the row id of the insert. returns 0 if insert failed.
         return queryobj.lastInsertID
 
@@ -220,13 +717,21 @@ class SQLData(object):
 
     def execute(self, sql, args=None):
         '''
-        Excutes arbitrary sql string in current database connection.    
-        Returns results as PySQLPool query object.
+        Excutes arbitrary sql string on a pooled connection.
+        Returns results as QueryResult (record, rowcount, affectedRows, lastInsertID).
+
+        Values in args are bound by the driver, never spliced into the sql text, so each
+        query template reaches the server as the same statement no matter which literal
+        values are looked up. Literal '%' characters in sql must be written as '%%' when args are given.
         '''
         log.debug('SQL.execute ' + sql)
-        queryobj = PySQLPool.getNewQuery(self.connect())
-        queryobj.Query(sql, args)
-        return queryobj
+        with self.connect() as conn:
+            cursor = conn.cursor('dict')
+            try:
+                cursor.execute(sql, args)
+                return QueryResult(cursor)
+            finally:
+                cursor.close()
 
     def ping(self):
         '''
@@ -235,8 +740,8 @@ class SQLData(object):
         '''
         try:
             return self.schema_info()
-        except mdb.Error, e:
-            log.error("DB connection is dead %d: %s" % (e.args[0], e.args[1]))
+        except (ConnectError,) + self.pool().errors as e:
+            log.error("DB connection is dead: %s" % (e,))
             return False
 
     def schema_info(self):
@@ -247,22 +752,32 @@ class SQLData(object):
         return self.fetchID(
             "select event_time as ID from " + dbname + "." + "log where entity_name = 'load_database.sh' and message = 'done' order by idx desc limit 1")
 
-    def PMID(self, sql):
+    def dataset_epoch(self):
+        """
+        Marker that changes whenever this dataset is (re)loaded: the latest load_database.sh 'done'
+        or 'rows loaded' event in the dataset's log table. Caches compare it to drop stale entries,
+        see medgen.db.epoch.
+        :return: tuple
+        """
+        return (self.fetchID("select max(event_time) as ID from log "
+                             "where (entity_name = 'load_database.sh' and message = 'done') or message like 'rows loaded %'"),)
+
+    def PMID(self, sql, args=None):
         '''
         For given sql select query, return a list of unique PMID strings.
         '''
         pubmeds = set()
-        for row in self.fetchall(sql):
-            pubmeds.add(str(row['PMID']))
+        for pmid in self.iter_list(sql, 'PMID', args):
+            pubmeds.add(str(pmid))
         return pubmeds
 
-    def hgvs_text(self, sql):
+    def hgvs_text(self, sql, args=None):
         """
         For given sql select query, return a list of unique hgvs_text strings.
         """
         hgvs_texts = set()
-        for row in self.fetchall(sql):
-            hgvs_texts.add(str(row['hgvs_text']))
+        for hgvs_text in self.iter_list(sql, 'hgvs_text', args):
+            hgvs_texts.add(str(hgvs_text))
         return hgvs_texts
 
     def trunc_str(self, inp, maxlen):
@@ -285,12 +800,11 @@ class SQLData(object):
         :param entity_name: table name for db, for example, bic_brca1
         :return: datetime if found
         '''
-        sql_query = 'SELECT event_time FROM log WHERE entity_name = "?" AND message like "rows loaded %" ORDER BY event_time DESC limit 1'.replace(
-            '?', entity_name)
-        result = self.fetchrow(sql_query)
+        sql_query = 'SELECT event_time FROM log WHERE entity_name = %s AND message like "rows loaded %%" ORDER BY event_time DESC limit 1'
+        result = self.fetchrow(sql_query, [entity_name])
         if result:
             return result['event_time']
-        raise RuntimeError('Query "%s" returned no results. Have you loaded the %s table?' % (sql_query, entity_name))
+        raise RuntimeError('Query "%s" returned no results. Have you loaded the %s table?' % (sql_query % entity_name, entity_name))
 
 
     def create_index(self, table, colspec):
@@ -301,14 +815,18 @@ class SQLData(object):
         :param colspec: name of column, for example, "RQ"
         :return:
         """
-        self.execute("call create_index('%s', '%s') " % (table, colspec))
+        if self._backend == 'sqlite':
+            name = '{}_{}'.format(table, re.sub(r'\W+', '_', colspec).strip('_'))
+            self.execute('create index if not exists {} on {} ({})'.format(name, table, colspec))
+            return
+        self.execute("call create_index(%s, %s) ", [table, colspec])
 
-    def fetchlist(self, select_sql, column='gene_name'):
+    def fetchlist(self, select_sql, column='gene_name', args=None):
         """
         Fetch as list
         :param select_sql: query
         :param column: name of column you want to make a list out of
+        :param args: bound parameters for select_sql
         :return: list
         """
-        rows = self.fetchall(select_sql)
-        return [] if rows is None else [str(r[column]) for r in rows]
\ No newline at end of file
+        return [str(value) for value in self.iter_list(select_sql, column, args)]
\ No newline at end of file
@@ -0,0 +1,199 @@
+from __future__ import absolute_import
+
+import os
+import time
+import zlib
+import sqlite3
+import hashlib
+import threading
+import cPickle as pickle
+
+from ..log import log
+
+##########################################################################################
+#
+#       On-disk lookup cache shared by all processes on a host
+#
+##########################################################################################
+
+# values larger than this are zlib compressed
+COMPRESS_MIN_BYTES = 512
+
+class DiskCache(object):
+    """
+    Persistent cache of query results in a local SQLite file (WAL mode), so every worker
+    process on a host reads what any of them fetched, and restarts start warm.
+
+    Entries are keyed by a SHA-1 digest of (dataset, query signature), stored as pickles
+    (zlib compressed above COMPRESS_MIN_BYTES), and expire after their TTL. When the file's
+    contents pass max_bytes the oldest written entries are evicted first.
+
+    The cache is best effort: a locked or unwritable file never fails the caller's query.
+    """
+    def __init__(self, path, max_bytes=1024 ** 3, timeout=5):
+        """
+        :param path: sqlite file, created if missing
+        :param max_bytes: size cap for cached values
+        :param timeout: seconds to wait for another process's write lock
+        """
+        self.path = path
+        self.max_bytes = int(max_bytes)
+        self.timeout = float(timeout)
+        self._local = threading.local()
+        self._writes = 0
+        self._stats = {'hits': 0, 'misses': 0, 'writes': 0, 'evictions': 0, 'errors': 0}
+
+    def _conn(self):
+        """
+        One sqlite connection per thread and process.
+        """
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or self._local.pid != os.getpid():
+            directory = os.path.dirname(self.path)
+            if directory and not os.path.isdir(directory):
+                os.makedirs(directory)
+            conn = sqlite3.connect(self.path, timeout=self.timeout, isolation_level=None)
+            conn.text_factory = str
+            conn.execute('pragma journal_mode=wal')
+            conn.execute('pragma synchronous=normal')
+            conn.execute('create table if not exists cache ('
+                         'key blob primary key, dataset text, value blob, size integer, created real, expires real)')
+            conn.execute('create index if not exists cache_created on cache (created)')
+            conn.execute('create index if not exists cache_dataset on cache (dataset)')
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    @staticmethod
+    def make_key(dataset, signature):
+        return sqlite3.Binary(hashlib.sha1(repr((dataset, signature))).digest())
+
+    def get(self, dataset, signature):
+        """
+        :return: (found, value)
+        """
+        try:
+            row = self._conn().execute('select value, expires from cache where key = ?',
+                                       (self.make_key(dataset, signature),)).fetchone()
+        except sqlite3.Error as e:
+            self._error('get', e)
+            return False, None
+
+        if row is None or (row[1] and row[1] < time.time()):
+            self._stats['misses'] += 1
+            return False, None
+        self._stats['hits'] += 1
+        return True, _loads(row[0])
+
+    def set(self, dataset, signature, value, ttl=0):
+        """
+        :param ttl: seconds until the entry expires (0: never)
+        """
+        blob = _dumps(value)
+        now = time.time()
+        try:
+            self._conn().execute('insert or replace into cache (key, dataset, value, size, created, expires) values (?,?,?,?,?,?)',
+                                 (self.make_key(dataset, signature), dataset, sqlite3.Binary(blob), len(blob),
+                                  now, now + ttl if ttl else 0))
+        except sqlite3.Error as e:
+            self._error('set', e)
+            return
+        self._stats['writes'] += 1
+        self._writes += 1
+        if self._writes % 1000 == 0:
+            self.evict()
+
+    def evict(self):
+        """
+        Delete expired entries, then the oldest entries until the cache is back under 90% of max_bytes.
+        """
+        try:
+            conn = self._conn()
+            conn.execute('delete from cache where expires > 0 and expires < ?', (time.time(),))
+            total = conn.execute('select coalesce(sum(size), 0) from cache').fetchone()[0]
+            if total <= self.max_bytes:
+                return
+            excess = total - int(self.max_bytes * 0.9)
+            cutoff, freed, count = None, 0, 0
+            for created, size in conn.execute('select created, size from cache order by created'):
+                cutoff, freed, count = created, freed + size, count + 1
+                if freed >= excess:
+                    break
+            conn.execute('delete from cache where created <= ?', (cutoff,))
+            self._stats['evictions'] += count
+            log.debug('disk cache %s evicted %d entries' % (self.path, count))
+        except sqlite3.Error as e:
+            self._error('evict', e)
+
+    def clear(self, dataset=None):
+        """
+        Delete all entries, or those of one dataset.
+        """
+        try:
+            if dataset is None:
+                self._conn().execute('delete from cache')
+            else:
+                self._conn().execute('delete from cache where dataset = ?', (dataset,))
+        except sqlite3.Error as e:
+            self._error('clear', e)
+
+    def stats(self):
+        """
+        :return: dict hits, misses, writes, evictions, errors of this process, plus entries and bytes in the file
+        """
+        stats = dict(self._stats)
+        try:
+            stats['entries'], stats['bytes'] = self._conn().execute(
+                'select count(*), coalesce(sum(size), 0) from cache').fetchone()
+        except sqlite3.Error as e:
+            self._error('stats', e)
+        return stats
+
+    def _error(self, action, error):
+        self._stats['errors'] += 1
+        log.debug('disk cache %s %s failed: %s' % (self.path, action, error))
+
+
+def _dumps(value):
+    data = pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+    if len(data) >= COMPRESS_MIN_BYTES:
+        return b'z' + zlib.compress(data)
+    return b'p' + data
+
+def _loads(blob):
+    blob = bytes(blob)
+    if blob[:1] == b'z':
+        return pickle.loads(zlib.decompress(blob[1:]))
+    return pickle.loads(blob[1:])
+
+##########################################################################################
+#
+#       Shared disk caches
+#
+##########################################################################################
+
+_disk_caches = {}
+_disk_caches_lock = threading.Lock()
+
+def get_disk_cache(section):
+    """
+    Disk cache configured for a config section: cache_dir (unset or empty disables it)
+    and disk_cache_max_bytes. Sections with the same cache_dir share one file.
+    :return: DiskCache or None
+    """
+    from .dataset import config_option
+    cache_dir = config_option(section, 'cache_dir', '')
+    if not cache_dir:
+        return None
+    path = os.path.join(os.path.expanduser(cache_dir), 'medgen-cache.sqlite')
+    with _disk_caches_lock:
+        if path not in _disk_caches:
+            _disk_caches[path] = DiskCache(path, config_option(section, 'disk_cache_max_bytes', 1024 ** 3))
+        return _disk_caches[path]
+
+def disk_caches():
+    """
+    :return: disk caches opened by this process
+    """
+    with _disk_caches_lock:
+        return list(_disk_caches.values())
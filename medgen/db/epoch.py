@@ -0,0 +1,217 @@
+from __future__ import absolute_import
+
+import os
+import time
+import threading
+
+from ..log import log
+
+##########################################################################################
+#
+#       Dataset epochs
+#
+##########################################################################################
+
+class DatasetEpoch(object):
+    """
+    Tracks the load epoch of one dataset (host, port, database): the value of
+    SQLData.dataset_epoch(), which changes whenever the dataset is reloaded.
+
+    The epoch is probed at most every `interval` seconds, by whichever caller asks for it
+    (or by the background probe thread). When it changes, every listener registered with
+    on_epoch_change() is called so caches can drop that dataset's entries.
+    """
+    def __init__(self, key, interval=60):
+        """
+        :param key: (host, port, dataset)
+        :param interval: seconds between probes
+        """
+        self.key = key
+        self.interval = float(interval)
+        self.epoch = None
+        self.checked_at = 0
+        self.changes = 0
+        self._db = None
+        self._lock = threading.Lock()
+
+    def current(self, db=None):
+        """
+        :param db: SQLData used to probe the dataset, remembered for the probe thread
+        :return: epoch, probing the dataset if the last probe is older than interval;
+                 None while it is unknown (no probe has succeeded yet)
+        """
+        if db is not None:
+            self._db = db
+        if time.time() - self.checked_at < self.interval:
+            return self.epoch
+        # one thread probes, the others keep using the known epoch, or wait for the probe if there is none yet
+        if not self._lock.acquire(self.epoch is None):
+            return self.epoch
+        try:
+            if time.time() - self.checked_at >= self.interval:
+                self.probe()
+        finally:
+            self._lock.release()
+        return self.epoch
+
+    def probe(self):
+        """
+        Read the dataset's epoch now and notify listeners if it changed.
+        """
+        if self._db is None:
+            return
+        try:
+            epoch = self._db.dataset_epoch()
+        except Exception as e:
+            log.warn('could not read load epoch of %s: %r' % (self.key[2], e))
+            self.checked_at = time.time()
+            return
+        self.checked_at = time.time()
+
+        old, self.epoch = self.epoch, epoch
+        if old is not None and old != epoch:
+            self.changes += 1
+            log.info('dataset %s reloaded (epoch %s -> %s), invalidating caches' % (self.key[2], old, epoch))
+            for callback in list(_listeners):
+                try:
+                    callback(self.key, old, epoch)
+                except Exception as e:
+                    log.warn('epoch change listener %r failed for %s: %r' % (callback, self.key[2], e))
+
+    def stats(self):
+        """
+        :return: dict epoch, checked_at, changes, interval
+        """
+        return {'epoch': self.epoch, 'checked_at': self.checked_at, 'changes': self.changes, 'interval': self.interval}
+
+##########################################################################################
+#
+#       Epoch registry and listeners
+#
+##########################################################################################
+
+_epochs = {}
+_epochs_lock = threading.Lock()
+_listeners = []
+
+def dataset_epoch(db):
+    """
+    Current load epoch of db's dataset, shared by every SQLData instance on that database.
+    Probed at most every epoch_check_interval seconds (config, default 60).
+    :param db: SQLData
+    :return: epoch (opaque, comparable), None if it could not be read
+    """
+    key = (db._db_host, db._db_port, db._db_name)
+    tracker = _epochs.get(key)
+    if tracker is None:
+        from .dataset import config_option
+        with _epochs_lock:
+            tracker = _epochs.get(key)
+            if tracker is None:
+                tracker = _epochs[key] = DatasetEpoch(key, config_option(db._cfg_section, 'epoch_check_interval', 60))
+        if config_option(db._cfg_section, 'epoch_probe_thread', 'false').lower() in ('true', 'yes', 'on', '1'):
+            start_epoch_probe()
+    return tracker.current(db)
+
+def on_epoch_change(callback):
+    """
+    Register callback(key, old_epoch, new_epoch), called when a dataset is reloaded.
+    key is (host, port, dataset).
+    """
+    if callback not in _listeners:
+        _listeners.append(callback)
+    return callback
+
+def check_epochs():
+    """
+    Probe every known dataset now, regardless of epoch_check_interval.
+    """
+    with _epochs_lock:
+        trackers = list(_epochs.values())
+    for tracker in trackers:
+        with tracker._lock:
+            tracker.probe()
+
+def epoch_stats():
+    """
+    :return: dict of dataset name to DatasetEpoch.stats()
+    """
+    with _epochs_lock:
+        trackers = list(_epochs.values())
+    return dict(('%s:%s/%s' % tracker.key, tracker.stats()) for tracker in trackers)
+
+##########################################################################################
+#
+#       In memory structures per dataset, rebuilt after a reload
+#
+##########################################################################################
+
+_structures = {}
+_structures_lock = threading.Lock()
+
+def shared_structure(db, name, build):
+    """
+    An in memory structure built from db's dataset (a graph, a matrix, an identifier map), shared by
+    the whole process: built on first use, and again when the dataset's epoch has changed.
+
+        get_concept_graph = lambda db: shared_structure(db, 'concept_graph', build_concept_graph)
+
+    :param db: SQLData
+    :param name: structure name, unique per dataset
+    :param build: function(db) -> structure (any object with attributes, and a length)
+    :return: structure, with .epoch set to the dataset epoch it was built at
+    """
+    key = (db._db_host, db._db_port, db._db_name, name)
+    epoch = dataset_epoch(db)
+    structure = _structures.get(key)
+    if structure is not None and structure.epoch == epoch:
+        return structure
+
+    # one build per structure, other callers wait for it
+    with _structures_lock:
+        structure = _structures.get(key)
+        if structure is None or structure.epoch != epoch:
+            structure = build(db)
+            structure.epoch = epoch
+            _structures[key] = structure
+            log.info('built %s for %s: %d entries' % (name, db._db_name, len(structure)))
+    return structure
+
+@on_epoch_change
+def _drop_structures(key, old_epoch, new_epoch):
+    with _structures_lock:
+        for structure_key in list(_structures):
+            if structure_key[:3] == key:
+                del _structures[structure_key]
+
+##########################################################################################
+#
+#       Background probe
+#
+##########################################################################################
+
+_probe = {'thread': None, 'pid': None}
+_probe_lock = threading.Lock()
+
+def _probe_loop():
+    while True:
+        with _epochs_lock:
+            trackers = list(_epochs.values())
+        for tracker in trackers:
+            tracker.current()
+        time.sleep(min([tracker.interval for tracker in trackers] or [60]))
+
+def start_epoch_probe():
+    """
+    Start a daemon thread that keeps every known dataset's epoch fresh, so invalidation
+    does not wait for the next cached call. Enabled with "epoch_probe_thread: true";
+    a forked child starts its own thread on first use.
+    """
+    with _probe_lock:
+        if _probe['thread'] is not None and _probe['pid'] == os.getpid() and _probe['thread'].is_alive():
+            return
+        thread = threading.Thread(target=_probe_loop, name='medgen-epoch-probe')
+        thread.daemon = True
+        thread.start()
+        _probe['thread'] = thread
+        _probe['pid'] = os.getpid()
@@ -1,6 +1,17 @@
 from __future__ import absolute_import
 
-from .dataset import SQLData
+from .dataset import SQLData, config_option, select_fields
+from .gene_index import get_gene_symbol_index, fold_symbol
+from .bloom import maybe_present
+from .cache import cached
+
+def _gene_symbol_keys(db):
+    for symbol, nomen_symbol, synonyms in db.fetch_iter('select Symbol, Nomen_symbol, Synonyms from gene_info',
+                                                        chunk_size=10000, row_format='tuple'):
+        yield symbol
+        yield nomen_symbol
+        for synonym in (synonyms or '').split('|'):
+            yield synonym or None
 
 ##########################################################################################
 #
@@ -8,41 +19,6 @@ from .dataset import SQLData
 #
 ##########################################################################################
 
-#TODO: @nthmost: refactor
-class GeneBorg:
-    __shared_state = {}
-    __gene2pubmed = {}
-    __gene2id = {}
-    cnt = 0
-
-    def __init__(self, db):
-        self.__dict__ = self.__shared_state
-        self._db = db
-
-    def gene2pubmed(self, ncbi_gene_id):
-        """
-        mysql> desc gene.gene2pubmed;
-        +--------+------------------+------+-----+---------+-------+
-        | tax_id | int(5) unsigned  | YES  | MUL | NULL    |       |
-        | GeneID | int(10) unsigned | YES  | MUL | NULL    |       |
-        | PMID   | varchar(10)      | YES  | MUL | NULL    |       |
-        +--------+------------------+------+-----+---------+-------+
-        """
-        ncbi_gene_id = self._db.get_gene_id(ncbi_gene_id)
-        if ncbi_gene_id not in self.__gene2pubmed:
-            self.__gene2pubmed[ncbi_gene_id] = self._db.fetchall("select PMID from gene2pubmed where GeneID = '?' ".
-                             replace('?', str(ncbi_gene_id)))
-            self.cnt += 1
-        return self.__gene2pubmed[ncbi_gene_id]
-
-    def get_gene_id_for_gene_name(self, hgnc_gene_name_symbol):
-        if hgnc_gene_name_symbol not in self.__gene2id:
-            self.__gene2id[hgnc_gene_name_symbol] = self._db.fetchID("select GeneID as ID from gene_info where Symbol = '?' limit 1".
-                            replace('?', str(hgnc_gene_name_symbol).upper()))
-            self.cnt += 1
-
-        return self.__gene2id[hgnc_gene_name_symbol]
-
 class GeneDB(SQLData):
     """
     NCBI Entrez Gene contains links to pubmed (gene2pubmed), MedGen, OMIM, and other sources.
@@ -50,24 +26,96 @@ class GeneDB(SQLData):
     def __init__(self):
         super(GeneDB, self).__init__(config_section='gene')
 
+    @cached
     def gene2pubmed(self, ncbi_gene_id):
         """
         Get pubmed entries for gene
 
         cached: gene2pubmed entries for Entrez GeneID
 
+        mysql> desc gene.gene2pubmed;
+        +--------+------------------+------+-----+---------+-------+
+        | tax_id | int(5) unsigned  | YES  | MUL | NULL    |       |
+        | GeneID | int(10) unsigned | YES  | MUL | NULL    |       |
+        | PMID   | varchar(10)      | YES  | MUL | NULL    |       |
+        +--------+------------------+------+-----+---------+-------+
+
         :param ncbi_gene_id: int
         :return: list of PMIDs
         """
-        return GeneBorg(self).gene2pubmed(ncbi_gene_id)
+        ncbi_gene_id = self.get_gene_id(ncbi_gene_id)
+        return self.fetchall("select PMID from gene2pubmed where GeneID = %s ", [ncbi_gene_id])
+
+    def gene2pubmed_many(self, ncbi_gene_ids):
+        """
+        Batch gene2pubmed: one "GeneID in (...)" query for any number of genes.
+        :param ncbi_gene_ids: Entrez GeneIDs
+        :return: dict GeneID -> list of rows GeneID, PMID
+        """
+        return self.fetchall_by("select GeneID, PMID from gene2pubmed where GeneID in ({})", 'GeneID',
+                                [int(gene_id) for gene_id in ncbi_gene_ids])
+
+    def symbol_index(self):
+        """
+        In memory Symbol/Synonyms index shared by all GeneDB instances,
+        when enabled with "symbol_index: true" in the gene config section, else None.
+        Without it, name lookups run one query per distinct name and the answers are cached.
+        :return: GeneSymbolIndex
+        """
+        if config_option(self._cfg_section, 'symbol_index', 'false').lower() not in ('true', 'yes', 'on', '1'):
+            return None
+        return get_gene_symbol_index(self)
 
     def get_gene_id_for_gene_name(self, hgnc_gene_name_symbol):
         """
         cached: Get GeneName (hugo hgnc) for GeneID (ncbi entrez)
         """
-        return GeneBorg(self).get_gene_id_for_gene_name(hgnc_gene_name_symbol)
+        index = self.symbol_index()
+        if index is not None:
+            return index.gene_id(hgnc_gene_name_symbol)
+        return self._gene_id_for_symbol(fold_symbol(hgnc_gene_name_symbol))
+
+    @cached
+    def _gene_id_for_symbol(self, symbol):
+        if not maybe_present(self, 'gene_symbols', _gene_symbol_keys, [symbol]):
+            return None
+        return self.fetchID("select GeneID as ID from gene_info where Symbol = %s limit 1", args=[symbol])
+
+    def get_gene_id_for_gene_name_many(self, hgnc_gene_name_symbols):
+        """
+        Batch get_gene_id_for_gene_name: one query (none with the symbol index) for any number of symbols.
+        :param hgnc_gene_name_symbols: gene symbols
+        :return: dict symbol -> GeneID, None for unknown symbols
+        """
+        symbols = list(hgnc_gene_name_symbols)
+        index = self.symbol_index()
+        if index is not None:
+            return dict((symbol, index.gene_id(symbol)) for symbol in symbols)
+
+        found = {}
+        for row in self.fetchall_in("select GeneID, Symbol from gene_info where Symbol in ({})",
+                                    maybe_present(self, 'gene_symbols', _gene_symbol_keys,
+                                                  [fold_symbol(symbol) for symbol in symbols])):
+            found.setdefault(fold_symbol(row['Symbol']), row['GeneID'])
+        return dict((symbol, found.get(fold_symbol(symbol))) for symbol in symbols)
+
+    def get_gene_name_many(self, ncbi_gene_ids):
+        """
+        Batch get_gene_name: one query (none with the symbol index) for any number of GeneIDs.
+        :param ncbi_gene_ids: Entrez GeneIDs
+        :return: dict GeneID -> Symbol, None for unknown GeneIDs
+        """
+        gene_ids = [int(gene_id) for gene_id in ncbi_gene_ids]
+        index = self.symbol_index()
+        if index is not None:
+            return dict((gene_id, index.gene_name(gene_id)) for gene_id in gene_ids)
+
+        found = dict((row['GeneID'], row['Symbol']) for row in
+                     self.fetchall_in("select GeneID, Symbol from gene_info where GeneID in ({})", gene_ids))
+        return dict((gene_id, found.get(gene_id)) for gene_id in gene_ids)
 
-    def gene2mim(self, ncbi_gene_id):
+    @cached
+    def gene2mim(self, ncbi_gene_id, fields=None):
         """
         Online Mendelian Inheritance in Man (OMIM) is a standard reference
 
@@ -83,12 +131,23 @@ class GeneDB(SQLData):
         +-----------+------------------+------+-----+---------+-------+
 
         :param ncbi_gene_id: int
+        :param fields: columns to return (default all)
         :return: OMIM identifiers with links to MedGen.
         """
         ncbi_gene_id = self.get_gene_id(ncbi_gene_id)
-        return self.fetchall("select * from mim2gene_medgen where GeneID = ?".
-                             replace('?', str(ncbi_gene_id)))
+        return self.fetchall("select {} from mim2gene_medgen where GeneID = %s".format(select_fields(fields)), [ncbi_gene_id])
 
+    def gene2mim_many(self, ncbi_gene_ids, fields=None):
+        """
+        Batch gene2mim.
+        :param ncbi_gene_ids: Entrez GeneIDs
+        :param fields: columns to return (default all, GeneID is always included)
+        :return: dict GeneID -> list of mim2gene_medgen rows
+        """
+        return self.fetchall_by("select {} from mim2gene_medgen where GeneID in ({{}})".format(select_fields(fields, ['GeneID'])),
+                                'GeneID', [int(gene_id) for gene_id in ncbi_gene_ids])
+
+    @cached
     def gene_function(self, ncbi_gene_id):
         """
         get gene-reference-in-function (RIF) for a given gene id.
@@ -98,8 +157,16 @@ class GeneDB(SQLData):
         :return: SQL result GeneRIF with list of pubmeds
         """
         ncbi_gene_id = self.get_gene_id(ncbi_gene_id)
-        return self.fetchall("select distinct pubmeds, GeneRIF from generifs_basic  where GeneID = '?' ".
-                             replace('?', str(ncbi_gene_id)))
+        return self.fetchall("select distinct pubmeds, GeneRIF from generifs_basic  where GeneID = %s ", [ncbi_gene_id])
+
+    def gene_function_many(self, ncbi_gene_ids):
+        """
+        Batch gene_function.
+        :param ncbi_gene_ids: Entrez GeneIDs
+        :return: dict GeneID -> list of rows GeneID, pubmeds, GeneRIF
+        """
+        return self.fetchall_by("select distinct GeneID, pubmeds, GeneRIF from generifs_basic where GeneID in ({})",
+                                'GeneID', [int(gene_id) for gene_id in ncbi_gene_ids])
 
 
     def get_gene_id(self, gene):
@@ -118,6 +185,7 @@ class GeneDB(SQLData):
         else:
             return gene
 
+    @cached
     def get_gene_name(self, ncbi_gene_id):
         """
         Get HUGO Gene Name (Symbol) for Entrez gene ID
@@ -126,13 +194,17 @@ class GeneDB(SQLData):
         """
         ncbi_gene_id = self.get_gene_id(ncbi_gene_id)
 
-        return self.fetchID("select Symbol as ID from gene_info where GeneID = '?' limit 1".
-                            replace('?', str(ncbi_gene_id)))
+        index = self.symbol_index()
+        if index is not None:
+            return index.gene_name(ncbi_gene_id)
+        return self.fetchID("select Symbol as ID from gene_info where GeneID = %s limit 1", args=[ncbi_gene_id])
 
-    def get_gene_info(self, ncbi_gene_id):
+    @cached
+    def get_gene_info(self, ncbi_gene_id, fields=None):
         """
         NCBI Gene Info for a given gene
         :param ncbi_gene_id: gene id (integer)
+        :param fields: columns to return (default all), e.g. ('Symbol', 'GeneDesc') to skip the large text columns
         :return: SQL result
 
         mysql> desc gene.get_gene_info;
@@ -158,8 +230,18 @@ class GeneDB(SQLData):
         """
         ncbi_gene_id = self.get_gene_id(ncbi_gene_id)
 
-        return self.fetchrow("select * from gene_info where GeneID = '?' limit 1".
-                             replace('?', str(ncbi_gene_id)))
+        return self.fetchrow("select {} from gene_info where GeneID = %s limit 1".format(select_fields(fields)), [ncbi_gene_id])
+
+    def get_gene_info_many(self, ncbi_gene_ids, fields=None):
+        """
+        Batch get_gene_info.
+        :param ncbi_gene_ids: Entrez GeneIDs
+        :param fields: columns to return (default all, GeneID is always included)
+        :return: dict GeneID -> gene_info row, None for unknown GeneIDs
+        """
+        found = self.fetchall_by("select {} from gene_info where GeneID in ({{}})".format(select_fields(fields, ['GeneID'])),
+                                 'GeneID', [int(gene_id) for gene_id in ncbi_gene_ids])
+        return dict((gene_id, rows[0] if rows else None) for gene_id, rows in found.items())
 
     def get_gene_synonyms(self, symbol):
         """
@@ -168,28 +250,39 @@ class GeneDB(SQLData):
         :param symbol: Hugo gene name
         :return: list [Synonyms, Symbol, GeneID]
         """
+        index = self.symbol_index()
+        if index is not None:
+            return index.gene_synonyms(symbol)
+        return self._gene_synonyms(fold_symbol(symbol))
+
+    @cached
+    def _gene_synonyms(self, symbol):
         _sql = """
         select Synonyms, Symbol, GeneID
-         from gene_info where Symbol = '?' OR
-        (Synonyms    = '?' or
-        Synonyms like '%|?' or
-        Synonyms like '?|%' or
-        Synonyms like '%|?|%') OR
-        Nomen_symbol = '?'
-        """.replace('?', symbol)
-        return self.fetchall(_sql)
+         from gene_info where Symbol = %s OR
+        (Synonyms    = %s or
+        Synonyms like %s or
+        Synonyms like %s or
+        Synonyms like %s) OR
+        Nomen_symbol = %s
+        """
+        if not maybe_present(self, 'gene_symbols', _gene_symbol_keys, [symbol]):
+            return []
+        return self.fetchall(_sql, [symbol, symbol, '%|' + symbol, symbol + '|%', '%|' + symbol + '|%', symbol])
 
 
+    @cached
     def get_gene_list_from_mim(self, mim):
         sql = """
             SELECT Symbol AS gene_name FROM gene_info WHERE GeneID IN
-            (SELECT  DISTINCT GeneID from mim2gene_medgen WHERE MIM = {})
-        """.format(mim)
+            (SELECT  DISTINCT GeneID from mim2gene_medgen WHERE MIM = %s)
+        """
 
-        return self.list_genes(sql)
+        return self.list_genes(sql, [mim])
 
 
     #TODO: @andymc: delete?
+    @cached
     def gene2accession_for_known_acc(self, accession):
         """
         BRCA2 example:
@@ -208,10 +301,10 @@ class GeneDB(SQLData):
         """
         _select  = "SELECT distinct GeneID as ID from gene2accession "
         _where   = " where STATUS = 'REVIEWED' and tax_id = '9606' "
-        _rna     = " RNA_acc_ver     = '?' "
-        _protein = " Protein_acc_ver = '?' "
-        _genomic = " Genomic_acc_ver = '?' "
+        _rna     = " RNA_acc_ver     = %(accession)s "
+        _protein = " Protein_acc_ver = %(accession)s "
+        _genomic = " Genomic_acc_ver = %(accession)s "
         _sql     = (_select + _where + " AND (" +_rna + " or " + _protein + " or " + _genomic + " ) limit 1")
 
-        return self.fetchID(_sql.replace('?', accession))
+        return self.fetchID(_sql, args={'accession': accession})
 
@@ -0,0 +1,122 @@
+from __future__ import absolute_import
+
+from .epoch import shared_structure
+
+def fold_symbol(symbol):
+    """
+    Lookup key of a gene name (str or unicode): upper case, like the case insensitive collation of gene_info.
+    """
+    return symbol.upper() if isinstance(symbol, basestring) else str(symbol).upper()
+
+##########################################################################################
+#
+#       Gene Symbol Index
+#
+##########################################################################################
+
+class GeneSymbolIndex(object):
+    """
+    In memory index over gene_info Symbol, Synonyms and Nomen_symbol.
+
+    gene_info is read once; pipe delimited Synonyms are exploded so that synonym,
+    preferred name and Symbol -> GeneID lookups are dictionary hits instead of
+    "Synonyms like '%|?|%'" table scans. Keys are upper case, like the case insensitive
+    collation the SQL lookups relied on.
+
+    Use get_gene_symbol_index, which rebuilds the index when the gene dataset's load epoch changes.
+    """
+    def __init__(self, db):
+        """
+        :param db: GeneDB used to load gene_info
+        """
+        rows = []
+        by_symbol = {}
+        by_alias = {}
+        by_id = {}
+
+        for row in db.fetch_iter('select GeneID, Symbol, Synonyms, Nomen_symbol from gene_info'):
+            gene = (row['GeneID'], row['Symbol'], row['Synonyms'])
+            pos = len(rows)
+            rows.append(gene)
+            by_id.setdefault(row['GeneID'], pos)
+
+            aliases = set()
+            if row['Symbol']:
+                by_symbol.setdefault(row['Symbol'].upper(), []).append(pos)
+                aliases.add(row['Symbol'].upper())
+            if row['Nomen_symbol']:
+                aliases.add(row['Nomen_symbol'].upper())
+            if row['Synonyms']:
+                aliases.update(alias.upper() for alias in row['Synonyms'].split('|'))
+            for alias in aliases:
+                by_alias.setdefault(alias, []).append(pos)
+
+        self._data = {'rows': rows, 'by_symbol': by_symbol, 'by_alias': by_alias, 'by_id': by_id}
+
+    def __len__(self):
+        return len(self._data['rows'])
+
+    def gene_synonyms(self, symbol):
+        """
+        Same rows as GeneDB.get_gene_synonyms: genes whose Symbol, Nomen_symbol or one of the Synonyms is symbol.
+        :param symbol: gene name
+        :return: list of dict(Synonyms, Symbol, GeneID)
+        """
+        data = self._data
+        rows = [data['rows'][pos] for pos in data['by_alias'].get(symbol.upper(), [])]
+        return [{'GeneID': gene_id, 'Symbol': name, 'Synonyms': synonyms} for gene_id, name, synonyms in rows]
+
+    def gene_ids_for_alias(self, alias):
+        """
+        :param alias: Symbol, Nomen_symbol or synonym
+        :return: list of GeneIDs (more than one if the alias is ambiguous)
+        """
+        data = self._data
+        return [data['rows'][pos][0] for pos in data['by_alias'].get(alias.upper(), [])]
+
+    def is_ambiguous(self, alias):
+        """
+        :return: True if alias names more than one gene
+        """
+        return len(self.gene_ids_for_alias(alias)) > 1
+
+    def preferred_names(self, alias):
+        """
+        :param alias: Symbol, Nomen_symbol or synonym
+        :return: sorted official Symbols of the genes the alias refers to
+        """
+        data = self._data
+        return sorted(set(data['rows'][pos][1] for pos in data['by_alias'].get(alias.upper(), [])))
+
+    def gene_id(self, symbol):
+        """
+        :param symbol: official gene Symbol
+        :return: GeneID, or None if no gene has this Symbol
+        """
+        data = self._data
+        positions = data['by_symbol'].get(fold_symbol(symbol))
+        return data['rows'][positions[0]][0] if positions else None
+
+    def gene_name(self, gene_id):
+        """
+        :param gene_id: Entrez GeneID
+        :return: Symbol, or None if the GeneID is unknown
+        """
+        data = self._data
+        pos = data['by_id'].get(int(gene_id))
+        return data['rows'][pos][1] if pos is not None else None
+
+##########################################################################################
+#
+#       Shared indexes
+#
+##########################################################################################
+
+def get_gene_symbol_index(db):
+    """
+    One index per gene database (host, port, dataset), shared by every GeneDB instance,
+    built on first use and again after the dataset is reloaded.
+    :param db: GeneDB
+    :return: GeneSymbolIndex
+    """
+    return shared_structure(db, 'gene_symbol_index', GeneSymbolIndex)
@@ -0,0 +1,225 @@
+from __future__ import absolute_import
+
+from array import array
+from collections import OrderedDict
+
+from .epoch import shared_structure
+
+##########################################################################################
+#
+#       CSR adjacency
+#
+##########################################################################################
+
+class CSR(object):
+    """
+    Compressed sparse row adjacency: the targets of node n are indices[indptr[n]:indptr[n + 1]],
+    with the type code of each edge at the same position in codes. Stored in flat arrays,
+    so a graph with millions of edges takes a few bytes per edge instead of a list per node.
+    """
+    def __init__(self, count, edges):
+        """
+        :param count: number of nodes
+        :param edges: list of (source, target, code) node numbers, sorted
+        """
+        self.indptr = array('l', [0]) * (count + 1)
+        for source, _, _ in edges:
+            self.indptr[source + 1] += 1
+        for node in xrange(count):
+            self.indptr[node + 1] += self.indptr[node]
+        self.indices = array('l', (target for _, target, _ in edges))
+        self.codes = array('H', (code for _, _, code in edges))
+
+    def neighbors(self, node, codes=None):
+        """
+        :param node: node number
+        :param codes: set of edge type codes to follow (default all)
+        :return: list of node numbers
+        """
+        start, stop = self.indptr[node], self.indptr[node + 1]
+        if codes is None:
+            return self.indices[start:stop].tolist()
+        edge_codes = self.codes
+        return [self.indices[position] for position in xrange(start, stop) if edge_codes[position] in codes]
+
+def walk(csrs, nodes, max_depth=None, codes=None):
+    """
+    Breadth first traversal along the edges of one or more CSRs over the same nodes
+    (both directions of a graph: the forward and the reverse CSR).
+
+    :param csrs: list of CSR
+    :param nodes: start node numbers (depth 0)
+    :param max_depth: stop after this many edges (default no limit)
+    :param codes: set of edge type codes to follow (default all)
+    :return: OrderedDict node -> depth, in the order reached
+    """
+    depths = OrderedDict((node, 0) for node in nodes)
+    frontier = list(depths)
+    depth = 0
+    while frontier and (max_depth is None or depth < max_depth):
+        depth += 1
+        reached = []
+        for csr in csrs:
+            indptr, indices, edge_codes = csr.indptr, csr.indices, csr.codes
+            for node in frontier:
+                for position in xrange(indptr[node], indptr[node + 1]):
+                    if codes is not None and edge_codes[position] not in codes:
+                        continue
+                    target = indices[position]
+                    if target not in depths:
+                        depths[target] = depth
+                        reached.append(target)
+        frontier = reached
+    return depths
+
+##########################################################################################
+#
+#       Labeled graph
+#
+##########################################################################################
+
+class Graph(object):
+    """
+    Directed graph over string labels (like CUIs), numbered 0..n-1 and held as CSR adjacency
+    in both directions, so successors and predecessors are both a slice of an array.
+    Edges may carry a type (like an MGREL relationship), stored as a small integer code.
+
+    Traversals take a direction: 'forward' (source to target), 'reverse', or 'both'.
+    """
+    def __init__(self, edges, edge_types=None):
+        """
+        :param edges: iterable of (source, target) or (source, target, edge type)
+        :param edge_types: edge type names, in code order (default: in the order they occur, at most 65536)
+        """
+        self.labels = []
+        self._nodes = {}
+        self.edge_types = list(edge_types or [])
+        self._codes = dict((edge_type, code) for code, edge_type in enumerate(self.edge_types))
+
+        numbered = set()
+        for edge in edges:
+            source, target = self._number(edge[0]), self._number(edge[1])
+            if source is None or target is None:
+                continue
+            numbered.add((source, target, self._code(edge[2] if len(edge) > 2 else None)))
+
+        edges = sorted(numbered)
+        self.forward = CSR(len(self.labels), edges)
+        self.reverse = CSR(len(self.labels), sorted((target, source, code) for source, target, code in edges))
+        self.edge_count = len(edges)
+
+    def _number(self, label):
+        if label is None:
+            return None
+        node = self._nodes.get(label)
+        if node is None:
+            node = self._nodes[label] = len(self.labels)
+            self.labels.append(label)
+        return node
+
+    def _code(self, edge_type):
+        code = self._codes.get(edge_type)
+        if code is None:
+            if len(self.edge_types) > 0xffff:
+                raise ValueError('more than 65536 edge types')
+            code = self._codes[edge_type] = len(self.edge_types)
+            self.edge_types.append(edge_type)
+        return code
+
+    def __len__(self):
+        return len(self.labels)
+
+    def __contains__(self, label):
+        return label in self._nodes
+
+    def node(self, label):
+        """
+        :return: node number of label, or None
+        """
+        return self._nodes.get(label)
+
+    def type_codes(self, edge_types):
+        """
+        :param edge_types: edge type or list of them, or None for all
+        :return: set of codes, or None for all
+        """
+        if edge_types is None:
+            return None
+        if isinstance(edge_types, (basestring, tuple)):
+            edge_types = [edge_types]
+        return set(self._codes[edge_type] for edge_type in edge_types if edge_type in self._codes)
+
+    def _csrs(self, direction):
+        if direction == 'forward':
+            return [self.forward]
+        if direction == 'reverse':
+            return [self.reverse]
+        if direction == 'both':
+            return [self.forward, self.reverse]
+        raise ValueError("direction must be 'forward', 'reverse' or 'both'")
+
+    def neighbors(self, label, direction='forward', edge_types=None):
+        """
+        :param label: node label
+        :param direction: 'forward' (targets), 'reverse' (sources) or 'both'
+        :param edge_types: edge types to follow (default all)
+        :return: list of labels without duplicates, empty for unknown labels
+        """
+        node = self._nodes.get(label)
+        if node is None:
+            return []
+        codes = self.type_codes(edge_types)
+        labels = self.labels
+        seen = set()
+        neighbors = []
+        for csr in self._csrs(direction):
+            for neighbor in csr.neighbors(node, codes):
+                if neighbor not in seen:
+                    seen.add(neighbor)
+                    neighbors.append(labels[neighbor])
+        return neighbors
+
+    def successors(self, label, edge_types=None):
+        """
+        :return: labels of the targets of label's edges, see neighbors
+        """
+        return self.neighbors(label, 'forward', edge_types)
+
+    def predecessors(self, label, edge_types=None):
+        """
+        :return: labels of the sources of edges to label, see neighbors
+        """
+        return self.neighbors(label, 'reverse', edge_types)
+
+    def walk(self, labels, direction='forward', max_depth=None, edge_types=None):
+        """
+        Breadth first traversal from labels.
+        :param labels: start label or labels (depth 0), unknown labels are skipped
+        :param direction: 'forward', 'reverse' or 'both'
+        :param max_depth: stop after this many edges (default no limit)
+        :param edge_types: edge types to follow (default all)
+        :return: OrderedDict label -> depth, in the order reached
+        """
+        if isinstance(labels, basestring):
+            labels = [labels]
+        nodes = [self._nodes[label] for label in labels if label in self._nodes]
+        names = self.labels
+        return OrderedDict((names[node], depth) for node, depth in
+                           walk(self._csrs(direction), nodes, max_depth, self.type_codes(edge_types)).iteritems())
+
+##########################################################################################
+#
+#       Graphs per dataset, rebuilt after a reload
+#
+##########################################################################################
+
+def shared_graph(db, name, build):
+    """
+    The graph named name of db's dataset, built on first use and again after the dataset is reloaded
+    (see medgen.db.epoch.shared_structure).
+    :param db: SQLData
+    :param name: graph name, like 'disease_hierarchy'
+    :param build: function(db) -> Graph
+    :return: Graph, with .epoch set to the dataset epoch it was built at
+    """
+    return shared_structure(db, name, build)
@@ -0,0 +1,303 @@
+from __future__ import absolute_import, print_function
+
+import os
+import sys
+import json
+import mmap
+import zlib
+import struct
+import tempfile
+import threading
+
+from ..log import log
+
+##########################################################################################
+#
+#       Memory mapped HGVS -> ClinVar identifier index
+#
+##########################################################################################
+
+MAGIC = b'MGHGVS01'
+
+# magic, buckets, keys, values, then the byte offset of each section
+_HEADER = struct.Struct('<8sIII' + 'Q' * 9)
+_SECTIONS = ('buckets', 'key_offsets', 'keys', 'value_offsets', 'variation_ids', 'allele_ids',
+             'rcv_offsets', 'rcvs', 'epoch')
+
+_U32 = struct.Struct('<I')
+_U32_PAIR = struct.Struct('<II')
+_U64_PAIR = struct.Struct('<QQ')
+_I32 = struct.Struct('<i')
+
+def _key(hgvs_text):
+    """
+    Index key: upper case utf-8, matching the case insensitive collation of clinvar_hgvs.
+    """
+    if isinstance(hgvs_text, unicode):
+        hgvs_text = hgvs_text.encode('utf-8')
+    return str(hgvs_text).upper()
+
+def _bucket(key, mask):
+    return (zlib.crc32(key) & 0xffffffff) & mask
+
+
+class HGVSIndex(object):
+    """
+    Read-only, memory mapped index of clinvar_hgvs: hgvs_text -> (VariationID, AlleleID, RCVaccession) rows.
+
+    The file holds the keys grouped by hash bucket (sorted within a bucket), each key's range in
+    the VariationID, AlleleID and RCVaccession arrays, and the dataset epoch it was exported at.
+    A lookup hashes the key to its bucket and compares the few keys there, reading the mapped pages
+    in place: nothing is loaded up front, and every process on the host shares the page cache.
+
+    Build the file with write_hgvs_index / build_hgvs_index (python -m medgen.db.hgvs_index).
+    """
+    def __init__(self, path):
+        """
+        :param path: index file written by write_hgvs_index
+        """
+        self.path = path
+        with open(path, 'rb') as f:
+            self._stat = os.fstat(f.fileno())
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        header = _HEADER.unpack_from(self._map, 0)
+        if header[0] != MAGIC:
+            self._map.close()
+            raise ValueError('%s is not an HGVS index file' % path)
+        self.buckets, self.keys, self.values = header[1:4]
+        (self._buckets, self._key_offsets, self._keys, self._value_offsets, self._variation_ids,
+         self._allele_ids, self._rcv_offsets, self._rcvs, epoch) = header[4:]
+        self._id_arrays = {'VariationID': self._variation_ids, 'AlleleID': self._allele_ids}
+        self._mask = self.buckets - 1
+        self.epoch = self._map[epoch:].decode('utf-8')
+        self._rejected_epoch = None
+
+    def __len__(self):
+        return self.keys
+
+    def __contains__(self, hgvs_text):
+        return self._find(_key(hgvs_text)) is not None
+
+    def _find(self, key):
+        """
+        :return: position of key, or None
+        """
+        mm = self._map
+        start, stop = _U32_PAIR.unpack_from(mm, self._buckets + 4 * ((zlib.crc32(key) & 0xffffffff) & self._mask))
+        keys = self._keys
+        for position in xrange(start, stop):
+            begin, end = _U64_PAIR.unpack_from(mm, self._key_offsets + 8 * position)
+            if end - begin == len(key) and mm[keys + begin:keys + end] == key:
+                return position
+        return None
+
+    def lookup(self, hgvs_text):
+        """
+        :param hgvs_text: c.DNA, r.RNA, p.Protein, or g.Genomic (case insensitive)
+        :return: list of (VariationID, AlleleID, RCVaccession), empty when ClinVar does not know hgvs_text
+        """
+        position = self._find(_key(hgvs_text))
+        if position is None:
+            return []
+        mm = self._map
+        first, last = _U32_PAIR.unpack_from(mm, self._value_offsets + 4 * position)
+        rows = []
+        for value in xrange(first, last):
+            variation_id, = _I32.unpack_from(mm, self._variation_ids + 4 * value)
+            allele_id, = _I32.unpack_from(mm, self._allele_ids + 4 * value)
+            begin, end = _U64_PAIR.unpack_from(mm, self._rcv_offsets + 8 * value)
+            rows.append((variation_id if variation_id >= 0 else None,
+                         allele_id if allele_id >= 0 else None,
+                         mm[self._rcvs + begin:self._rcvs + end].decode('utf-8') if end > begin else None))
+        return rows
+
+    def ids(self, hgvs_text, id_column='VariationID'):
+        """
+        Same result as ClinVarDB.clinvar_ids: distinct identifiers of one kind.
+        :param id_column: 'VariationID', 'AlleleID', or 'RCVaccession'
+        :return: list of identifiers
+        """
+        position = self._find(_key(hgvs_text))
+        if position is None:
+            return []
+        mm = self._map
+        first, last = _U32_PAIR.unpack_from(mm, self._value_offsets + 4 * position)
+        ids = []
+        for value in xrange(first, last):
+            if id_column == 'RCVaccession':
+                begin, end = _U64_PAIR.unpack_from(mm, self._rcv_offsets + 8 * value)
+                found = mm[self._rcvs + begin:self._rcvs + end].decode('utf-8') if end > begin else None
+            else:
+                found, = _I32.unpack_from(mm, self._id_arrays[id_column] + 4 * value)
+                if found < 0:
+                    found = None
+            if found is not None and found not in ids:
+                ids.append(found)
+        return ids
+
+    def changed_on_disk(self):
+        """
+        :return: True if the file was replaced (a new export) since it was mapped
+        """
+        try:
+            stat = os.stat(self.path)
+        except OSError:
+            return False
+        return (stat.st_ino, stat.st_mtime) != (self._stat.st_ino, self._stat.st_mtime)
+
+    def close(self):
+        self._map.close()
+
+##########################################################################################
+#
+#       Export
+#
+##########################################################################################
+
+def epoch_text(epoch):
+    """
+    Canonical text of a dataset epoch, stored in the index: the same for the datetime MySQLdb returns and
+    the string sqlite3 returns, for ints and longs, and for str and unicode.
+    :param epoch: tuple from SQLData.dataset_epoch, or None
+    :return: unicode, e.g. u'["2016-01-01 00:00:00", "2016-01"]'
+    """
+    if epoch is None:
+        return u'null'
+    return unicode(json.dumps([None if part is None else unicode(part) for part in epoch]))
+
+def write_hgvs_index(path, rows, epoch=None):
+    """
+    Write an index file from clinvar_hgvs rows. The file is written next to path and renamed
+    over it, so processes mapping the old file keep reading it until they reopen.
+
+    :param path: index file
+    :param rows: iterable of (hgvs_text, VariationID, AlleleID, RCVaccession)
+    :param epoch: dataset epoch the rows were read at (stored as epoch_text)
+    :return: number of keys
+    """
+    grouped = {}
+    for hgvs_text, variation_id, allele_id, rcv in rows:
+        if hgvs_text is None:
+            continue
+        values = grouped.setdefault(_key(hgvs_text), [])
+        value = (variation_id, allele_id, rcv)
+        if value not in values:
+            values.append(value)
+
+    buckets = 1
+    while buckets < len(grouped):
+        buckets *= 2
+    mask = buckets - 1
+    keys = sorted(grouped, key=lambda key: (_bucket(key, mask), key))
+
+    sections = dict((name, []) for name in _SECTIONS)
+    bucket_starts = [0] * (buckets + 1)
+    for key in keys:
+        bucket_starts[_bucket(key, mask) + 1] += 1
+    for bucket in range(buckets):
+        bucket_starts[bucket + 1] += bucket_starts[bucket]
+    sections['buckets'] = [struct.pack('<%dI' % len(bucket_starts), *bucket_starts)]
+
+    key_size = value_count = rcv_size = 0
+    for key in keys:
+        sections['key_offsets'].append(struct.pack('<Q', key_size))
+        sections['keys'].append(key)
+        key_size += len(key)
+        sections['value_offsets'].append(_U32.pack(value_count))
+        for variation_id, allele_id, rcv in grouped[key]:
+            sections['variation_ids'].append(_I32.pack(-1 if variation_id is None else int(variation_id)))
+            sections['allele_ids'].append(_I32.pack(-1 if allele_id is None else int(allele_id)))
+            rcv = (rcv.encode('utf-8') if isinstance(rcv, unicode) else str(rcv)) if rcv is not None else b''
+            sections['rcv_offsets'].append(struct.pack('<Q', rcv_size))
+            sections['rcvs'].append(rcv)
+            rcv_size += len(rcv)
+            value_count += 1
+    sections['key_offsets'].append(struct.pack('<Q', key_size))
+    sections['value_offsets'].append(_U32.pack(value_count))
+    sections['rcv_offsets'].append(struct.pack('<Q', rcv_size))
+    sections['epoch'] = [epoch_text(epoch).encode('utf-8')]
+
+    offsets = []
+    position = _HEADER.size
+    for name in _SECTIONS:
+        offsets.append(position)
+        position += sum(len(part) for part in sections[name])
+
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp_path = tempfile.mkstemp(prefix='.hgvs-index-', dir=directory)
+    try:
+        with os.fdopen(fd, 'wb') as out:
+            out.write(_HEADER.pack(MAGIC, buckets, len(keys), value_count, *offsets))
+            for name in _SECTIONS:
+                out.writelines(sections[name])
+        os.chmod(tmp_path, 0o644)
+        os.rename(tmp_path, path)
+    except:
+        os.unlink(tmp_path)
+        raise
+    log.info('wrote HGVS index %s: %d keys, %d identifiers' % (path, len(keys), value_count))
+    return len(keys)
+
+def build_hgvs_index(db, path):
+    """
+    Export clinvar_hgvs from a ClinVarDB to an index file, stamped with the current dataset epoch.
+    :param db: ClinVarDB
+    :param path: index file
+    :return: number of keys
+    """
+    epoch = db.dataset_epoch()
+    rows = db.fetch_iter('select hgvs_text, VariationID, AlleleID, RCVaccession from clinvar_hgvs',
+                         chunk_size=10000, row_format='tuple')
+    return write_hgvs_index(path, rows, epoch)
+
+##########################################################################################
+#
+#       Shared index per file
+#
+##########################################################################################
+
+_indexes = {}
+_indexes_lock = threading.Lock()
+
+def get_hgvs_index(path, epoch):
+    """
+    The mapped index at path, if it was exported at the dataset's current epoch.
+    A file replaced on disk (a new export) is remapped.
+
+    :param path: index file
+    :param epoch: current dataset epoch
+    :return: HGVSIndex, or None if the file is missing or stale
+    """
+    current = epoch_text(epoch)
+    index = _indexes.get(path)
+    if index is not None and index.epoch == current:
+        return index
+
+    with _indexes_lock:
+        index = _indexes.get(path)
+        if index is None or index.changed_on_disk():
+            if not os.path.exists(path):
+                log.debug('HGVS index %s not found' % path)
+                return None
+            try:
+                index = _indexes[path] = HGVSIndex(path)
+            except (IOError, ValueError, mmap.error) as e:
+                log.warn('could not open HGVS index %s: %s' % (path, e))
+                return None
+    if index.epoch != current:
+        # once per file and dataset epoch, lookups fall back to SQL until the index is exported again
+        if index._rejected_epoch != current:
+            index._rejected_epoch = current
+            log.warn('HGVS index %s is not used: exported at epoch %s, dataset is at %s; re-export it with '
+                     'python -m medgen.db.hgvs_index %s' % (path, index.epoch, current, path))
+        return None
+    return index
+
+
+if __name__ == '__main__':
+    if len(sys.argv) != 2:
+        print('usage: python -m medgen.db.hgvs_index index_file')
+        sys.exit(1)
+    from .clinvar import ClinVarDB
+    print('%d keys' % build_hgvs_index(ClinVarDB(), sys.argv[1]))
@@ -0,0 +1,78 @@
+from __future__ import absolute_import
+
+from .graph import Graph, shared_graph
+
+##########################################################################################
+#
+#       MedGen disease hierarchy
+#
+##########################################################################################
+
+class DiseaseHierarchy(Graph):
+    """
+    The IS-A hierarchy of view_disease_subtype (MGREL CHD relationships) held in memory:
+    each edge goes from a disease to one of its subtypes. Transitive ancestors and
+    descendants are a breadth first walk over the CSR arrays instead of one query per level.
+    """
+    def parents(self, cui):
+        """
+        :param cui: MedGen concept ID
+        :return: list of CUIs one level up (like MedGenDB.disease_parents)
+        """
+        return self.predecessors(cui)
+
+    def subtypes(self, cui):
+        """
+        :param cui: MedGen concept ID
+        :return: list of CUIs one level down (like MedGenDB.disease_subtypes)
+        """
+        return self.successors(cui)
+
+    def ancestors(self, cui, max_depth=None):
+        """
+        :param cui: MedGen concept ID
+        :param max_depth: levels to go up (default all)
+        :return: list of CUIs, nearest first, not including cui
+        """
+        return list(self.walk(cui, direction='reverse', max_depth=max_depth))[1:]
+
+    def descendants(self, cui, max_depth=None):
+        """
+        :param cui: MedGen concept ID
+        :param max_depth: levels to go down (default all)
+        :return: list of CUIs, nearest first, not including cui
+        """
+        return list(self.walk(cui, max_depth=max_depth))[1:]
+
+    def lowest_common_ancestors(self, cui, other_cui):
+        """
+        Common ancestors of two concepts (a concept counts as its own ancestor) that are not
+        an ancestor of another common ancestor. The hierarchy is not a tree, so there can be more than one.
+
+        :param cui: MedGen concept ID
+        :param other_cui: MedGen concept ID
+        :return: sorted list of CUIs, empty if the concepts share no ancestor
+        """
+        other_up = self.walk(other_cui, direction='reverse')
+        common = [ancestor for ancestor in self.walk(cui, direction='reverse') if ancestor in other_up]
+        above = set()
+        for ancestor in common:
+            if ancestor not in above:
+                above.update(list(self.walk(ancestor, direction='reverse'))[1:])
+        return sorted(ancestor for ancestor in common if ancestor not in above)
+
+def build_disease_hierarchy(db):
+    """
+    :param db: MedGenDB
+    :return: DiseaseHierarchy of view_disease_subtype
+    """
+    return DiseaseHierarchy(db.fetch_iter('select distinct DiseaseID, SubtypeID from view_disease_subtype',
+                                          chunk_size=10000, row_format='tuple'))
+
+def get_disease_hierarchy(db):
+    """
+    The hierarchy of db's medgen dataset, loaded on first use and again after the dataset is reloaded.
+    :param db: MedGenDB
+    :return: DiseaseHierarchy
+    """
+    return shared_graph(db, 'disease_hierarchy', build_disease_hierarchy)
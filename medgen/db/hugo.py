@@ -1,6 +1,7 @@
 from __future__ import absolute_import
 
-from .dataset import SQLData
+from .dataset import SQLData, select_fields
+from .cache import cached
 from ..parse.gene import Gene
 
 ##########################################################################################
@@ -17,7 +18,8 @@ class HugoDB(SQLData):
     def __init__(self):
         super(HugoDB, self).__init__(config_section='hugo')
 
-    def hugo_info(self, gene_symbol):
+    @cached
+    def hugo_info(self, gene_symbol, fields=None):
         """
         Get gene information, official records from the standard HUGO gene committee
 
@@ -49,12 +51,13 @@ class HugoDB(SQLData):
         +------------------------+-------------+------+-----+---------+-------+
 
         :param gene_symbol:
+        :param fields: columns to return (default all)
         :return:
         """
-        return self.fetchall("select * from hugo.hugo_info where Symbol = '?' ".
-                             replace('?', str(gene_symbol)))
+        return self.fetchall("select {} from hugo.hugo_info where Symbol = %s ".format(select_fields(fields)), [str(gene_symbol)])
 
 
+    @cached
     def get_locus_specific_databases(self, gene_symbol):
         """
         get LSDBs for a given gene symbol.
@@ -66,5 +69,14 @@ class HugoDB(SQLData):
 
         return self.fetchrow(
             "select LocusSpecificDatabases, GeneFamilyTag, pubmeds "
-            "from hugo_info where Symbol = '?' ".
-            replace('?', str(gene.name)))
\ No newline at end of file
+            "from hugo_info where Symbol = %s ", [str(gene.name)])
+
+    def get_locus_specific_databases_many(self, gene_symbols):
+        """
+        Batch get_locus_specific_databases for gene symbols, one "Symbol in (...)" query.
+        :param gene_symbols: HUGO gene symbols
+        :return: dict symbol -> dict {Symbol, LocusSpecificDatabases, GeneFamilyTag, pubmeds}, None for unknown symbols
+        """
+        found = self.fetchall_by("select Symbol, LocusSpecificDatabases, GeneFamilyTag, pubmeds "
+                                 "from hugo_info where Symbol in ({})", 'Symbol', [str(symbol) for symbol in gene_symbols])
+        return dict((symbol, rows[0] if rows else None) for symbol, rows in found.items())
@@ -0,0 +1,415 @@
+from __future__ import absolute_import, print_function
+
+import io
+import os
+import re
+import sys
+import csv
+import gzip
+import sqlite3
+import datetime
+
+from ..log import log
+
+##########################################################################################
+#
+#       NCBI flat files
+#
+##########################################################################################
+
+# field values NCBI uses for "no value"
+NULL_VALUES = ('', '-')
+
+def _columns(spec):
+    """
+    'GeneID:int Symbol Synonyms' -> [('GeneID', 'integer'), ('Symbol', 'text'), ('Synonyms', 'text')]
+    """
+    columns = []
+    for column in spec.split():
+        name, _, kind = column.partition(':')
+        columns.append((name, 'integer' if kind == 'int' else 'text'))
+    return columns
+
+def open_lines(path):
+    """
+    :param path: plain or gzipped (.gz) text file
+    :return: file object yielding lines (bytes)
+    """
+    if path.endswith('.gz'):
+        return io.BufferedReader(gzip.open(path, 'rb'))
+    return io.open(path, 'rb')
+
+
+class FlatFile(object):
+    """
+    One NCBI download (tab, pipe or comma delimited, optionally gzipped) and the table it loads.
+
+    Fields map onto columns by position, unless header is set: then rows are read as dicts
+    keyed by the names on the file's last '#' line, for files whose columns move between
+    releases, and transform builds the row tuples. Comma delimited files are read as CSV
+    (quoted fields) and name their columns on the first line.
+    """
+    def __init__(self, dataset, table, filenames, columns, indexes=(), unique=(),
+                 delimiter='\t', header=False, transform=None):
+        """
+        :param dataset: dataset the table belongs to (config section name)
+        :param table: table name
+        :param filenames: names to look for in the download directory, the first one found is loaded
+        :param columns: column spec, 'GeneID:int Symbol ...' (text unless :int)
+        :param indexes: columns, or comma separated column lists, indexed after loading
+        :param unique: columns of a unique index; rows repeating them are skipped
+        :param delimiter: field separator
+        :param header: read rows as dicts keyed by the header line
+        :param transform: function(row) -> iterable of row tuples in column order
+        """
+        self.dataset = dataset
+        self.table = table
+        self.filenames = tuple(filenames)
+        self.columns = _columns(columns)
+        self.indexes = tuple(indexes)
+        self.unique = tuple(unique)
+        self.delimiter = delimiter
+        self.header = header
+        self.transform = transform
+
+    def find(self, directory):
+        """
+        :return: path of the first of filenames present in directory, or None
+        """
+        for filename in self.filenames:
+            path = os.path.join(directory, filename)
+            if os.path.exists(path):
+                return path
+        return None
+
+    def _fields(self, line):
+        if self.delimiter == ',':
+            fields = [field.decode('utf-8', 'replace') for field in next(csv.reader([line.rstrip(b'\r\n')]))]
+        else:
+            fields = line.decode('utf-8', 'replace').rstrip('\r\n').split(self.delimiter)
+        if self.delimiter == '|' and fields and fields[-1] == '':
+            # RRF lines end with a delimiter
+            fields.pop()
+        return [None if field in NULL_VALUES else field for field in fields]
+
+    def rows(self, path):
+        """
+        :param path: downloaded file
+        :return: generator of row tuples in column order
+        """
+        width = len(self.columns)
+        names = None
+        with open_lines(path) as lines:
+            for line in lines:
+                if line.startswith(b'#') or (self.delimiter == ',' and self.header and names is None):
+                    names = [name.strip() for name in self._fields(line.lstrip(b'#'))]
+                    continue
+                if not line.strip():
+                    continue
+                fields = self._fields(line)
+                if self.header:
+                    if names is None:
+                        raise ValueError('%s has no header line' % path)
+                    row = dict(zip(names, fields))
+                elif len(fields) < width:
+                    row = fields + [None] * (width - len(fields))
+                else:
+                    row = fields[:width]
+
+                if self.transform is not None:
+                    for values in self.transform(row):
+                        yield values
+                else:
+                    yield tuple(row)
+
+    def create_sql(self):
+        return 'create table {} ({})'.format(self.table, ', '.join(
+            # text compares case insensitively, like the MySQL tables' collation
+            '{} {}'.format(name, 'integer' if kind == 'integer' else 'text collate nocase')
+            for name, kind in self.columns))
+
+    def insert_sql(self):
+        return 'insert {}into {} ({}) values ({})'.format(
+            'or ignore ' if self.unique else '', self.table,
+            ', '.join(name for name, _ in self.columns), ', '.join(['?'] * len(self.columns)))
+
+##########################################################################################
+#
+#       Derived columns
+#
+##########################################################################################
+
+# NM_000059.3(BRCA2):c.68-7T>A (p.Xaa23Yaa)
+_VARIANT_NAME = re.compile(r'^(?P<ac>[A-Z]{2}_\d+(?:\.\d+)?)(?:\([^)]*\))?:(?P<c>[cgmnr]\.\S+)(?:\s+\((?P<p>p\.[^)]+)\))?')
+
+# variant_summary column -> header names in the releases we know
+_VARIANT_SUMMARY_FIELDS = [
+    ('AlleleID', ('AlleleID',)),
+    ('variant_type', ('Type',)),
+    ('variant_name', ('Name',)),
+    ('GeneID', ('GeneID',)),
+    ('Symbol', ('GeneSymbol',)),
+    ('ClinicalSignificance', ('ClinicalSignificance',)),
+    ('rs', ('RS# (dbSNP)',)),
+    ('dbvar_nsv', ('nsv/esv (dbVar)', 'nsv (dbVar)')),
+    ('RCVaccession', ('RCVaccession',)),
+    ('TestedInGTR', ('TestedInGTR',)),
+    ('PhenotypeIDs', ('PhenotypeIDS', 'PhenotypeIDs')),
+    ('Origin', ('Origin',)),
+    ('Assembly', ('Assembly',)),
+    ('Chromosome', ('Chromosome',)),
+    ('Start', ('Start',)),
+    ('Stop', ('Stop',)),
+    ('Cytogenetic', ('Cytogenetic',)),
+    ('ReviewStatus', ('ReviewStatus',)),
+    ('HGVS_c', ('HGVS(c.)',)),
+    ('HGVS_p', ('HGVS(p.)',)),
+    ('NumberSubmitters', ('NumberSubmitters',)),
+    ('LastEvaluated', ('LastEvaluated',)),
+    ('Guidelines', ('Guidelines',)),
+    ('OtherIDs', ('OtherIDs',)),
+    ('VariationID', ('VariationID',)),
+]
+
+def _variant_summary(row):
+    values = {}
+    for column, names in _VARIANT_SUMMARY_FIELDS:
+        values[column] = next((row[name] for name in names if row.get(name) is not None), None)
+
+    # releases without HGVS(c.) and HGVS(p.) columns carry the names in Name only
+    if values['HGVS_c'] is None and values['variant_name']:
+        match = _VARIANT_NAME.match(values['variant_name'])
+        if match:
+            values['HGVS_c'] = '{}:{}'.format(match.group('ac'), match.group('c'))
+            values['HGVS_p'] = values['HGVS_p'] or match.group('p')
+    yield tuple(values[column] for column, _ in _VARIANT_SUMMARY_FIELDS)
+
+def _clinvar_hgvs(row):
+    # one row per nucleotide and protein expression of the variation
+    for expression in (row.get('NucleotideExpression'), row.get('ProteinExpression')):
+        if expression is not None:
+            yield (expression, row.get('VariationID'), row.get('AlleleID'), None)
+
+def _pmc_ids(row):
+    yield (row.get('PMCID'), row.get('PMID'), row.get('DOI'))
+
+##########################################################################################
+#
+#       Tables
+#
+##########################################################################################
+
+FLAT_FILES = [
+    # gene: ftp://ftp.ncbi.nlm.nih.gov/gene/DATA/
+    FlatFile('gene', 'gene_info', ['Homo_sapiens.gene_info.gz', 'Homo_sapiens.gene_info', 'gene_info.gz', 'gene_info'],
+             'tax_id:int GeneID:int Symbol LocusTag Synonyms dbXrefs chromosome map_loc GeneDesc GeneType '
+             'Nomen_symbol Nomen_source Nomen_status GeneOther LastModified',
+             indexes=['GeneID', 'Symbol', 'tax_id']),
+    FlatFile('gene', 'gene2pubmed', ['gene2pubmed.gz', 'gene2pubmed'],
+             'tax_id:int GeneID:int PMID:int',
+             indexes=['GeneID', 'PMID']),
+    FlatFile('gene', 'mim2gene_medgen', ['mim2gene_medgen'],
+             'MIM:int GeneID:int MIM_type MIM_vocab MedGenCUI',
+             indexes=['MIM', 'GeneID', 'MedGenCUI']),
+    FlatFile('gene', 'generifs_basic', ['generifs_basic.gz', 'generifs_basic'],
+             'tax_id:int GeneID:int pubmeds last_update GeneRIF',
+             indexes=['GeneID']),
+
+    # clinvar: ftp://ftp.ncbi.nlm.nih.gov/pub/clinvar/tab_delimited/
+    FlatFile('clinvar', 'variant_summary', ['variant_summary.txt.gz', 'variant_summary.txt'],
+             ' '.join(column + (':int' if column in ('AlleleID', 'GeneID', 'rs', 'Start', 'Stop', 'NumberSubmitters',
+                                                      'VariationID') else '')
+                      for column, _ in _VARIANT_SUMMARY_FIELDS),
+             indexes=['AlleleID', 'GeneID', 'Symbol', 'HGVS_c', 'HGVS_p', 'VariationID'],
+             header=True, transform=_variant_summary),
+    FlatFile('clinvar', 'clinvar_hgvs', ['hgvs4variation.txt.gz', 'hgvs4variation.txt'],
+             'hgvs_text VariationID:int AlleleID:int RCVaccession',
+             indexes=['VariationID', 'AlleleID'], unique=['hgvs_text', 'VariationID'],
+             header=True, transform=_clinvar_hgvs),
+    FlatFile('clinvar', 'var_citations', ['var_citations.txt.gz', 'var_citations.txt'],
+             'AlleleID:int VariationID:int rs:int nsv citation_source citation_id',
+             indexes=['VariationID', 'AlleleID']),
+    FlatFile('clinvar', 'molecular_consequences', ['molecular_consequences.txt.gz', 'molecular_consequences.txt'],
+             'hgvs_text SequenceOntologyID Consequence',
+             indexes=['hgvs_text', 'SequenceOntologyID']),
+    FlatFile('clinvar', 'gene_condition_source_id', ['gene_condition_source_id'],
+             'GeneID:int Symbol RelatedGenes ConceptID DiseaseName SourceName SourceID DiseaseMIM LastUpdated',
+             indexes=['GeneID', 'ConceptID', 'Symbol']),
+    FlatFile('clinvar', 'disease_names', ['disease_names'],
+             'DiseaseName SourceName ConceptID SourceID DiseaseMIM LastModified Category',
+             indexes=['ConceptID']),
+    FlatFile('clinvar', 'gene_specific_summary', ['gene_specific_summary.txt.gz', 'gene_specific_summary.txt'],
+             'Symbol GeneID:int Total_submissions:int Total_alleles:int Submissions_reported_with_alleles:int '
+             'Alleles_reported_Pathogenic_Likely_pathogenic:int Gene_MIM_number Number_uncertain:int '
+             'Number_with_conflicts:int',
+             indexes=['GeneID']),
+
+    # medgen: ftp://ftp.ncbi.nlm.nih.gov/pub/medgen/
+    FlatFile('medgen', 'NAMES', ['NAMES.RRF.gz', 'NAMES.RRF'],
+             'CUI name source SUPPRESS',
+             indexes=['CUI'], delimiter='|'),
+    FlatFile('medgen', 'MGDEF', ['MGDEF.RRF.gz', 'MGDEF.RRF'],
+             'CUI DEF SAB SUPPRESS',
+             indexes=['CUI'], delimiter='|'),
+    FlatFile('medgen', 'MGREL', ['MGREL.RRF.gz', 'MGREL.RRF'],
+             'CUI1 AUI1 STYPE1 REL CUI2 AUI2 RELA RUI SAB SL SUPPRESS',
+             indexes=['CUI1, REL', 'CUI2, REL'], delimiter='|'),
+    FlatFile('medgen', 'MGCONSO', ['MGCONSO.RRF.gz', 'MGCONSO.RRF'],
+             'CUI TS STT ISPREF AUI SAUI SCUI SDUI SAB TTY CODE STR SUPPRESS',
+             indexes=['CUI', 'CODE'], delimiter='|'),
+    FlatFile('medgen', 'medgen_uid', ['medgen_pubmed_lnk.txt.gz', 'medgen_pubmed_lnk.txt'],
+             'MedGenUID:int ConceptID',
+             indexes=['ConceptID'], unique=['MedGenUID', 'ConceptID'], delimiter='|'),
+
+    # pubmed: ftp://ftp.ncbi.nlm.nih.gov/pub/pmc/PMC-ids.csv.gz
+    FlatFile('pubmed', 'pmc_ids', ['PMC-ids.csv.gz', 'PMC-ids.csv'],
+             'PMCID PMID:int DOI',
+             indexes=['PMID'], unique=['PMCID'], delimiter=',', header=True, transform=_pmc_ids),
+]
+
+# views the medgen queries select from: (name, tables it needs, select)
+VIEWS = [
+    ('view_medgen_uid', ['medgen_uid'],
+     'select MedGenUID, ConceptID from medgen_uid'),
+    ('view_concept', ['MGCONSO'],
+     'select CUI as ConceptID, STR as ConceptName, SAB as SourceVocab, CODE as SourceID, '
+     'TTY, ISPREF, SUPPRESS from MGCONSO'),
+    # MGREL "CUI1 CHD CUI2": CUI2 is a child (subtype) of CUI1
+    ('view_disease_subtype', ['MGREL', 'NAMES'],
+     'select R.CUI1 as DiseaseID, D.name as DiseaseName, D.source as DiseaseSource, '
+     'R.CUI2 as SubtypeID, S.name as SubtypeName, S.source as SubtypeSource '
+     'from MGREL R join NAMES D on D.CUI = R.CUI1 join NAMES S on S.CUI = R.CUI2 '
+     "where R.REL = 'CHD'"),
+]
+
+# statements run once every table they name is loaded: (tables, sql)
+DERIVED = [
+    # hgvs4variation has no RCV accessions, variant_summary has them per allele
+    (['clinvar_hgvs', 'variant_summary'],
+     'update clinvar_hgvs set RCVaccession = '
+     '(select V.RCVaccession from variant_summary V where V.AlleleID = clinvar_hgvs.AlleleID limit 1)'),
+]
+
+##########################################################################################
+#
+#       Loading
+#
+##########################################################################################
+
+def open_database(path):
+    """
+    Open (or create) a medgen SQLite database for loading.
+    :param path: SQLite database file
+    :return: sqlite3 connection
+    """
+    conn = sqlite3.connect(path)
+    conn.text_factory = str
+    conn.execute('pragma synchronous = off')
+    conn.execute('create table if not exists log ('
+                 'idx integer primary key autoincrement, event_time timestamp, entity_name text, message text)')
+    conn.commit()
+    return conn
+
+def _log_event(conn, entity_name, message):
+    conn.execute('insert into log (event_time, entity_name, message) values (?, ?, ?)',
+                 (datetime.datetime.now(), entity_name, message))
+
+def _tables(conn):
+    return set(name for name, in conn.execute("select name from sqlite_master where type = 'table'"))
+
+def load_file(conn, flat_file, path, batch=10000):
+    """
+    (Re)create flat_file's table from a downloaded file, then index it.
+    A "rows loaded" log entry marks the new load epoch (see SQLData.dataset_epoch).
+    :param conn: connection from open_database
+    :param flat_file: FlatFile
+    :param path: downloaded file
+    :param batch: rows per executemany
+    :return: number of rows in the table
+    """
+    table = flat_file.table
+    log.info('loading %s from %s' % (table, path))
+    conn.execute('drop table if exists {}'.format(table))
+    conn.execute(flat_file.create_sql())
+    if flat_file.unique:
+        conn.execute('create unique index {0}_unique on {0} ({1})'.format(table, ', '.join(flat_file.unique)))
+
+    insert_sql = flat_file.insert_sql()
+    rows = []
+    for row in flat_file.rows(path):
+        rows.append(row)
+        if len(rows) >= batch:
+            conn.executemany(insert_sql, rows)
+            rows = []
+    if rows:
+        conn.executemany(insert_sql, rows)
+
+    for columns in flat_file.indexes:
+        conn.execute('create index {}_{} on {} ({})'.format(
+            table, re.sub(r'\W+', '_', columns), table, columns))
+    count = conn.execute('select count(*) from {}'.format(table)).fetchone()[0]
+    _log_event(conn, table, 'rows loaded %d' % count)
+    conn.commit()
+    log.info('loaded %d rows into %s' % (count, table))
+    return count
+
+def create_views(conn):
+    """
+    (Re)create the views and derived columns whose tables are loaded.
+    :return: names of the views created
+    """
+    tables = _tables(conn)
+    for needs, sql in DERIVED:
+        if tables.issuperset(needs):
+            conn.execute(sql)
+
+    created = []
+    for name, needs, select_sql in VIEWS:
+        if tables.issuperset(needs):
+            conn.execute('drop view if exists {}'.format(name))
+            conn.execute('create view {} as {}'.format(name, select_sql))
+            created.append(name)
+    conn.commit()
+    return created
+
+def load_directory(path, directory, tables=None):
+    """
+    Build or refresh a medgen SQLite database from local copies of the NCBI downloads.
+    Every known file found in directory is loaded (see FLAT_FILES), missing ones are skipped.
+
+        load_directory('medgen.sqlite', '/data/ncbi')
+
+    :param path: SQLite database file, created if missing
+    :param directory: directory holding the downloaded files
+    :param tables: table names to load (default: all found)
+    :return: dict of table name to rows loaded
+    """
+    conn = open_database(path)
+    try:
+        loaded = {}
+        for flat_file in FLAT_FILES:
+            if tables is not None and flat_file.table not in tables:
+                continue
+            source = flat_file.find(directory)
+            if source is None:
+                log.debug('no download for %s in %s' % (flat_file.table, directory))
+                continue
+            loaded[flat_file.table] = load_file(conn, flat_file, source)
+
+        create_views(conn)
+        _log_event(conn, 'load_database.sh', 'done')
+        conn.commit()
+        return loaded
+    finally:
+        conn.close()
+
+
+if __name__ == '__main__':
+    if len(sys.argv) < 3:
+        print('usage: python -m medgen.db.loaders database.sqlite download_dir [table ...]')
+        sys.exit(1)
+    from ..log import log_to_console
+    log_to_console()
+    counts = load_directory(sys.argv[1], sys.argv[2], sys.argv[3:] or None)
+    for name in sorted(counts):
+        print('%-30s %d' % (name, counts[name]))
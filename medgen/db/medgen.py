@@ -1,5 +1,8 @@
 from __future__ import absolute_import
-from .dataset import SQLData
+from .dataset import SQLData, select_fields
+from .cache import cached
+from .hierarchy import get_disease_hierarchy
+from .concept_graph import get_concept_graph
 
 ################################################################################
 #
@@ -27,6 +30,9 @@ def is_format_medgen(concept=2881):
     except ValueError:
         return False
 
+# facets of MedGenDB.concepts_many
+CONCEPT_FACETS = ('name', 'definition', 'sources')
+
 ##########################################################################################
 #
 #       SQLData Class
@@ -43,6 +49,7 @@ class MedGenDB(SQLData):
     def __init__(self):
         super(MedGenDB, self).__init__(config_section='medgen')
 
+    @cached
     def disease_subtypes(self, cui):
         """
         Narrower Hierarchical Relationship:
@@ -56,9 +63,10 @@ class MedGenDB(SQLData):
         SubtypeID     as DiseaseID,
         SubtypeName   as DiseaseName,
         SubtypeSource as DiseaseSource
-        from view_disease_subtype where DiseaseID="%s";'''
-        return self.fetchall(select_template % cui)
+        from view_disease_subtype where DiseaseID=%s;'''
+        return self.fetchall(select_template, [cui])
 
+    @cached
     def disease_parents(self, cui):
         """
         Broader Hierarchical Relationship:
@@ -68,10 +76,45 @@ class MedGenDB(SQLData):
         :return: id, name, and source of the disease
         """
         cui = self.get_concept_id(cui)
-        select_template = '''select distinct DiseaseID, DiseaseName, DiseaseSource from view_disease_subtype where SubTypeID="%s";'''
-        return self.fetchall(select_template % cui)
+        select_template = '''select distinct DiseaseID, DiseaseName, DiseaseSource from view_disease_subtype where SubTypeID=%s;'''
+        return self.fetchall(select_template, [cui])
+
+    def disease_hierarchy(self):
+        """
+        view_disease_subtype held in memory, shared by all MedGenDB instances and reloaded with the dataset.
+        :return: DiseaseHierarchy
+        """
+        return get_disease_hierarchy(self)
 
-    def concept_name(self, cui):
+    def disease_ancestors(self, cui, max_depth=None):
+        """
+        Transitive disease_parents: parents, their parents, and so on.
+        :param cui: MedGen concept
+        :param max_depth: levels to go up (default all)
+        :return: list of CUIs, nearest first
+        """
+        return self.disease_hierarchy().ancestors(self.get_concept_id(cui), max_depth)
+
+    def disease_descendants(self, cui, max_depth=None):
+        """
+        Transitive disease_subtypes: subtypes, their subtypes, and so on.
+        :param cui: MedGen concept
+        :param max_depth: levels to go down (default all)
+        :return: list of CUIs, nearest first
+        """
+        return self.disease_hierarchy().descendants(self.get_concept_id(cui), max_depth)
+
+    def disease_common_ancestors(self, cui, other_cui):
+        """
+        Lowest common ancestors of two diseases, see DiseaseHierarchy.lowest_common_ancestors.
+        :param cui: MedGen concept
+        :param other_cui: MedGen concept
+        :return: list of CUIs
+        """
+        return self.disease_hierarchy().lowest_common_ancestors(self.get_concept_id(cui), self.get_concept_id(other_cui))
+
+    @cached
+    def concept_name(self, cui, fields=None):
         """
         Get preferred concept name, NCBI MedGen first prefers GTR/ClinVar concept names, then SNOMED-CT, followed by MESH.
         Most concept names comes from SNOMED-CT (Clinical Terms)
@@ -84,13 +127,14 @@ class MedGenDB(SQLData):
         +----------+--------------------------------------------------------+-------------+----------+
 
         :param cui: medgen concept
+        :param fields: columns to return (default all), e.g. 'name'
         :return: conept name
         """
-        return self.fetchrow("select * from NAMES where CUI = '?' "
-                             .replace('?', str(self.get_concept_id(cui))))
+        return self.fetchrow("select {} from NAMES where CUI = %s ".format(select_fields(fields)), [str(self.get_concept_id(cui))])
 
 
-    def concept_definition(self, cui):
+    @cached
+    def concept_definition(self, cui, fields=None):
         """
         Get concept definition (if available)
         SAB refers to "source vocabulary"
@@ -103,13 +147,51 @@ class MedGenDB(SQLData):
         +----------+------------------------------------------------------------------+-----+----------+
 
         :param cui: medgen concept
+        :param fields: columns to return (default all)
         :return: dict(CUI, DEF, SAB)
         """
-        return self.fetchrow("select * from MGDEF where CUI = '?' "
-                             .replace('?', str(self.get_concept_id(cui))))
+        return self.fetchrow("select {} from MGDEF where CUI = %s ".format(select_fields(fields)), [str(self.get_concept_id(cui))])
 
+    def concepts_many(self, cuis_or_uids, facets=CONCEPT_FACETS):
+        """
+        Batch concept_name, concept_definition and concept_sources: the identifiers are converted
+        to CUIs with one query, then each facet is one "CUI in (...)" query for all concepts.
 
-    def concept_relations(self, cui):
+        :param cuis_or_uids: MedGen concepts, CUIs like 'C0006142' or UIDs like 9092
+        :param facets: any of 'name', 'definition', 'sources'
+        :return: dict input -> dict CUI, and per facet: name (NAMES row or None),
+                 definition (MGDEF row or None), sources (list of dict SourceVocab)
+        """
+        unknown = [facet for facet in facets if facet not in CONCEPT_FACETS]
+        if unknown:
+            raise ValueError('unknown concept facets: %s' % ', '.join(unknown))
+
+        concept_ids = self.get_concept_id_many(cuis_or_uids)
+        cuis = [str(cui) for cui in set(concept_ids.values()) if cui is not None]
+        found = {}
+        if 'name' in facets:
+            found['name'] = self.fetchall_by("select * from NAMES where CUI in ({})", 'CUI', cuis)
+        if 'definition' in facets:
+            found['definition'] = self.fetchall_by("select * from MGDEF where CUI in ({})", 'CUI', cuis)
+        if 'sources' in facets:
+            found['sources'] = self.fetchall_by("select distinct ConceptID, SourceVocab from view_concept "
+                                                "where ConceptID in ({})", 'ConceptID', cuis)
+
+        concepts = {}
+        for unique_id, cui in concept_ids.items():
+            concept = {'CUI': cui}
+            for facet in facets:
+                rows = found[facet].get(str(cui), []) if cui is not None else []
+                if facet == 'sources':
+                    concept[facet] = [{'SourceVocab': row['SourceVocab']} for row in rows]
+                else:
+                    concept[facet] = rows[0] if rows else None
+            concepts[unique_id] = concept
+        return concepts
+
+
+    @cached
+    def concept_relations(self, cui, fields=None):
         """
         Relate concepts.
         Relationships were sources from UMLS, the Unified Medical Language System.
@@ -172,20 +254,62 @@ class MedGenDB(SQLData):
         +----------+--------------+------+-----+---------+-------+
 
         :param cui: concept id
+        :param fields: columns to return (default all), e.g. ('CUI1', 'REL', 'CUI2')
         :return: relationships defined in MGREL table
         """
-        return self.fetchall("select * from MGREL where CUI1 = '?' or CUI2 = '?' "
-                             .replace('?', str(self.get_concept_id(cui))))
+        cui = str(self.get_concept_id(cui))
+        # two indexed lookups instead of "CUI1 = %s or CUI2 = %s", which no single index serves
+        select = "select {} from MGREL ".format(select_fields(fields))
+        return self.fetchall(select + "where CUI1 = %s union all " + select + "where CUI2 = %s and CUI1 <> %s",
+                             [cui, cui, cui])
+
+    def concept_graph(self):
+        """
+        MGREL held in memory, shared by all MedGenDB instances and reloaded with the dataset.
+        :return: ConceptGraph
+        """
+        return get_concept_graph(self)
 
+    def concept_neighbors(self, cui, rel=None, rela=None):
+        """
+        Concepts related to cui in MGREL (either column), answered from the concept graph.
+        :param cui: concept id
+        :param rel: REL value(s) to follow, e.g. 'RO' (default all)
+        :param rela: RELA value(s) to follow, e.g. 'has_manifestation' (default all)
+        :return: list of CUIs
+        """
+        return self.concept_graph().related(str(self.get_concept_id(cui)), rel, rela)
+
+    def concept_neighbors_many(self, cuis, rel=None, rela=None):
+        """
+        Batch concept_neighbors for CUIs.
+        :param cuis: concept ids (CUIs)
+        :return: dict CUI -> list of CUIs
+        """
+        return self.concept_graph().related_many([str(cui) for cui in cuis], rel, rela)
+
+    def related_concepts(self, cui, hops=2, rel=None, rela=None):
+        """
+        Concepts within hops MGREL relationships of cui, e.g. related_concepts('C0006142', 2, rel='RO').
+        :param cui: concept id
+        :param hops: maximum number of relationships
+        :param rel: REL value(s) to follow (default all)
+        :param rela: RELA value(s) to follow (default all)
+        :return: OrderedDict CUI -> hops, nearest first
+        """
+        return self.concept_graph().within(str(self.get_concept_id(cui)), hops, rel, rela)
+
+    @cached
     def concept_sources(self, cui):
         """
         Get source vocabulary names (dictionary abbreviations) for a given concept.
         :param cui: MedGen concept
         :return: list of dictionary names (SourceVocab)
         """
-        return self.fetchall("select distinct SourceVocab from view_concept where ConceptID = '?' "
-                             .replace('?', str(self.get_concept_id(cui))))
+        return self.fetchall("select distinct SourceVocab from view_concept where ConceptID = %s ",
+                             [str(self.get_concept_id(cui))])
 
+    @cached
     def medgen2umls(self, medgen_uid):
         """
         Get CUI for UID. This is for compatibility purposes.
@@ -193,9 +317,10 @@ class MedGenDB(SQLData):
         :param medgen_uid: int like 651, which points to C0006142
         :return: concept code like "C0006142"
         """
-        select_template = '''select ConceptID as ID from view_medgen_uid where MedGenUID = "%s";'''
-        return self.fetchID(select_template % medgen_uid)
+        select_template = '''select ConceptID as ID from view_medgen_uid where MedGenUID = %s;'''
+        return self.fetchID(select_template, args=[str(medgen_uid)])
 
+    @cached
     def umls2medgen(self, cui):
         """
         Get UID for concept id. This is for compatibility purposes.
@@ -203,8 +328,33 @@ class MedGenDB(SQLData):
         :param cui: concept code like "C0006142"
         :return: int like 651, which points to C0006142
         """
-        select_template = '''select MedGenUID as ID from view_medgen_uid where ConceptID = "%s";'''
-        return self.fetchID(select_template % cui)
+        select_template = '''select MedGenUID as ID from view_medgen_uid where ConceptID = %s;'''
+        return self.fetchID(select_template, args=[str(cui)])
+
+    def medgen2umls_many(self, medgen_uids):
+        """
+        Batch medgen2umls, one query for any number of UIDs.
+
+        :param medgen_uids: ints like 651
+        :return: dict UID -> CUI, None for unknown UIDs
+        """
+        uids = [int(uid) for uid in medgen_uids]
+        found = dict((int(row['MedGenUID']), row['ConceptID']) for row in
+                     self.fetchall_in("select MedGenUID, ConceptID from view_medgen_uid where MedGenUID in ({})",
+                                      [str(uid) for uid in uids]))
+        return dict((uid, found.get(uid)) for uid in uids)
+
+    def umls2medgen_many(self, cuis):
+        """
+        Batch umls2medgen, one query for any number of CUIs.
+
+        :param cuis: concept codes like "C0006142"
+        :return: dict CUI -> UID, None for unknown CUIs
+        """
+        cuis = [str(cui) for cui in cuis]
+        found = dict((row['ConceptID'], int(row['MedGenUID'])) for row in
+                     self.fetchall_in("select ConceptID, MedGenUID from view_medgen_uid where ConceptID in ({})", cuis))
+        return dict((cui, found.get(cui)) for cui in cuis)
 
     def get_concept_id(self, unique_id):
         """
@@ -221,6 +371,27 @@ class MedGenDB(SQLData):
 
         raise Exception('Unknown concept unique identifier format for %s' + unique_id)
 
+    def get_concept_id_many(self, unique_ids):
+        """
+        Batch get_concept_id: CUIs are kept as they are, UIDs are converted with one query.
+        :param unique_ids: CUIs and/or UIDs
+        :return: dict id -> CUI, None for unknown UIDs and identifiers in neither format
+        """
+        concept_ids = {}
+        uids = []
+        for unique_id in unique_ids:
+            if is_format_umls(unique_id):
+                concept_ids[unique_id] = unique_id
+            elif is_format_medgen(unique_id):
+                uids.append(unique_id)
+            else:
+                concept_ids[unique_id] = None
+        if uids:
+            medgen2umls = self.medgen2umls_many(uids)
+            concept_ids.update((uid, medgen2umls.get(int(uid))) for uid in uids)
+        return concept_ids
+
+    @cached
     def select_hpo_view_medgen_hpo(self, cui):
         """
         HPO Human Phenotype Ontology
@@ -238,10 +409,11 @@ class MedGenDB(SQLData):
         +---------------+--------------+------+-----+---------+-------+
         """
         return self.fetchall(
-            "select * from medgen.view_medgen_hpo where ConceptID = '%s' " % cui)
+            "select * from medgen.view_medgen_hpo where ConceptID = %s ", [cui])
 
+    @cached
     def select_mim_from_cui(self, cui):
-        return self.fetchlist("select DISTINCT MIM_number from medgen_hpo_omim where omim_cui='{}'".format(cui), "MIM_number")
+        return self.fetchlist("select DISTINCT MIM_number from medgen_hpo_omim where omim_cui=%s", "MIM_number", [cui])
 
 
 
@@ -36,8 +36,8 @@ class PersonalGenomesDB(SQLData):
           variant_aa_pos ,
           variant_aa_ins
         FROM   bionotate
-        WHERE  gene = '?gene' and variant_aa_pos = '?pos'
+        WHERE  gene = %s and variant_aa_pos = %s
         """
-        return self.fetchall(_sql.replace('?gene', hgnc).replace('?pos', variant_aa_pos))
+        return self.fetchall(_sql, [hgnc, str(variant_aa_pos)])
 
 
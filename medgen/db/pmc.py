@@ -0,0 +1,195 @@
+from __future__ import absolute_import
+
+import json
+import time
+import urllib
+import urllib2
+import httplib
+import threading
+from array import array
+from bisect import bisect_left
+
+from ..log import log
+from .cache import LRUCache
+from .epoch import shared_structure
+
+def normalize_pmcid(value):
+    """
+    'PMC3110945', 'pmc3110945', '3110945' and 3110945 -> 3110945
+    :return: PMCID number, or None if value is not a PMCID
+    """
+    if value is None:
+        return None
+    value = value.strip() if isinstance(value, basestring) else str(value)
+    if value.upper().startswith('PMC'):
+        value = value[3:]
+    try:
+        number = int(value)
+    except ValueError:
+        return None
+    return number if number > 0 else None
+
+##########################################################################################
+#
+#       PMCID -> PMID map
+#
+##########################################################################################
+
+class PMCIDMap(object):
+    """
+    The pmc_ids table (PMC-ids.csv) held in memory as two parallel arrays sorted by PMCID number,
+    so a lookup is a binary search and the few million articles take 16 bytes each
+    instead of a dict entry. Articles without a PMID are left out.
+    """
+    def __init__(self, pairs):
+        """
+        :param pairs: iterable of (PMCID, PMID); PMCIDs as in the table ('PMC3110945') or numbers
+        """
+        numbered = set()
+        for pmcid, pmid in pairs:
+            pmcid = normalize_pmcid(pmcid)
+            if pmcid is not None and pmid:
+                numbered.add((pmcid, int(pmid)))
+        numbered = sorted(numbered)
+        self.pmcids = array('l', (pmcid for pmcid, _ in numbered))
+        self.pmids = array('l', (pmid for _, pmid in numbered))
+
+    def __len__(self):
+        return len(self.pmcids)
+
+    def pmid(self, pmcid):
+        """
+        :param pmcid: PMCID ('PMC3110945' or 3110945)
+        :return: PMID, or None if the article is not in the map
+        """
+        number = normalize_pmcid(pmcid)
+        if number is None:
+            return None
+        position = bisect_left(self.pmcids, number)
+        if position < len(self.pmcids) and self.pmcids[position] == number:
+            return self.pmids[position]
+        return None
+
+def build_pmcid_map(db):
+    """
+    :param db: PubMedDB
+    :return: PMCIDMap of the pmc_ids table
+    """
+    return PMCIDMap(db.fetch_iter('select PMCID, PMID from pmc_ids where PMID is not null',
+                                  chunk_size=10000, row_format='tuple'))
+
+def get_pmcid_map(db):
+    """
+    The map of db's pubmed dataset, loaded on first use and again after the dataset is reloaded.
+    :param db: PubMedDB
+    :return: PMCIDMap
+    """
+    return shared_structure(db, 'pmcid_map', build_pmcid_map)
+
+##########################################################################################
+#
+#       PMC ID Converter fallback
+#
+##########################################################################################
+
+class IdConverter(object):
+    """
+    Client of the NCBI PMC ID Converter service (https://www.ncbi.nlm.nih.gov/pmc/tools/id-converter-api/),
+    for PMCIDs missing from the local pmc_ids table. Ids are sent batch_size per request and requests are
+    spaced to at most requests_per_second across all threads (NCBI allows 3 per second, 10 with an api_key).
+    Answers are kept in an LRUCache of max_answers entries: PMIDs for a day, "no PMID" for an hour,
+    as the article may be indexed in PubMed later.
+    """
+    def __init__(self, url, tool='medgen', email=None, api_key=None, batch_size=200, requests_per_second=3,
+                 timeout=30, max_answers=100000):
+        """
+        :param url: service URL
+        :param tool: tool name sent with each request
+        :param email: contact address sent with each request
+        :param api_key: NCBI API key
+        :param batch_size: PMCIDs per request (the service takes up to 200)
+        :param requests_per_second: request rate limit
+        :param timeout: seconds to wait for a response
+        :param max_answers: most answers kept (0: unbounded)
+        """
+        self.url = url
+        self.params = dict((name, value) for name, value in
+                           (('tool', tool), ('email', email), ('api_key', api_key)) if value)
+        self.batch_size = int(batch_size)
+        self.interval = 1.0 / float(requests_per_second) if float(requests_per_second) > 0 else 0
+        self.timeout = float(timeout)
+        self.requests = 0
+        self._answers = LRUCache('pmc.idconv', max_entries=max_answers, ttl=86400, negative_ttl=3600)
+        self._lock = threading.Lock()
+        self._last_request = 0
+
+    def _wait(self):
+        with self._lock:
+            delay = self._last_request + self.interval - time.time()
+            if delay > 0:
+                time.sleep(delay)
+            self._last_request = time.time()
+            self.requests += 1
+
+    def _request(self, pmcids):
+        """
+        :param pmcids: PMCID numbers, at most batch_size
+        :return: dict PMCID number -> PMID, None for articles the service has no PMID for
+        """
+        params = dict(self.params, ids=','.join('PMC%d' % pmcid for pmcid in pmcids), idtype='pmcid', format='json')
+        self._wait()
+        response = urllib2.urlopen('%s?%s' % (self.url, urllib.urlencode(sorted(params.items()))),
+                                   timeout=self.timeout)
+        try:
+            records = json.load(response).get('records', [])
+        finally:
+            response.close()
+
+        found = dict((pmcid, None) for pmcid in pmcids)
+        for record in records:
+            pmcid = normalize_pmcid(record.get('pmcid'))
+            if pmcid in found and record.get('pmid'):
+                found[pmcid] = int(record['pmid'])
+        return found
+
+    def convert(self, pmcids):
+        """
+        :param pmcids: PMCIDs ('PMC3110945' or 3110945)
+        :return: dict PMCID number -> PMID or None; PMCIDs of failed requests are left out (and retried next time)
+        """
+        numbers = sorted(set(number for number in map(normalize_pmcid, pmcids) if number is not None))
+        converted = {}
+        missing = []
+        for number in numbers:
+            found, pmid = self._answers.get(number)
+            if found:
+                converted[number] = pmid
+            else:
+                missing.append(number)
+
+        for start in range(0, len(missing), self.batch_size):
+            batch = missing[start:start + self.batch_size]
+            try:
+                answers = self._request(batch)
+            except (IOError, ValueError, httplib.HTTPException) as e:
+                log.warn('PMC ID Converter request for %d PMCIDs failed: %s' % (len(batch), e))
+                continue
+            for number, pmid in answers.items():
+                self._answers.set(number, pmid)
+            converted.update(answers)
+        return converted
+
+_converters = {}
+_converters_lock = threading.Lock()
+
+def get_id_converter(url, **kwargs):
+    """
+    One converter (and so one rate limit) per service URL, shared by every thread.
+    :param url: service URL
+    :param kwargs: IdConverter options, used when the converter is created
+    :return: IdConverter
+    """
+    with _converters_lock:
+        if url not in _converters:
+            _converters[url] = IdConverter(url, **kwargs)
+        return _converters[url]
@@ -0,0 +1,338 @@
+from __future__ import absolute_import
+
+import os
+import time
+import threading
+from contextlib import contextmanager
+
+try:
+    import MySQLdb as mdb
+    import MySQLdb.cursors as cursors
+except ImportError:
+    # only the embedded SQLite backend is available (medgen.db.sqlite)
+    mdb = cursors = None
+
+from ..log import log
+from ..exceptions import ConnectError
+
+##########################################################################################
+#
+#       Connection Pool
+#
+##########################################################################################
+
+# cursor kinds SQLData asks for, and the MySQLdb cursor class of each
+CURSOR_CLASSES = {'dict': 'DictCursor', 'stream': 'SSCursor', 'stream_dict': 'SSDictCursor'}
+
+def open_cursor(conn, kind=None):
+    """
+    :param conn: MySQLdb connection, or a backend connection that takes the kind itself (cursor_kinds)
+    :param kind: None (tuple rows), 'dict', 'stream' (unbuffered tuples) or 'stream_dict'
+    :return: cursor
+    """
+    if kind is None:
+        return conn.cursor()
+    if getattr(conn, 'cursor_kinds', None):
+        return conn.cursor(kind)
+    return conn.cursor(getattr(cursors, CURSOR_CLASSES[kind]))
+
+class PooledConnection(object):
+    """
+    MySQLdb connection plus the state the pool needs to hand it out again:
+    the process that opened it, the selected database, autocommit mode and last use.
+    """
+    def __init__(self, conn):
+        self.conn = conn
+        self.pid = os.getpid()
+        self.db = None
+        self.autocommit = None
+        self.last_used = time.time()
+
+    def cursor(self, kind=None):
+        """
+        :param kind: None, 'dict', 'stream' or 'stream_dict', see open_cursor
+        """
+        return open_cursor(self.conn, kind)
+
+    def commit(self):
+        self.conn.commit()
+
+    def rollback(self):
+        self.conn.rollback()
+
+
+class ConnectionPool(object):
+    """
+    Thread safe pool of MySQL connections to one server (host, port, user).
+
+    Every dataset section (gene, clinvar, medgen, pubmed, hugo) that points at the same
+    server shares one pool; the database is selected when a connection is checked out.
+    A connection is checked out by one thread at a time and returned when the query is done.
+
+    Connections idle longer than `keepalive` seconds are pinged before reuse and replaced
+    if the server has gone away. After os.fork() the child drops every inherited connection
+    and opens its own, so multiprocessing workers never share a socket with their parent.
+    """
+    # driver errors, and the subset after which a connection is discarded instead of reused
+    errors = (mdb.Error,) if mdb else ()
+    disconnect_errors = (mdb.OperationalError,) if mdb else ()
+    # most bound parameters one statement may carry (None: no limit)
+    max_params = None
+
+    def __init__(self, host, user, passwd, port=3306, min_size=0, max_size=8, keepalive=300, timeout=30, charset='utf8'):
+        self.host = host
+        self.user = user
+        self.passwd = passwd
+        self.port = int(port)
+        self.charset = charset
+        self.min_size = int(min_size)
+        self.max_size = max(int(max_size), 1)
+        self.keepalive = float(keepalive)
+        self.timeout = float(timeout)
+        self._reset()
+
+    def _reset(self):
+        self._pid = os.getpid()
+        self._cond = threading.Condition(threading.Lock())
+        self._idle = []
+        self._active = 0
+        self._prefilled = False
+        self._stats = {'checkouts': 0, 'waits': 0, 'wait_time': 0.0, 'created': 0, 'discarded': 0, 'forks': 0}
+
+    def _check_fork(self):
+        """
+        A forked child must not touch its parent's sockets: closing an inherited connection
+        would send COM_QUIT on the parent's session. Inherited connections are kept referenced
+        (never closed, never reused) and the pool starts over.
+        """
+        if self._pid != os.getpid():
+            forks = self._stats['forks']
+            _fork_orphans.extend(self._idle)
+            self._reset()
+            self._stats['forks'] = forks + 1
+            log.debug('connection pool %s reset after fork' % self.host)
+
+    def connect_raw(self, db=None):
+        """
+        Open a new connection that is not tracked by the pool.
+        The caller owns it and is responsible for closing it.
+        """
+        if mdb is None:
+            raise ConnectError('MySQLdb is not installed; install MySQL-python or set "backend: sqlite"')
+        try:
+            kwargs = dict(host=self.host, user=self.user, passwd=self.passwd, port=self.port, charset=self.charset)
+            if db is not None:
+                kwargs['db'] = db
+            return mdb.connect(**kwargs)
+        except self.errors as e:
+            raise ConnectError('could not connect to %s@%s:%s' % (self.user, self.host, self.port), e)
+
+    def _open(self):
+        pconn = PooledConnection(self.connect_raw())
+        with self._cond:
+            self._stats['created'] += 1
+        return pconn
+
+    def _healthy(self, pconn):
+        if time.time() - pconn.last_used < self.keepalive:
+            return True
+        try:
+            pconn.conn.ping()
+            return True
+        except self.errors:
+            return False
+
+    def checkout(self, db, autocommit=True):
+        """
+        Take a connection from the pool, waiting up to `timeout` seconds if `max_size` are in use.
+        :param db: database (dataset) to select
+        :param autocommit: autocommit mode for this checkout
+        :return: PooledConnection
+        """
+        if self.min_size and not self._prefilled:
+            self.prefill()
+
+        started = None
+        pconn = None
+
+        with self._cond:
+            self._check_fork()
+            while not self._idle and self._active >= self.max_size:
+                if started is None:
+                    started = time.time()
+                    self._stats['waits'] += 1
+                remaining = self.timeout - (time.time() - started)
+                if remaining <= 0:
+                    raise ConnectError('timed out waiting for a connection to %s (max_size=%d)' % (self.host, self.max_size))
+                self._cond.wait(remaining)
+
+            if started is not None:
+                self._stats['wait_time'] += time.time() - started
+            if self._idle:
+                pconn = self._idle.pop()
+            self._active += 1
+            self._stats['checkouts'] += 1
+
+        try:
+            if pconn is not None and not self._healthy(pconn):
+                self._discard(pconn)
+                pconn = None
+            if pconn is None:
+                pconn = self._open()
+            if pconn.db != db:
+                pconn.conn.select_db(db)
+                pconn.db = db
+            if pconn.autocommit != autocommit:
+                pconn.conn.autocommit(autocommit)
+                pconn.autocommit = autocommit
+        except:
+            if pconn is not None:
+                self._close(pconn)
+            self._release()
+            raise
+
+        return pconn
+
+    def checkin(self, pconn, discard=False):
+        """
+        Return a connection to the pool.
+        :param pconn: PooledConnection from checkout()
+        :param discard: close the connection instead of reusing it (for example after a lost connection)
+        """
+        if pconn.pid != os.getpid():
+            _fork_orphans.append(pconn)
+            return
+        if discard:
+            self._discard(pconn)
+        else:
+            pconn.last_used = time.time()
+            with self._cond:
+                self._idle.append(pconn)
+        self._release()
+
+    def _release(self):
+        with self._cond:
+            self._active -= 1
+            self._cond.notify()
+
+    def _discard(self, pconn):
+        with self._cond:
+            self._stats['discarded'] += 1
+        self._close(pconn)
+
+    def _close(self, pconn):
+        try:
+            pconn.conn.close()
+        except self.errors:
+            pass
+
+    @contextmanager
+    def connection(self, db, autocommit=True):
+        """
+        with pool.connection('gene') as conn:
+            cursor = conn.cursor()
+        """
+        pconn = self.checkout(db, autocommit)
+        try:
+            yield pconn
+        except self.disconnect_errors:
+            self.checkin(pconn, discard=True)
+            raise
+        except:
+            self.checkin(pconn)
+            raise
+        else:
+            self.checkin(pconn)
+
+    def prefill(self):
+        """
+        Open connections until at least `min_size` are idle or active.
+        """
+        with self._cond:
+            self._check_fork()
+            missing = self.min_size - len(self._idle) - self._active
+            self._prefilled = True
+        for _ in range(missing):
+            pconn = self._open()
+            with self._cond:
+                self._idle.append(pconn)
+
+    def commit_all(self):
+        """
+        Commit pending work on every idle connection.
+        """
+        with self._cond:
+            self._check_fork()
+            idle = list(self._idle)
+        for pconn in idle:
+            pconn.commit()
+
+    def close(self):
+        """
+        Close every idle connection.
+        """
+        with self._cond:
+            self._check_fork()
+            idle, self._idle = self._idle, []
+        for pconn in idle:
+            self._close(pconn)
+
+    def stats(self):
+        """
+        :return: dict with checkouts, waits, wait_time (seconds), created, discarded, forks,
+                 active and idle connection counts, min_size and max_size
+        """
+        with self._cond:
+            self._check_fork()
+            stats = dict(self._stats)
+            stats['active'] = self._active
+            stats['idle'] = len(self._idle)
+        stats['min_size'] = self.min_size
+        stats['max_size'] = self.max_size
+        return stats
+
+##########################################################################################
+#
+#       Pool Registry
+#
+##########################################################################################
+
+_pools = {}
+_pools_lock = threading.Lock()
+_fork_orphans = []
+
+def get_pool(host, user, passwd, port=3306, **kwargs):
+    """
+    Shared pool for a MySQL server. Callers naming the same (host, port, user) share a pool;
+    the pool grows to the largest max_size/min_size any of them asked for.
+    :return: ConnectionPool
+    """
+    return shared_pool((host, int(port), user), lambda: ConnectionPool(host, user, passwd, port, **kwargs), **kwargs)
+
+def shared_pool(key, factory, **kwargs):
+    """
+    Pool registered under key (host, port, user), created with factory() on first use.
+    :return: ConnectionPool
+    """
+    with _pools_lock:
+        pool = _pools.get(key)
+        if pool is None:
+            pool = _pools[key] = factory()
+        else:
+            pool.max_size = max(pool.max_size, int(kwargs.get('max_size', pool.max_size)))
+            pool.min_size = max(pool.min_size, int(kwargs.get('min_size', pool.min_size)))
+        return pool
+
+def pool_stats():
+    """
+    :return: dict of 'user@host:port' to ConnectionPool.stats()
+    """
+    with _pools_lock:
+        pools = list(_pools.items())
+    return dict(('%s@%s:%d' % (user, host, port), pool.stats()) for (host, port, user), pool in pools)
+
+def commit_pools():
+    with _pools_lock:
+        pools = list(_pools.values())
+    for pool in pools:
+        pool.commit_all()
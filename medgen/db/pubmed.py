@@ -1,10 +1,18 @@
 from __future__ import absolute_import
+import os
 import re
+import gzip
 import datetime
-import MySQLdb
-from metapub import PubMedArticle
-from metapub.utils import asciify
-from .dataset import SQLData
+import multiprocessing
+import xml.etree.cElementTree as ET
+from collections import OrderedDict
+from .dataset import SQLData, config_option, select_fields, missing_table
+from .epoch import dataset_epoch
+from .pmc import normalize_pmcid, get_pmcid_map, get_id_converter
+from ..log import log
+
+# (host, port, dataset) -> epoch at which the pmc_ids table was found missing; it is looked for again after a reload
+_missing_pmc_ids = {}
 
 ##########################################################################################
 #
@@ -21,6 +29,86 @@ class PubMedDB(SQLData):
     def __init__(self):
         super(PubMedDB, self).__init__(config_section='pubmed')
 
+    def _enabled(self, option, default):
+        return config_option(self._cfg_section, option, default).lower() in ('true', 'yes', 'on', '1')
+
+    def pmcid_map(self):
+        """
+        The pmc_ids table in memory, used by pmcid_to_pmid
+        unless "pmc_ids_map: false" in the pubmed config section.
+        :return: PMCIDMap, or None
+        """
+        if not self._enabled('pmc_ids_map', 'true'):
+            return None
+        return get_pmcid_map(self)
+
+    def id_converter(self):
+        """
+        PMC ID Converter client for PMCIDs missing from pmc_ids,
+        or None with "idconv_fallback: false" in the pubmed config section.
+        :return: IdConverter
+        """
+        if not self._enabled('idconv_fallback', 'true'):
+            return None
+        option = lambda name, default: config_option(self._cfg_section, name, default)
+        return get_id_converter(option('idconv_url', 'https://www.ncbi.nlm.nih.gov/pmc/utils/idconv/v1.0/'),
+                                tool=option('eutils_tool', 'medgen'),
+                                email=option('eutils_email', '') or None,
+                                api_key=option('eutils_api_key', '') or None,
+                                batch_size=option('idconv_batch_size', 200),
+                                requests_per_second=option('eutils_requests_per_second', 3),
+                                timeout=option('eutils_timeout', 30),
+                                max_answers=option('idconv_max_answers', 100000))
+
+    def _local_pmids(self, pmcids):
+        """
+        :param pmcids: PMCID numbers
+        :return: dict PMCID number -> PMID from the pmc_ids table (the map, or one query per chunk)
+        """
+        key = (self._db_host, self._db_port, self._db_name)
+        epoch = dataset_epoch(self)
+        if epoch is not None and _missing_pmc_ids.get(key) == epoch:
+            return {}
+        try:
+            pmcid_map = self.pmcid_map()
+            if pmcid_map is not None:
+                return dict((pmcid, pmcid_map.pmid(pmcid)) for pmcid in pmcids)
+            rows = self.fetchall_in("select PMCID, PMID from pmc_ids where PMCID in ({})",
+                                    ['PMC%d' % pmcid for pmcid in pmcids], row_format='tuple')
+            return dict((normalize_pmcid(pmcid), pmid) for pmcid, pmid in rows)
+        except Exception as e:
+            # no pmc_ids table (not mirrored yet): every PMCID goes to the fallback. Other errors are not hidden
+            if not missing_table(e):
+                raise
+            log.warn('no pmc_ids table in %s, PMCIDs are converted by the PMC ID Converter: %s' % (self._db_name, e))
+            if epoch is not None:
+                _missing_pmc_ids[key] = epoch
+            return {}
+
+    def pmcid_to_pmid(self, pmcids, fallback=True):
+        """
+        Convert PubMed Central IDs to PMIDs, local first: the pmc_ids table (PMC-ids.csv, see
+        medgen.db.loaders) answers what it can and only the misses go to the PMC ID Converter,
+        in batches (see IdConverter).
+
+            PubMedDB().pmcid_to_pmid(['PMC3110945', 3110945])
+
+        :param pmcids: PMCIDs, 'PMC3110945' or 3110945
+        :param fallback: ask the PMC ID Converter for PMCIDs missing from pmc_ids
+        :return: OrderedDict PMCID -> PMID (int) or None, in input order
+        """
+        pmcids = list(pmcids)
+        numbers = set(number for number in map(normalize_pmcid, pmcids) if number is not None)
+        found = self._local_pmids(numbers)
+
+        misses = [number for number in numbers if found.get(number) is None]
+        converter = self.id_converter() if fallback and misses else None
+        if converter is not None:
+            log.debug('%d of %d PMCIDs not in pmc_ids, asking the PMC ID Converter' % (len(misses), len(numbers)))
+            found.update(converter.convert(misses))
+
+        return OrderedDict((pmcid, found.get(normalize_pmcid(pmcid))) for pmcid in pmcids)
+
 
     def abstract_text(self, pmid):
         """
@@ -31,14 +119,14 @@ class PubMedDB(SQLData):
         sql = """
             select abstract_text
             from   medline_minimum_citation
-            where  PMID = '@PMID'
-            """. \
-            replace("@PMID", str(pmid))
-        return self.fetchrow(sql)
+            where  PMID = %s
+            """
+        return self.fetchrow(sql, [str(pmid)])
 
     def medline_xml_filename_insert(self, filename):
         """
-        Book Keeping method for Medline XML
+        Book Keeping method for Medline XML.
+        One row per file; runs inside the caller's transaction() if there is one.
         :param filename: name of medline_xml file
         :return: result of SQL insert
         """
@@ -115,38 +203,61 @@ class PubMedDB(SQLData):
         :param min_id: the minimum id
         :return: list of ids in ascending order
         """
-        sql_query = "SELECT id from medline_xml where id>%d order by id" % min_id
-        rows = self.fetchall(sql_query)
-        return [row['id'] for row in rows]
+        return list(self.medline_xml_iter_ids(min_id))
+
+    def medline_xml_iter_ids(self, min_id=0):
+        """
+        Stream IDs in the medline_xml table greater than min_id
+        :param min_id: the minimum id
+        :return: generator of ids in ascending order
+        """
+        for row in self.scan('medline_xml', 'id', columns='id', min_key=int(min_id)):
+            yield row['id']
 
-    def medline_xml_select_by_pmid(self, pmid):
+    def medline_xml_select_by_pmid(self, pmid, fields=None):
         """
         fetch row with PMID
         :param pmid:
+        :param fields: columns to return (default all, including the full xml)
         :return: row (dict)
         """
-        sql_query = "SELECT * FROM medline_xml WHERE pmid=%s" % str(pmid)
-        return self.fetchrow(sql_query)
+        sql_query = "SELECT {} FROM medline_xml WHERE pmid=%s".format(select_fields(fields))
+        return self.fetchrow(sql_query, [str(pmid)])
 
-    def medline_xml_select_by_pmid_and_max_tstamp(self, pmid, max_tstamp):
+    def medline_xml_select_by_pmid_and_max_tstamp(self, pmid, max_tstamp, fields=None):
         """
         fetch row with PMID and max Tstamp
         :param pmid (int or str)
         :param max_tstamp (date)
+        :param fields: columns to return (default all, including the full xml)
         :return: row (dict)
         """
-        sql_query = 'SELECT * FROM medline_xml WHERE pmid=%s and Tstamp>"%s"' % (str(pmid), str(max_tstamp))
-        return self.fetchrow(sql_query)
+        sql_query = 'SELECT {} FROM medline_xml WHERE pmid=%s and Tstamp>%s'.format(select_fields(fields))
+        return self.fetchrow(sql_query, [str(pmid), str(max_tstamp)])
 
 
-    def medline_xml_select_by_id(self, id):
+    def medline_xml_select_by_id(self, id, fields=None):
         """
         fetch row with ID
         :param id: ID of row
+        :param fields: columns to return (default all, including the full xml)
         :return: row (dict)
         """
-        sql_query = "SELECT * FROM medline_xml WHERE id=%s" % str(id)
-        return self.fetchrow(sql_query)
+        sql_query = "SELECT {} FROM medline_xml WHERE id=%s".format(select_fields(fields))
+        return self.fetchrow(sql_query, [str(id)])
+
+    def medline_xml_select_max_tstamps(self, pmids, chunk_size=1000):
+        """
+        Latest stored Tstamp for many PMIDs, one query per chunk of PMIDs.
+        :param pmids: iterable of PMIDs (int or str)
+        :param chunk_size: PMIDs per "in (...)" list
+        :return: dict of PMID (str) to date, for PMIDs present in medline_xml
+        """
+        stamps = {}
+        for row in self.fetchall_in('SELECT PMID, max(Tstamp) as Tstamp FROM medline_xml WHERE PMID in ({}) group by PMID',
+                                    [str(pmid) for pmid in pmids], chunk_size):
+            stamps[str(row['PMID'])] = _as_date(row['Tstamp'])
+        return stamps
 
     def medline_xml_update(self, xml, filename_id):
         """
@@ -155,24 +266,185 @@ class PubMedDB(SQLData):
         Will only update if the xml citation has a newer Tstamp
         than the one in the DB
 
-        To commit, must run:
-        PySQLPool.commitPool()
-
         :param xml: xml (str)
-        :return: result of sql query for insertion or update, or None of nothing was inserted
+        :return: number of affected rows, or None of nothing was inserted
         """
-        pmid = self._get_PMID(xml)
-        last_date = self._get_last_date(xml)
+        return self.medline_xml_update_many([xml], filename_id) or None
 
-        # find any row with the same PMID and that are older than max stamp
-        record_in_db = self.medline_xml_select_by_pmid_and_max_tstamp(pmid, last_date)
+    def medline_xml_update_many(self, xml_list, filename_id):
+        """
+        Insert or update many medline citations at once.
 
-        if record_in_db is None:
-            d = {"PMID" : pmid, "xml" : xml, "Tstamp" : str(last_date), "medline_xml_filename_id" : filename_id}
-            sql_insert = 'INSERT INTO medline_xml (PMID, xml, Tstamp, medline_xml_filename_id) VALUES (%(PMID)s, %(xml)s, %(Tstamp)s, %(medline_xml_filename_id)s) '
-            sql_insert += 'ON DUPLICATE KEY UPDATE xml=values(xml), Tstamp=values(Tstamp), medline_xml_filename_id=values(medline_xml_filename_id)'
-            return self.execute(sql_insert, d)
+        Rows are only written where the citation is not older than what is stored:
+        stored dates are fetched for the whole batch in one query (per 1000 PMIDs),
+        then the remaining citations are upserted with multi-row statements in one transaction.
+        Within the batch, the newest version of a repeated PMID wins.
 
-        return None
+        :param xml_list: iterable of "<MedlineCitation>...</MedlineCitation>" xml (str)
+        :param filename_id: medline_xml_filename.id of the file the citations came from
+        :return: affected rows (see SQLData.upsert_many)
+        """
+        citations = {}
+        for xml in xml_list:
+            pmid = self._get_PMID(xml)
+            last_date = self._get_last_date(xml)
+            if pmid not in citations or citations[pmid][0] <= last_date:
+                citations[pmid] = (last_date, xml)
+        return self._medline_xml_upsert(citations, filename_id)
+
+    def _medline_xml_upsert(self, citations, filename_id):
+        """
+        :param citations: dict of PMID (str) to (last date, xml)
+        """
+        stored = self.medline_xml_select_max_tstamps(citations.keys())
+
+        rows = []
+        for pmid, (last_date, xml) in citations.items():
+            # keep rows that are newer than this citation
+            if pmid in stored and stored[pmid] > last_date:
+                continue
+            rows.append({"PMID": pmid, "xml": xml, "Tstamp": str(last_date), "medline_xml_filename_id": filename_id})
+
+        # the Tstamp guard repeats the check above on the server, so concurrent loaders
+        # writing the same PMID can never replace a newer citation with an older one.
+        # Tstamp is assigned last because MySQL applies the assignments in order.
+        newer = 'values(Tstamp) >= Tstamp'
+        return self.upsert_many('medline_xml', rows, ['PMID', 'xml', 'Tstamp', 'medline_xml_filename_id'],
+                                update_fields=[('xml', 'if({}, values(xml), xml)'.format(newer)),
+                                               ('medline_xml_filename_id', 'if({}, values(medline_xml_filename_id), '
+                                                                           'medline_xml_filename_id)'.format(newer)),
+                                               ('Tstamp', 'greatest(Tstamp, values(Tstamp))')])
 
+    def medline_xml_loaded_filenames(self):
+        """
+        :return: set of file names recorded in medline_xml_filename
+        """
+        return set(self.iter_list('select filename from medline_xml_filename', 'filename'))
+
+    def medline_xml_load_file(self, path, batch_size=1000):
+        """
+        Load one Medline baseline or update file (.xml or .xml.gz).
+
+        The file is stream parsed and written in batches of batch_size citations
+        (one stored-Tstamp query and one multi-row upsert per batch). The whole file is one
+        transaction together with its medline_xml_filename row, so a file is either
+        recorded as loaded with all its citations or not at all.
+
+        :param path: path to the medline file
+        :param batch_size: citations per batch
+        :return: number of citations read
+        """
+        count = 0
+        with self.transaction():
+            filename_id = self.medline_xml_filename_insert(os.path.basename(path))
+            citations = {}
+            for pmid, last_date, xml in iter_medline_citations(path):
+                count += 1
+                if pmid not in citations or citations[pmid][0] <= last_date:
+                    citations[pmid] = (last_date, xml)
+                if len(citations) >= batch_size:
+                    self._medline_xml_upsert(citations, filename_id)
+                    citations = {}
+            if citations:
+                self._medline_xml_upsert(citations, filename_id)
+        return count
+
+    def medline_xml_load(self, paths, processes=None, batch_size=1000):
+        """
+        Load many Medline baseline/update files, one file per worker process.
+
+        Files already recorded in medline_xml_filename are skipped, so an interrupted load
+        resumes where it stopped. Each worker opens its own connections (see ConnectionPool).
+
+        :param paths: medline files (.xml or .xml.gz)
+        :param processes: worker processes (default: cpu count, 1 loads in this process)
+        :param batch_size: citations per batch
+        :return: dict of file name to number of citations read
+        """
+        loaded = self.medline_xml_loaded_filenames()
+        todo = [(path, batch_size) for path in paths if os.path.basename(path) not in loaded]
+        for path in paths:
+            if os.path.basename(path) in loaded:
+                log.info('skipping %s, already loaded' % path)
+
+        if processes == 1 or len(todo) < 2:
+            return dict(_medline_xml_load_file(args) for args in todo)
+
+        pool = multiprocessing.Pool(processes)
+        try:
+            return dict(pool.imap_unordered(_medline_xml_load_file, todo))
+        finally:
+            pool.close()
+            pool.join()
+
+##########################################################################################
+#
+#       Medline XML parsing
+#
+##########################################################################################
+
+MEDLINE_DATE_TAGS = ['DateRevised', 'DateCompleted', 'DateCreated']
+
+def iter_medline_citations(path):
+    """
+    Stream parse a Medline baseline/update file (.xml or .xml.gz).
+    Elements are cleared as soon as they are read, so memory stays flat.
 
+    :param path: path to the medline file
+    :return: generator of (PMID str, last date, "<MedlineCitation>...</MedlineCitation>" xml)
+    """
+    opener = gzip.open if path.endswith('.gz') else open
+    with opener(path, 'rb') as handle:
+        context = ET.iterparse(handle, events=('start', 'end'))
+        _, root = next(context)
+        for event, elem in context:
+            if event != 'end':
+                continue
+            if elem.tag == 'MedlineCitation':
+                yield _parse_medline_citation(elem)
+                root.clear()
+            elif elem.tag in ('PubmedArticle', 'PubmedBookArticle', 'DeleteCitation'):
+                root.clear()
+
+def _parse_medline_citation(elem):
+    """
+    :param elem: MedlineCitation element
+    :return: (PMID str, last revised/completed/created date, xml text)
+    """
+    pmid = elem.findtext('PMID')
+    last_date = None
+    for tag in MEDLINE_DATE_TAGS:
+        found = elem.find(tag)
+        if found is not None:
+            last_date = datetime.date(year=int(found.findtext('Year')),
+                                      month=int(found.findtext('Month')),
+                                      day=int(found.findtext('Day')))
+            break
+    if last_date is None:
+        raise RuntimeError("Could not find date in MedlineCitation PMID %s" % pmid)
+
+    elem.tail = None
+    return pmid, last_date, ET.tostring(elem)
+
+def _medline_xml_load_file(args):
+    """
+    multiprocessing worker for PubMedDB.medline_xml_load
+    :param args: (path, batch_size)
+    :return: (file name, number of citations read)
+    """
+    path, batch_size = args
+    count = PubMedDB().medline_xml_load_file(path, batch_size)
+    log.info('loaded %d citations from %s' % (count, path))
+    return os.path.basename(path), count
+
+
+def _as_date(tstamp):
+    """
+    :param tstamp: date, datetime or 'YYYY-MM-DD...' string
+    :return: datetime.date
+    """
+    if isinstance(tstamp, datetime.datetime):
+        return tstamp.date()
+    if isinstance(tstamp, datetime.date):
+        return tstamp
+    return datetime.datetime.strptime(str(tstamp)[:10], '%Y-%m-%d').date()
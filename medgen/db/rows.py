@@ -0,0 +1,123 @@
+from __future__ import absolute_import
+
+import threading
+from array import array
+from collections import namedtuple
+
+##########################################################################################
+#
+#       Compact query results
+#
+##########################################################################################
+
+# row_format values accepted by the SQLData fetch methods
+ROW_FORMATS = ('dict', 'tuple', 'record', 'columns')
+
+class TupleRows(list):
+    """
+    Rows as plain tuples, with the column names stored once in .columns.
+
+        rows = db.fetchall(sql, row_format='tuple')
+        pmid = rows[0][rows.position('PMID')]
+    """
+    def __init__(self, columns, rows=()):
+        super(TupleRows, self).__init__(rows)
+        self.columns = tuple(columns)
+
+    def position(self, column):
+        """
+        :return: position of column in each row
+        """
+        return self.columns.index(column)
+
+
+class ColumnRows(object):
+    """
+    Column oriented result: one array per column instead of one object per row.
+
+    Integer columns without NULLs are stored in array('l'); other columns are lists in which
+    equal strings share one object, so repeated values (ClinicalSignificance, SourceVocab,
+    Symbol, ...) are stored once.
+
+        result = db.fetchall(sql, row_format='columns')
+        pmids = result['PMID']
+    """
+    def __init__(self, columns, data):
+        self.columns = tuple(columns)
+        self._data = data
+
+    def __getitem__(self, column):
+        return self._data[column]
+
+    def __len__(self):
+        return len(self._data[self.columns[0]]) if self.columns else 0
+
+    def __iter__(self):
+        """
+        :return: iterator of row tuples
+        """
+        return iter(zip(*[self._data[column] for column in self.columns]))
+
+    def __repr__(self):
+        return 'ColumnRows(%d rows, columns=%r)' % (len(self), self.columns)
+
+
+_record_classes = {}
+_record_classes_lock = threading.Lock()
+
+def record_class(columns):
+    """
+    namedtuple class for a query shape, shared by every result with the same column names.
+    Column names that are not valid identifiers are renamed _0, _1, ...
+    """
+    columns = tuple(columns)
+    cls = _record_classes.get(columns)
+    if cls is None:
+        with _record_classes_lock:
+            cls = _record_classes.get(columns)
+            if cls is None:
+                cls = _record_classes[columns] = namedtuple('Record', [str(column) for column in columns], rename=True)
+    return cls
+
+# range of the C long used by array('l') on this platform
+_LONG_MAX = 2 ** (array('l').itemsize * 8 - 1)
+
+def _is_integer(value):
+    return isinstance(value, (int, long)) and not isinstance(value, bool) and -_LONG_MAX <= value < _LONG_MAX
+
+def to_columns(columns, rows):
+    """
+    :param columns: column names
+    :param rows: sequence of row tuples
+    :return: ColumnRows
+    """
+    data = {}
+    shared = {}
+    for position, column in enumerate(columns):
+        values = [row[position] for row in rows]
+        if values and all(_is_integer(value) for value in values):
+            data[column] = array('l', values)
+        else:
+            data[column] = [shared.setdefault(value, value) if isinstance(value, basestring) else value
+                            for value in values]
+    return ColumnRows(columns, data)
+
+def format_rows(columns, rows, row_format):
+    """
+    Convert tuple rows from a cursor to row_format.
+    :param columns: column names, from cursor.description
+    :param rows: list of row tuples
+    :param row_format: 'tuple', 'record' or 'columns' ('dict' rows come from a DictCursor)
+    """
+    if row_format == 'tuple':
+        return TupleRows(columns, rows)
+    if row_format == 'record':
+        cls = record_class(columns)
+        return [cls._make(row) for row in rows]
+    if row_format == 'columns':
+        return to_columns(columns, rows)
+    raise ValueError('row_format must be one of %s' % ', '.join(ROW_FORMATS))
+
+def check_row_format(row_format):
+    if row_format not in ROW_FORMATS:
+        raise ValueError('row_format must be one of %s' % ', '.join(ROW_FORMATS))
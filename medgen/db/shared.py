@@ -0,0 +1,48 @@
+from __future__ import absolute_import
+
+import functools
+import threading
+
+##########################################################################################
+#
+#       Shared SQLData instances for the public API
+#
+##########################################################################################
+
+_instances = {}
+_instances_lock = threading.Lock()
+
+def shared(cls):
+    """
+    One instance of a SQLData class for the whole process, created on first use.
+    SQLData holds only configuration (connections come from the shared pool), so it is
+    safe to share between threads and across fork.
+    :param cls: SQLData subclass, like GeneDB
+    :return: instance of cls
+    """
+    instance = _instances.get(cls)
+    if instance is None:
+        with _instances_lock:
+            instance = _instances.get(cls)
+            if instance is None:
+                instance = _instances[cls] = cls()
+    return instance
+
+def lazy_method(cls, name):
+    """
+    API function bound to a method of the shared cls instance, which is only created
+    (and the config only read) when the function is first called.
+
+        Gene2PubMed = lazy_method(GeneDB, 'gene2pubmed')
+
+    :param cls: SQLData subclass
+    :param name: method name
+    :return: function with the method's name and docstring
+    """
+    method = getattr(cls, name)
+
+    @functools.wraps(method)
+    def call(*args, **kwargs):
+        return getattr(shared(cls), name)(*args, **kwargs)
+
+    return call
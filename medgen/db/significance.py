@@ -0,0 +1,177 @@
+from __future__ import absolute_import
+
+from ..log import log
+from .epoch import dataset_epoch, shared_structure
+
+# numpy is imported on first use, see have_numpy
+np = None
+
+def have_numpy():
+    """
+    Import numpy (optional, pip install medgen[matrix]) when it is first needed, so that
+    importing medgen does not pay for it.
+    :return: True if numpy is installed
+    """
+    global np
+    if np is None:
+        try:
+            import numpy
+        except ImportError:
+            return False
+        np = numpy
+    return True
+
+##########################################################################################
+#
+#       Gene x ClinicalSignificance matrix
+#
+##########################################################################################
+
+def _fold(symbol):
+    return symbol.upper() if isinstance(symbol, basestring) else symbol
+
+class SignificanceMatrix(object):
+    """
+    Number of variant_summary rows for every ClinVar gene and ClinicalSignificance,
+    held as a NumPy array (genes x significances) with index maps for both axes.
+
+    Per gene it answers what ClinVarDB.gene_to_clinical_significance_type_frequency
+    answers with a GROUP BY, and whole genome questions ("genes with at least 5
+    Pathogenic variants") are a column sum and a comparison over all genes at once.
+    """
+    def __init__(self, rows, epoch=None):
+        """
+        :param rows: iterable of (GeneID, Symbol, ClinicalSignificance, count); rows without a GeneID are skipped
+        :param epoch: dataset epoch the rows were read at
+        """
+        if not have_numpy():
+            raise ImportError('SignificanceMatrix needs numpy (pip install medgen[matrix])')
+        self.epoch = epoch
+        self.gene_ids = []
+        self.significances = []
+        self._genes = {}
+        self._symbols = {}
+        self._columns = {}
+
+        cells = []
+        for gene_id, symbol, significance, count in rows:
+            if gene_id is None or int(gene_id) < 0:
+                continue
+            gene_id = int(gene_id)
+            row = self._genes.get(gene_id)
+            if row is None:
+                row = self._genes[gene_id] = len(self.gene_ids)
+                self.gene_ids.append(gene_id)
+            if symbol:
+                self._symbols.setdefault(_fold(symbol), row)
+            column = self._columns.get(significance)
+            if column is None:
+                column = self._columns[significance] = len(self.significances)
+                self.significances.append(significance)
+            cells.append((row, column, count))
+
+        self.counts = np.zeros((len(self.gene_ids), len(self.significances)), dtype=np.int32)
+        if cells:
+            rows, columns, counts = zip(*cells)
+            np.add.at(self.counts, (np.array(rows), np.array(columns)), np.array(counts, dtype=np.int32))
+        self._folded_columns = dict((_fold(significance), column) for significance, column in self._columns.items())
+
+    def __len__(self):
+        return len(self.gene_ids)
+
+    def __contains__(self, gene):
+        return self.gene_row(gene) is not None
+
+    def gene_row(self, gene):
+        """
+        :param gene: NCBI GeneID or ClinVar gene symbol (case insensitive)
+        :return: row of gene in counts, or None
+        """
+        try:
+            return self._genes.get(int(gene))
+        except (TypeError, ValueError):
+            return self._symbols.get(_fold(gene))
+
+    def gene_id(self, symbol):
+        """
+        :param symbol: ClinVar gene symbol
+        :return: GeneID, or None
+        """
+        row = self._symbols.get(_fold(symbol))
+        return self.gene_ids[row] if row is not None else None
+
+    def significance_columns(self, significance):
+        """
+        :param significance: ClinicalSignificance or list of them (case insensitive)
+        :return: list of columns in counts, unknown significances are left out
+        """
+        if isinstance(significance, basestring):
+            significance = [significance]
+        columns = (self._folded_columns.get(_fold(name)) for name in significance)
+        return [column for column in columns if column is not None]
+
+    def frequency(self, gene):
+        """
+        :param gene: NCBI GeneID or gene symbol
+        :return: list of dict ClinicalSignificance and cnt_variants, most frequent first (empty for unknown genes)
+        """
+        row = self.gene_row(gene)
+        if row is None:
+            return []
+        counts = self.counts[row]
+        columns = np.nonzero(counts)[0]
+        columns = columns[np.argsort(-counts[columns], kind='mergesort')]
+        return [{'ClinicalSignificance': self.significances[column], 'cnt_variants': int(counts[column])}
+                for column in columns]
+
+    def frequency_many(self, genes):
+        """
+        :param genes: iterable of NCBI GeneIDs or gene symbols
+        :return: dict gene -> frequency(gene)
+        """
+        return dict((gene, self.frequency(gene)) for gene in genes)
+
+    def totals(self):
+        """
+        :return: dict ClinicalSignificance -> number of variants over all genes
+        """
+        return dict(zip(self.significances, (int(total) for total in self.counts.sum(axis=0))))
+
+    def genes_with(self, significance, min_variants=1):
+        """
+        Genes with at least min_variants variants of significance, e.g. genes_with('Pathogenic', 5).
+        A list of significances counts the variants of all of them.
+
+        :param significance: ClinicalSignificance or list of them
+        :param min_variants: minimum number of variants
+        :return: list of GeneID, most variants first
+        """
+        columns = self.significance_columns(significance)
+        if not columns:
+            return []
+        totals = self.counts[:, columns].sum(axis=1)
+        rows = np.nonzero(totals >= min_variants)[0]
+        rows = rows[np.argsort(-totals[rows], kind='mergesort')]
+        return [self.gene_ids[row] for row in rows]
+
+def build_significance_matrix(db):
+    """
+    One GROUP BY pass over variant_summary.
+    :param db: ClinVarDB
+    :return: SignificanceMatrix stamped with the current dataset epoch
+    """
+    epoch = dataset_epoch(db)
+    rows = db.fetch_iter(" select GeneID, Symbol, ClinicalSignificance, count(*) "
+                         " from variant_summary "
+                         " group by GeneID, Symbol, ClinicalSignificance ", chunk_size=10000, row_format='tuple')
+    matrix = SignificanceMatrix(rows, epoch)
+    log.info('built clinical significance matrix: %d genes x %d significances' % matrix.counts.shape)
+    return matrix
+
+def get_significance_matrix(db):
+    """
+    The matrix of db's ClinVar dataset, built on first use and again after the dataset is reloaded.
+    :param db: ClinVarDB
+    :return: SignificanceMatrix
+    """
+    return shared_structure(db, 'significance_matrix', build_significance_matrix)
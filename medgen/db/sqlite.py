@@ -0,0 +1,281 @@
+from __future__ import absolute_import
+
+import os
+import re
+import random
+import sqlite3
+import datetime
+
+from ..exceptions import ConnectError
+from .pool import ConnectionPool, shared_pool
+
+##########################################################################################
+#
+#       MySQL dialect on SQLite
+#
+##########################################################################################
+
+# statement size reported for "select @@max_allowed_packet"
+MAX_STATEMENT_BYTES = 16 * 1024 ** 2
+
+# bound parameters per statement (SQLITE_MAX_VARIABLE_NUMBER: 32766 since SQLite 3.32, 999 before)
+MAX_PARAMS = 32766 if sqlite3.sqlite_version_info >= (3, 32, 0) else 999
+
+# "on conflict do update" without a conflict target needs SQLite 3.35; older versions get "insert or replace"
+ON_CONFLICT_UPDATE = sqlite3.sqlite_version_info >= (3, 35, 0)
+
+_PARAM = re.compile(r'%\((\w+)\)s|%s|%%')
+
+def _placeholder(match):
+    if match.group(0) == '%%':
+        return '%'
+    if match.group(1):
+        return ':' + match.group(1)
+    return '?'
+
+_VALUES = re.compile(r'\bvalues\s*\(\s*(\w+)\s*\)', re.I)
+_ASSIGN_VALUES = re.compile(r'^\s*(\w+)\s*=\s*values\s*\(\s*(\w+)\s*\)\s*$', re.I)
+
+def _on_duplicate(match):
+    # "insert into ... on duplicate key update a=values(a)" -> "... on conflict do update set a=excluded.a" (SQLite 3.35+)
+    insert, assignments = match.group(1), match.group(2).strip()
+    if ON_CONFLICT_UPDATE:
+        return '%s on conflict do update set %s' % (insert.rstrip(), _VALUES.sub(r'excluded.\1', assignments))
+
+    # before 3.35: replace the whole row, which only matches when every assignment copies the inserted value
+    for assignment in assignments.split(','):
+        found = _ASSIGN_VALUES.match(assignment)
+        if found is None or found.group(1).lower() != found.group(2).lower():
+            raise ValueError('"on duplicate key update %s" needs SQLite 3.35 or later, this is SQLite %s'
+                             % (assignments, sqlite3.sqlite_version))
+    return re.sub(r'^(\s*insert)\s+into\b', r'\1 or replace into', insert, flags=re.I).rstrip()
+
+# the MySQL statements SQLData and the dataset classes send, rewritten for SQLite
+_REWRITES = [
+    (re.compile(r'\binsert\s+ignore\b', re.I), 'insert or ignore'),
+    (re.compile(r'^(.*?)\bon\s+duplicate\s+key\s+update\b(.*)$', re.I | re.S), _on_duplicate),
+    (re.compile(r'\bdrop\s+temporary\s+table\b', re.I), 'drop table'),
+    (re.compile(r'\s+default\s+charset\s*=\s*\w+', re.I), ''),
+    (re.compile(r'\bkey\s*\(\s*(\w+)\s*\(\d+\)\s*\)', re.I), r'primary key (\1)'),
+    (re.compile(r'^\s*truncate\s+(table\s+)?', re.I), 'delete from '),
+    (re.compile(r'@@max_allowed_packet', re.I), str(MAX_STATEMENT_BYTES)),
+    (re.compile(r'\bDATABASE\(\)\.', re.I), ''),
+]
+
+_translated = {}
+
+def translate(sql, args=None):
+    """
+    Rewrite a MySQLdb statement for sqlite3.
+
+    Like MySQLdb, placeholders are only interpreted when args are given: %s becomes ?,
+    %(name)s becomes :name and %% becomes %. The MySQL syntax used in medgen (insert ignore,
+    on duplicate key update, temporary tables, truncate, @@max_allowed_packet, DATABASE())
+    is rewritten; functions like rand(), if() and greatest() are provided by SQLiteConnection.
+
+    :param sql: MySQL statement
+    :param args: sequence, dict or None
+    :return: (sql, args) for sqlite3
+    """
+    key = (sql, args is not None)
+    translated = _translated.get(key)
+    if translated is None:
+        translated = sql
+        for pattern, replacement in _REWRITES:
+            translated = pattern.sub(replacement, translated)
+        if args is not None:
+            translated = _PARAM.sub(_placeholder, translated)
+        if len(_translated) > 10000:
+            _translated.clear()
+        _translated[key] = translated
+
+    if args is None:
+        return translated, ()
+    if isinstance(args, dict):
+        return translated, args
+    return translated, tuple(args)
+
+def _if(condition, then, otherwise):
+    return then if condition else otherwise
+
+def _greatest(*values):
+    return None if None in values else max(values)
+
+def _least(*values):
+    return None if None in values else min(values)
+
+def _concat(*values):
+    return None if None in values else u''.join(unicode(value) for value in values)
+
+def _now():
+    return datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+
+_FUNCTIONS = [
+    ('rand', 0, random.random),
+    ('if', 3, _if),
+    ('greatest', -1, _greatest),
+    ('least', -1, _least),
+    ('concat', -1, _concat),
+    ('now', 0, _now),
+]
+
+def _text(data):
+    # a custom text_factory also lets sqlite3 accept utf-8 encoded str parameters
+    return data.decode('utf-8', 'replace')
+
+##########################################################################################
+#
+#       Connection and cursor
+#
+##########################################################################################
+
+class SQLiteCursor(object):
+    """
+    sqlite3 cursor with MySQLdb's conventions: statements go through translate(),
+    and dict cursors return each row as a dict keyed by column name.
+    """
+    def __init__(self, conn, dict_rows=False):
+        self._cursor = conn.cursor()
+        self._dict_rows = dict_rows
+        self._columns = None
+
+    @property
+    def description(self):
+        return self._cursor.description
+
+    @property
+    def rowcount(self):
+        return self._cursor.rowcount
+
+    @property
+    def lastrowid(self):
+        return self._cursor.lastrowid
+
+    def execute(self, sql, args=None):
+        sql, args = translate(sql, args)
+        self._cursor.execute(sql, args)
+        self._columns = [desc[0] for desc in self._cursor.description] if self._cursor.description else None
+        return self._cursor.rowcount
+
+    def executemany(self, sql, seq_of_args):
+        sql, _ = translate(sql, ())
+        self._cursor.executemany(sql, (args if isinstance(args, dict) else tuple(args) for args in seq_of_args))
+        self._columns = None
+        return self._cursor.rowcount
+
+    def _rows(self, rows):
+        if self._dict_rows and self._columns:
+            columns = self._columns
+            return [dict(zip(columns, row)) for row in rows]
+        return rows
+
+    def fetchone(self):
+        row = self._cursor.fetchone()
+        return self._rows([row])[0] if row is not None else None
+
+    def fetchmany(self, size=None):
+        return self._rows(self._cursor.fetchmany(size or self._cursor.arraysize))
+
+    def fetchall(self):
+        return self._rows(self._cursor.fetchall())
+
+    def close(self):
+        self._cursor.close()
+
+
+class SQLiteConnection(object):
+    """
+    MySQLdb-like connection to a SQLite database holding every medgen dataset.
+
+    Each dataset name is attached as an alias of the same file, so qualified names in the
+    queries (clinvar.molecular_consequences, hugo.hugo_info) resolve, and select_db() has
+    nothing to switch.
+    """
+    # cursor() takes the pool's cursor kinds directly, see medgen.db.pool.open_cursor
+    cursor_kinds = ('dict', 'stream', 'stream_dict')
+
+    def __init__(self, path, datasets=(), timeout=30):
+        """
+        :param path: SQLite database file
+        :param datasets: dataset names to attach as aliases of the file
+        :param timeout: seconds to wait for another writer's lock
+        """
+        conn = sqlite3.connect(path, timeout=float(timeout), check_same_thread=False,
+                               detect_types=sqlite3.PARSE_DECLTYPES)
+        conn.text_factory = _text
+        for name, count, function in _FUNCTIONS:
+            conn.create_function(name, count, function)
+        for dataset in datasets:
+            if dataset.lower() not in ('main', 'temp'):
+                conn.execute('attach database ? as "%s"' % dataset, (path,))
+        self._conn = conn
+        self.autocommit(True)
+
+    def cursor(self, kind=None):
+        """
+        :param kind: None, 'dict', 'stream' or 'stream_dict'; sqlite3 cursors always step
+                     through the result, so the stream kinds need no separate cursor
+        """
+        return SQLiteCursor(self._conn, kind in ('dict', 'stream_dict'))
+
+    def select_db(self, db):
+        pass
+
+    def autocommit(self, flag):
+        self._conn.isolation_level = None if flag else 'DEFERRED'
+
+    def ping(self):
+        self._conn.execute('select 1')
+
+    def commit(self):
+        self._conn.commit()
+
+    def rollback(self):
+        self._conn.rollback()
+
+    def close(self):
+        self._conn.close()
+
+##########################################################################################
+#
+#       Pool
+#
+##########################################################################################
+
+class SQLitePool(ConnectionPool):
+    """
+    ConnectionPool over a local SQLite file instead of a MySQL server ("backend: sqlite").
+    Each thread checks out its own connection, as with MySQL; fork handling is inherited.
+    """
+    errors = (sqlite3.Error,)
+    # a failed statement leaves a SQLite connection usable, nothing is discarded
+    disconnect_errors = ()
+    max_params = MAX_PARAMS
+
+    def __init__(self, path, datasets=(), **kwargs):
+        """
+        :param path: SQLite database file, built with medgen.db.loaders
+        :param datasets: dataset names used as qualifiers in queries
+        """
+        super(SQLitePool, self).__init__(path, 'sqlite', None, 0, **kwargs)
+        self.path = path
+        self.datasets = tuple(datasets)
+
+    def connect_raw(self, db=None):
+        if not os.path.exists(self.path):
+            raise ConnectError('SQLite database %s does not exist, build it with medgen.db.loaders' % self.path)
+        try:
+            return SQLiteConnection(self.path, self.datasets, self.timeout)
+        except sqlite3.Error as e:
+            raise ConnectError('could not open SQLite database %s' % self.path, e)
+
+
+def get_sqlite_pool(path, datasets=(), **kwargs):
+    """
+    Shared pool for a SQLite database file, registered with the MySQL pools (see pool_stats).
+    :param path: SQLite database file
+    :param datasets: dataset names used as qualifiers in queries
+    :return: SQLitePool
+    """
+    path = os.path.abspath(os.path.expanduser(path))
+    return shared_pool((path, 0, 'sqlite'), lambda: SQLitePool(path, datasets, **kwargs), **kwargs)
@@ -8,7 +8,9 @@ class MedGenError(Exception):
         self.cause = cause
 
     def __str__(self):
-        return str(__dict__)
+        if self.cause is None:
+            return str(self.error)
+        return '%s: %s' % (self.error, self.cause)
 
 class ConnectError(MedGenError):
     """
@@ -8,26 +8,25 @@ log = logging.getLogger("medgen")
 ##########################################################################
 # LOGGING
 #
-# TODO: configure externally
-#
-#
-# Could we please *not* have a StreamHandler defined here? 
-# This kind of thing belongs in a command line script, not buried deep 
-# in a hard-coded config file.
-#   
-# Consider this a requirement for making this library open source.  
-#   
-#   --NM 8/6/2015
+# The library only adds a NullHandler; handlers and levels are configured
+# by the application or command line script, e.g. with log_to_console().
 #
 ##########################################################################
 
 HGVS_LOG_LEVEL = logging.DEBUG
-
-console = logging.StreamHandler(sys.stdout)
-console.setFormatter(logging.Formatter('%(module)s  %(funcName)s(%(lineno)d): %(levelname)s %(message)s'))
-
-log.setLevel(HGVS_LOG_LEVEL)
-log.addHandler(console)
+LOG_FORMAT = '%(module)s  %(funcName)s(%(lineno)d): %(levelname)s %(message)s'
+
+log.addHandler(logging.NullHandler())
+
+def log_to_console(level=HGVS_LOG_LEVEL, stream=sys.stdout):
+    """
+    Send medgen log messages to stdout, as command line tools did by default.
+    """
+    console = logging.StreamHandler(stream)
+    console.setFormatter(logging.Formatter(LOG_FORMAT))
+    log.setLevel(level)
+    log.addHandler(console)
+    return console
 
 IS_DEBUG_ENABLED = False #log.isEnabledFor(logging.DEBUG)
 IS_INFO_ENABLED  = log.isEnabledFor(logging.INFO)
@@ -1,5 +1,6 @@
 from __future__ import absolute_import
 from ..db.medgen import MedGenDB
+from ..db.shared import shared
 from ..vocab import Vocab
 
 ###########################################################################
@@ -8,7 +9,9 @@ from ..vocab import Vocab
 #
 ###########################################################################
 
-class Concept:
+_UNRESOLVED = object()
+
+class Concept(object):
     """
     MedGen
     The NCBI Handbook [Internet]. 2nd edition.
@@ -18,25 +21,62 @@ class Concept:
         """
         MedGen concept
         :param concept: either umls_cui (UMLS unique concept) or medgen_uid (MedGen defined ID)
-        :return: concept with both UMLS and MedGen defined IDs available.
+        :return: concept with both UMLS and MedGen defined IDs available, the one not given is looked up on first access.
+        """
+        self._umls_cui = None
+        self._medgen_uid = None
+
+        if concept:
+            try:
+                self._medgen_uid = int(concept)
+                self._umls_cui = _UNRESOLVED
+            except ValueError:
+                self._umls_cui = str(concept)
+                self._medgen_uid = _UNRESOLVED
+
+    @property
+    def umls_cui(self):
+        if self._umls_cui is _UNRESOLVED:
+            cui = shared(MedGenDB).medgen2umls(self._medgen_uid)
+            self._umls_cui = str(cui) if cui is not None else None
+        return self._umls_cui
+
+    @property
+    def medgen_uid(self):
+        if self._medgen_uid is _UNRESOLVED:
+            uid = shared(MedGenDB).umls2medgen(self._umls_cui)
+            self._medgen_uid = int(uid) if uid is not None else None
+        return self._medgen_uid
+
+    @classmethod
+    def resolve_many(cls, concepts):
         """
-        try:
-            self.umls_cui  = None
-            self.medgen_uid= None
+        Build and resolve many concepts at once: one query for all MedGen UIDs and one for all CUIs.
+        :param concepts: mix of UMLS CUIs and MedGen UIDs
+        :return: list of Concept with umls_cui and medgen_uid resolved, in input order
+        """
+        concepts = [cls(concept) for concept in concepts]
+        db = shared(MedGenDB)
 
-            if concept:
-                self.medgen_uid = int(concept)
-                self.umls_cui= str(MedGenDB().medgen2umls(concept))
+        cuis = db.medgen2umls_many(set(c._medgen_uid for c in concepts if c._umls_cui is _UNRESOLVED))
+        uids = db.umls2medgen_many(set(c._umls_cui for c in concepts if c._medgen_uid is _UNRESOLVED))
 
-        except ValueError:
-            self.umls_cui  = str(concept)
-            self.medgen_uid= int(MedGenDB().umls2medgen(concept))
+        for concept in concepts:
+            if concept._umls_cui is _UNRESOLVED:
+                cui = cuis.get(concept._medgen_uid)
+                concept._umls_cui = str(cui) if cui is not None else None
+            elif concept._medgen_uid is _UNRESOLVED:
+                concept._medgen_uid = uids.get(concept._umls_cui)
+        return concepts
 
     def __eq__(self, other):
-        return (self.__dict__ == other.__dict__)
+        return isinstance(other, Concept) and (self.umls_cui, self.medgen_uid) == (other.umls_cui, other.medgen_uid)
+
+    def __ne__(self, other):
+        return not self == other
 
     def __str__(self):
         return str([
             str(Vocab("UMLS:ConceptID", self.umls_cui)),
             str(Vocab("MedGen:MedGenUID", self.medgen_uid))
-        ])
\ No newline at end of file
+        ])
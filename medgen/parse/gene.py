@@ -1,6 +1,8 @@
 from __future__ import absolute_import
 
 from ..db.gene import GeneDB
+from ..db.gene_index import fold_symbol
+from ..db.shared import shared
 from ..vocab import Vocab, NCBI_GeneID, HGNC_GeneName
 
 ###########################################################################
@@ -9,27 +11,79 @@ from ..vocab import Vocab, NCBI_GeneID, HGNC_GeneName
 #
 ###########################################################################
 
-class Gene:
+_UNRESOLVED = object()
+
+class Gene(object):
     def __init__(self, gene):
         """
          Gene defines both the Entrez GeneID and Hugo GeneName.
+         Only the identifier that was given is known up front; the other one
+         is looked up on first access.
         :param gene: gene_id (GeneID) or hgnc (GeneName)
         :return:
         """
-        try:
-            self.id = None
-            self.name = None
+        self._id = None
+        self._name = None
+
+        if gene:
+            try:
+                self._id = int(gene)
+                self._name = _UNRESOLVED
+            except ValueError:
+                self._name = gene
+                self._id = _UNRESOLVED
+
+    @property
+    def id(self):
+        if self._id is _UNRESOLVED:
+            self._id = shared(GeneDB).get_gene_id_for_gene_name(self._name)
+        return self._id
 
-            if gene:
-                self.id = int(gene)
-                self.name = GeneDB().get_gene_name(gene)
+    @property
+    def name(self):
+        if self._name is _UNRESOLVED:
+            self._name = shared(GeneDB).get_gene_name(self._id)
+        return self._name
+
+    @classmethod
+    def resolve_many(cls, genes):
+        """
+        Build and resolve many genes at once: one lookup for all GeneIDs and one for all gene names.
+        :param genes: mix of GeneIDs and HGNC gene names
+        :return: list of Gene with id and name resolved, in input order
+        """
+        genes = [cls(gene) for gene in genes]
+        db = shared(GeneDB)
 
-        except ValueError:
-            self.name = gene
-            self.id = GeneDB().get_gene_id_for_gene_name(gene)
+        names = db.get_gene_name_many(set(gene._id for gene in genes if gene._name is _UNRESOLVED))
+        ids = db.get_gene_id_for_gene_name_many(set(gene._name for gene in genes if gene._id is _UNRESOLVED))
+        ids = dict((fold_symbol(name), gene_id) for name, gene_id in ids.items())
+
+        for gene in genes:
+            if gene._name is _UNRESOLVED:
+                gene._name = names.get(gene._id)
+            elif gene._id is _UNRESOLVED:
+                gene._id = ids.get(fold_symbol(gene._name))
+        return genes
+
+    @classmethod
+    def ids_many(cls, genes):
+        """
+        GeneIDs of many genes: GeneIDs are taken as given, the gene names are looked up in one batch.
+        :param genes: mix of GeneIDs and HGNC gene names
+        :return: list of GeneID (None for unknown names), in input order
+        """
+        genes = [cls(gene) for gene in genes]
+        names = set(gene._name for gene in genes if gene._id is _UNRESOLVED)
+        ids = dict((fold_symbol(name), gene_id) for name, gene_id in
+                   (shared(GeneDB).get_gene_id_for_gene_name_many(names) if names else {}).items())
+        return [ids.get(fold_symbol(gene._name)) if gene._id is _UNRESOLVED else gene._id for gene in genes]
 
     def __eq__(self, other):
-        return (self.__dict__ == other.__dict__)
+        return isinstance(other, Gene) and (self.id, self.name) == (other.id, other.name)
+
+    def __ne__(self, other):
+        return not self == other
 
     def __str__(self):
         return str([
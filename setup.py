@@ -19,8 +19,10 @@ setup(
         'setuptools',
         'configparser',
         'MySQL-python',
-        'pysqlpool',
         'metapub',
         ],
+    extras_require = {
+        'matrix': ['numpy'],
+        },
     )
 
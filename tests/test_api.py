@@ -0,0 +1,42 @@
+import sys
+import subprocess
+from unittest import TestCase
+from hamcrest import assert_that, is_, equal_to, less_than
+
+from medgen.db.medgen import MedGenDB
+
+IMPORT_CHECK = '''
+import sys
+import time
+started = time.time()
+import medgen.api
+elapsed = time.time() - started
+
+from medgen.config import config
+from medgen.db.pool import _pools
+from medgen.db.shared import _instances
+heavy = [name for name in ('numpy', 'metapub', 'requests') if name in sys.modules]
+print('%d %d %d %s %f' % (len(_pools), len(_instances), config._config is not None, ','.join(heavy) or '-', elapsed))
+'''
+
+class ApiImportTestCase(TestCase):
+
+    def test_import_has_no_side_effects(self):
+        # fresh interpreters, so nothing is imported yet; the fastest of three runs is timed
+        runs = [subprocess.check_output([sys.executable, '-c', IMPORT_CHECK]).split() for _ in range(3)]
+        pools, instances, config_loaded, heavy, _ = runs[0]
+        elapsed = min(float(run[-1]) for run in runs)
+
+        assert_that(pools, equal_to('0'))
+        assert_that(instances, equal_to('0'))
+        assert_that(config_loaded, equal_to('0'))
+        # optional and slow modules are imported on first use only
+        assert_that(heavy, equal_to('-'))
+        # the import takes about 50 ms; the bound leaves room for slow machines and still catches
+        # a database connection or an eager import of metapub at import time
+        assert_that(elapsed, less_than(1.0))
+
+    def test_lazy_names_keep_method_docs(self):
+        from medgen.api import Gene2PubMed, ConceptName
+        assert_that(Gene2PubMed.__name__, is_('gene2pubmed'))
+        assert_that(ConceptName.__doc__, equal_to(MedGenDB.concept_name.__doc__))
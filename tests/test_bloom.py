@@ -0,0 +1,23 @@
+from unittest import TestCase
+from hamcrest import assert_that, is_, less_than
+
+from medgen.db.bloom import BloomFilter, build_key_filter, fold_key
+
+class BloomFilterTestCase(TestCase):
+
+    def test_no_false_negatives(self):
+        keys = [fold_key('NM_%06d.1:c.%dA>G' % (n, n)) for n in range(5000)]
+        bloom = BloomFilter(len(keys), 0.01)
+        for key in keys:
+            bloom.add(key)
+        assert_that(all(key in bloom for key in keys), is_(True))
+
+        misses = [fold_key('NM_%06d.1:c.%dA>T' % (n, n)) for n in range(5000)]
+        assert_that(sum(1 for key in misses if key in bloom), less_than(150))
+
+    def test_key_filter(self):
+        key_filter = build_key_filter(None, lambda db: ['BRCA2', u'fancd1', None], epoch=(1,))
+        assert_that(key_filter.might_contain('brca2'), is_(True))
+        assert_that(key_filter.might_contain('FANCD1'), is_(True))
+        assert_that(key_filter.might_contain('NOT-A-GENE'), is_(False))
+        assert_that(key_filter.epoch, is_((1,)))
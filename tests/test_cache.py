@@ -0,0 +1,161 @@
+import os
+import time
+import shutil
+import tempfile
+import multiprocessing
+from unittest import TestCase
+from hamcrest import assert_that, is_, equal_to
+
+from medgen.db.cache import LRUCache, cache_stats, cached
+from medgen.db.diskcache import DiskCache
+from medgen.db.epoch import DatasetEpoch, on_epoch_change, check_epochs, shared_structure
+from medgen.db.dataset import SQLData
+from medgen.db.gene import GeneDB
+
+class _StubGeneDB(GeneDB):
+    """
+    GeneDB answering every query without a server, counting the queries.
+    """
+    queries = 0
+
+    def __init__(self):
+        SQLData.__init__(self, config_section='gene', backend='mysql', db_host='stub', dataset='stub_gene')
+
+    def dataset_epoch(self):
+        return ('2016-01-01',)
+
+    def fetchall(self, select_sql, args=None, row_format='dict'):
+        _StubGeneDB.queries += 1
+        return [{'PMID': 9528852}]
+
+class LRUCacheTestCase(TestCase):
+
+    def test_lru_eviction(self):
+        cache = LRUCache('test', max_entries=2)
+        cache.set('a', [1])
+        cache.set('b', [2])
+        cache.get('a')
+        cache.set('c', [3])
+
+        assert_that(cache.get('b'), equal_to((False, None)))
+        assert_that(cache.get('a'), equal_to((True, [1])))
+        assert_that(cache.stats()['evictions'], is_(1))
+
+    def test_byte_budget(self):
+        cache = LRUCache('test', max_entries=0, max_bytes=1000)
+        for i in range(100):
+            cache.set(i, ['x' * 100])
+        assert_that(len(cache) < 10, is_(True))
+        assert_that(cache.stats()['bytes'] <= 1000, is_(True))
+
+    def test_ttl_and_negative_caching(self):
+        cache = LRUCache('test', ttl=0.05, negative_ttl=0)
+        cache.set('missing', [])
+        cache.set('found', [1])
+        assert_that(cache.get('missing'), equal_to((False, None)))
+        assert_that(cache.get('found'), equal_to((True, [1])))
+        time.sleep(0.1)
+        assert_that(cache.get('found'), equal_to((False, None)))
+        assert_that(cache.stats()['expired'], is_(1))
+
+    def test_cached_db_method(self):
+        # the cache is shared by every instance of the dataset
+        assert_that(_StubGeneDB().gene2pubmed(675), equal_to([{'PMID': 9528852}]))
+        assert_that(_StubGeneDB().gene2pubmed(675), equal_to([{'PMID': 9528852}]))
+        assert_that(_StubGeneDB.queries, is_(1))
+        assert_that(cache_stats()['stub_gene._StubGeneDB.gene2pubmed']['hits'], is_(1))
+
+
+def _disk_cache_writer(path):
+    DiskCache(path).set('gene', ('GeneDB.gene2pubmed', (675,)), [{'PMID': 1}])
+
+class DiskCacheTestCase(TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmpdir, 'cache.sqlite')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_shared_between_processes(self):
+        proc = multiprocessing.Process(target=_disk_cache_writer, args=(self.path,))
+        proc.start()
+        proc.join()
+
+        cache = DiskCache(self.path)
+        assert_that(cache.get('gene', ('GeneDB.gene2pubmed', (675,))), equal_to((True, [{'PMID': 1}])))
+        assert_that(cache.get('clinvar', ('GeneDB.gene2pubmed', (675,))), equal_to((False, None)))
+
+    def test_ttl_clear_and_eviction(self):
+        cache = DiskCache(self.path, max_bytes=5000)
+        cache.set('gene', 'expired', [1], ttl=0.01)
+        time.sleep(0.05)
+        assert_that(cache.get('gene', 'expired'), equal_to((False, None)))
+
+        for i in range(50):
+            cache.set('gene', i, ['x' * 200])
+        cache.evict()
+        assert_that(cache.stats()['bytes'] <= 5000, is_(True))
+        assert_that(cache.get('gene', 49)[0], is_(True))
+
+        cache.clear('gene')
+        assert_that(cache.stats()['entries'], is_(0))
+
+
+class _ReloadedDataset(object):
+    _db_host, _db_port, _db_name, _cfg_section = 'localhost', 3306, 'structures', 'gene'
+    epoch = ('2016-01-01',)
+
+    def dataset_epoch(self):
+        return self.epoch
+
+class _Structure(list):
+    pass
+
+class _UnreachableDataset(object):
+    _db_host, _db_port, _db_name, _cfg_section = 'localhost', 3306, 'unreachable', 'gene'
+    calls = 0
+
+    def dataset_epoch(self):
+        raise IOError('connection refused')
+
+    @cached
+    def lookup(self, value):
+        self.calls += 1
+        return [value]
+
+class DatasetEpochTestCase(TestCase):
+
+    def test_epoch_change_notifies_listeners(self):
+        changes = []
+        on_epoch_change(lambda key, old, new: changes.append((key, old, new)))
+
+        db = _ReloadedDataset()
+        tracker = DatasetEpoch(('localhost', 3306, 'reloaded'), interval=0)
+        assert_that(tracker.current(db), equal_to(('2016-01-01',)))
+        assert_that(tracker.current(db), equal_to(('2016-01-01',)))
+
+        db.epoch = ('2016-02-01',)
+        assert_that(tracker.current(db), equal_to(('2016-02-01',)))
+        assert_that([change for change in changes if change[0][2] == 'reloaded'],
+                    equal_to([(('localhost', 3306, 'reloaded'), ('2016-01-01',), ('2016-02-01',))]))
+        assert_that(tracker.stats()['changes'], is_(1))
+
+    def test_unknown_epoch_is_not_cached(self):
+        db = _UnreachableDataset()
+        assert_that(DatasetEpoch(('localhost', 3306, 'unreachable'), interval=0).current(db), is_(None))
+        assert_that(db.lookup(675), equal_to([675]))
+        assert_that(db.lookup(675), equal_to([675]))
+        assert_that(db.calls, is_(2))
+
+    def test_shared_structure_rebuilt_after_reload(self):
+        db = _ReloadedDataset()
+        build = lambda db: _Structure([db.epoch])
+        structure = shared_structure(db, 'test', build)
+        assert_that(shared_structure(db, 'test', build) is structure, is_(True))
+
+        db.epoch = ('2016-02-01',)
+        check_epochs()
+        assert_that(shared_structure(db, 'test', build), equal_to([('2016-02-01',)]))
+        assert_that(shared_structure(db, 'test', build).epoch, equal_to(('2016-02-01',)))
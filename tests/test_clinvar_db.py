@@ -33,6 +33,16 @@ class TestClinVarDB(TestCase):
         assert_that(variation_id in ClinVarDB().variation_id_for_hgvs_text(hgvs_text))
         assert_that(hgvs_text in ClinVarDB().hgvs_text_for_variation_id(variation_id))
 
+    def test_batch_lookups_keep_input_order(self):
+        hgvs_texts = ['NM_133378.4:c.98772T>C', 'NM_000000.0:c.1A>G', 'NM_133378.4:c.98772T>C']
+        results = self.db.clinvar_ids_many(hgvs_texts)
+
+        assert_that([hgvs_text for hgvs_text, _ in results], equal_to(hgvs_texts))
+        assert_that(47706, is_in(results[0][1]))
+        assert_that(results[1][1], equal_to([]))
+        assert_that(results[2][1], equal_to(results[0][1]))
+        assert_that(results[0][1], equal_to(self.db.variation_id_for_hgvs_text(hgvs_texts[0])))
+
     def test_convert_pubmed_central_PMCID_to_pubmed_PMID(self):
         pmcid = int(3110945)
         pmid = int(15371902)
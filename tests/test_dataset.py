@@ -3,7 +3,7 @@ from unittest import TestCase
 from hamcrest import *
 from datetime import datetime
 from medgen.db.dataset import SQLData
-from medgen.db.dataset import EscapeString
+from medgen.db.dataset import select_fields
 
 class TestSQLData(TestCase):
 
@@ -33,6 +33,58 @@ class TestSQLData(TestCase):
         sql_query_with_missing_ID ='select distinct HGVS_c from variant_summary where AlleleID = "15041"'
         assert_that(calling(db.fetchID).with_args(sql_query_with_missing_ID), raises(Exception))
 
+    def test_fetch_iter_matches_fetchall(self):
+        db = SQLData(config_section='clinvar')
+
+        sql_query = 'select AlleleID, HGVS_c from variant_summary where GeneID = %s order by AlleleID'
+        streamed = list(db.fetch_iter(sql_query, [675], chunk_size=7))
+        assert_that(streamed, equal_to(db.fetchall(sql_query, [675])))
+        assert_that(list(db.iter_list(sql_query, 'AlleleID', [675])), equal_to([row['AlleleID'] for row in streamed]))
+
+    def test_scan_pages_by_key(self):
+        db = SQLData(config_section='clinvar')
+
+        rows = list(db.scan('variant_summary', 'AlleleID', chunk=100, columns='AlleleID', min_key=15000))
+        assert_that(len(rows), greater_than(100))
+        keys = [row['AlleleID'] for row in rows[:250]]
+        assert_that(keys, equal_to(sorted(set(keys))))
+
+    def test_select_fields(self):
+        assert_that(select_fields(None), equal_to('*'))
+        assert_that(select_fields(('Symbol', 'GeneDesc'), required=['GeneID']), equal_to('`Symbol`, `GeneDesc`, `GeneID`'))
+        self.assertRaises(ValueError, select_fields, ['Symbol; drop table gene_info'])
+
+        row = SQLData(config_section='gene').fetchrow(
+            'select {} from gene_info where GeneID = %s'.format(select_fields('Symbol')), [675])
+        assert_that(row, equal_to({'Symbol': 'BRCA2'}))
+
+    def test_join_keys_matches_in_list(self):
+        db = SQLData(config_section='clinvar')
+
+        allele_ids = [row['AlleleID'] for row in db.scan('variant_summary', 'AlleleID', chunk=500, columns='AlleleID')]
+        allele_ids = allele_ids[:500] + [-1]
+        joined = db.join_keys(allele_ids, 'select V.AlleleID from {keys} K join variant_summary V on V.AlleleID = K.join_key')
+        in_list = db.fetchall_in('select AlleleID from variant_summary where AlleleID in ({})', allele_ids)
+
+        assert_that(sorted(row['AlleleID'] for row in joined), equal_to(sorted(row['AlleleID'] for row in in_list)))
+
+    def test_bulk_writes_in_transaction(self):
+        db = SQLData(config_section='pubmed')
+
+        # temporary tables live on one connection, which transaction() pins for the block
+        with db.transaction():
+            db.execute('create temporary table test_bulk (id int primary key, label varchar(20))')
+            rows = [{'id': i, 'label': 'row %d' % i} for i in range(2500)]
+            assert_that(db.insert_many('test_bulk', rows), is_(2500))
+
+            db.update_many('test_bulk', 'id', [{'id': 1, 'label': 'one'}, {'id': 2, 'label': 'two'}])
+            db.upsert_many('test_bulk', [{'id': 3, 'label': 'three'}, {'id': 5000, 'label': 'new'}])
+
+            assert_that(db.fetchID('select count(*) as ID from test_bulk'), is_(2501))
+            assert_that(db.fetchlist('select label from test_bulk where id <= 3 order by id', 'label'),
+                        equal_to(['row 0', 'one', 'two', 'three']))
+            db.drop_table('test_bulk')
+
     def test_get_last_mirror_time(self):
         db = SQLData(config_section='clinvar')
         last_mirror_time = db.get_last_mirror_time("variant_summary")
@@ -8,6 +8,8 @@ from medgen.db.gene    import GeneDB
 from medgen.db.medgen  import MedGenDB
 from medgen.db.hugo    import HugoDB
 from medgen.db.personalgenomes import PersonalGenomesDB
+from medgen.db.pool import ConnectionPool
+from medgen.exceptions import ConnectError
 ########################################
 
 class ConnectDBsTestCase(TestCase):
@@ -19,6 +21,17 @@ class ConnectDBsTestCase(TestCase):
             ping = db.ping()
             assert_that(ping['tables'][0]['table_schema'], is_(db._db_name))
 
+    def test_connection_pool_shared_per_host(self):
+        gene, clinvar = GeneDB(), ClinVarDB()
+        assert_that(gene.pool() is clinvar.pool(), is_(gene._db_host == clinvar._db_host))
+
+        before = gene.pool_stats()['checkouts']
+        gene.ping()
+        stats = gene.pool_stats()
+        assert_that(stats['checkouts'], is_(before + 1))
+        assert_that(stats['active'], is_(0))
+        assert_that(stats['idle'] > 0, is_(True))
+
     def test_truncate_str(self):
         s = "NP_775931.3:p.(Pro504delinsArgGluProGlnIleProProArgGlyCysLysGlyAlaGluPheAlaProArgTrpGlnArgLysTrpArgGlnProProCysArgLeuValLeuCysValLeuTrpGluGlyProGlyValSerArgArgGlyGluLeuGluGlyAlaProCysGlyCysHisArgArgLysGlyLeuThrTrpGlyGlyGluPheTrpLysAlaGlyAlaLeuGlyProAlaGlyArgGlyHisGlnSerProAsnAlaGlnLeuLeuHisSerValSerProThrProGluAspGlnValSerAlaAlaProLeuLeuAlaArgAlaLeuHisTrpGlyAlaLysGlyTrpArgProCysArgTrpProCysProProTrpAlaSerArgProLeuArgGlyTrpProValLeuProIleThrSerLeuGlyGlnSerHisHisLeuLeuSerIleLysLeuProGlnArgLeuArgProProGlyLeuHisGlnProSerProProGlyLeuArgValArgTrpAlaSerSerProSerMetGlyGlyAsn)"
         db = SQLData(dataset='medgen')
@@ -26,5 +39,18 @@ class ConnectDBsTestCase(TestCase):
         assert_that(len(s_truncated), is_(200))
 
 
+class ConnectErrorTestCase(TestCase):
 
+    def test_pool_timeout_message(self):
+        pool = ConnectionPool('localhost', 'medgen', 'medgen', max_size=1, timeout=0)
+        pool._active = 1
+        try:
+            pool.checkout('gene')
+        except ConnectError as e:
+            assert_that(str(e), is_('timed out waiting for a connection to localhost (max_size=1)'))
+        else:
+            raise AssertionError('checkout did not time out')
 
+    def test_cause_in_message(self):
+        error = ConnectError('could not connect to medgen@localhost:1', IOError('connection refused'))
+        assert_that(str(error), is_('could not connect to medgen@localhost:1: connection refused'))
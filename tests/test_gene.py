@@ -4,6 +4,7 @@ from hamcrest import assert_that, is_
 
 #### medgen
 from medgen.api import Gene, GeneDB, Gene2PubMed, Gene2LocusDB, Gene2Function, GeneID, GeneNamePreferred, GeneName
+from medgen.db.gene_index import get_gene_symbol_index
 
 class GeneTestCase(TestCase):
     gene_id = 675
@@ -20,4 +21,11 @@ class GeneTestCase(TestCase):
         Gene(self.gene_id)
         Gene2PubMed(self.gene_id)
         Gene2LocusDB(self.gene_id)
-        Gene2Function(self.gene_id)
\ No newline at end of file
+        Gene2Function(self.gene_id)
+
+    def test_symbol_index(self):
+        index = get_gene_symbol_index(GeneDB())
+        assert_that(index.gene_id(self.gene_name.lower()), is_(self.gene_id))
+        assert_that(index.gene_name(self.gene_id), is_(self.gene_name))
+        assert_that(self.gene_id in index.gene_ids_for_alias('FANCD1'), is_(True))
+        assert_that(self.gene_name in GeneNamePreferred('FANCD1'), is_(True))
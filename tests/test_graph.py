@@ -0,0 +1,72 @@
+from unittest import TestCase
+from hamcrest import assert_that, is_
+
+from medgen.db.graph import Graph
+from medgen.db.hierarchy import DiseaseHierarchy
+from medgen.db.concept_graph import ConceptGraph
+
+# Cardiomyopathy -> {Dilated, Hypertrophic}; Dilated -> Familial dilated; Familial dilated also under Heart disease
+SUBTYPES = [
+    ('C0878544', 'C0007193'),
+    ('C0878544', 'C0007194'),
+    ('C0007193', 'C0340427'),
+    ('C0018799', 'C0878544'),
+    ('C0018799', 'C0340427'),
+]
+
+class GraphTestCase(TestCase):
+
+    def test_typed_edges(self):
+        graph = Graph([('A', 'B', 'CHD'), ('A', 'C', 'RO'), ('B', 'D', 'CHD'), ('A', 'B', 'CHD')])
+        assert_that(graph.edge_count, is_(3))
+        assert_that(graph.successors('A'), is_(['B', 'C']))
+        assert_that(graph.successors('A', 'RO'), is_(['C']))
+        assert_that(graph.predecessors('D'), is_(['B']))
+        assert_that(graph.walk('A', edge_types=['CHD']), is_({'A': 0, 'B': 1, 'D': 2}))
+        assert_that(graph.successors('Z'), is_([]))
+
+
+class DiseaseHierarchyTestCase(TestCase):
+
+    def setUp(self):
+        self.hierarchy = DiseaseHierarchy(SUBTYPES)
+
+    def test_ancestors_descendants(self):
+        assert_that(self.hierarchy.descendants('C0878544'), is_(['C0007193', 'C0007194', 'C0340427']))
+        assert_that(self.hierarchy.descendants('C0878544', max_depth=1), is_(['C0007193', 'C0007194']))
+        assert_that(self.hierarchy.ancestors('C0340427'), is_(['C0007193', 'C0018799', 'C0878544']))
+        assert_that(self.hierarchy.parents('C0340427'), is_(['C0007193', 'C0018799']))
+        assert_that(self.hierarchy.ancestors('C9999999'), is_([]))
+
+    def test_lowest_common_ancestors(self):
+        assert_that(self.hierarchy.lowest_common_ancestors('C0340427', 'C0007194'), is_(['C0878544']))
+        assert_that(self.hierarchy.lowest_common_ancestors('C0340427', 'C0007193'), is_(['C0007193']))
+        assert_that(self.hierarchy.lowest_common_ancestors('C0340427', 'C9999999'), is_([]))
+
+
+class ConceptGraphTestCase(TestCase):
+
+    def setUp(self):
+        # MGREL rows: CUI1, CUI2, (REL, RELA)
+        self.graph = ConceptGraph([
+            ('C0006142', 'C1458155', ('CHD', 'isa')),
+            ('C1458155', 'C0006142', ('PAR', 'inverse_isa')),
+            ('C0006142', 'C0024121', ('RO', 'has_manifestation')),
+            ('C0024121', 'C0027651', ('RO', 'has_manifestation')),
+            ('C0027651', 'C0006826', ('RB', None)),
+        ])
+
+    def test_related(self):
+        assert_that(self.graph.related('C0006142'), is_(['C1458155', 'C0024121']))
+        assert_that(self.graph.related('C0006142', rel='RO'), is_(['C0024121']))
+        assert_that(self.graph.related('C0024121', rela='has_manifestation', direction='reverse'), is_(['C0006142']))
+        assert_that(self.graph.related_many(['C0027651', 'C9999999'], rel=['RO', 'RB']),
+                    is_({'C0027651': ['C0006826', 'C0024121'], 'C9999999': []}))
+        assert_that(self.graph.relations('C0024121'), is_([('C0024121', 'RO', 'has_manifestation', 'C0027651'),
+                                                          ('C0006142', 'RO', 'has_manifestation', 'C0024121')]))
+
+    def test_within(self):
+        assert_that(self.graph.within('C0006142', 2, rel='RO'), is_({'C0024121': 1, 'C0027651': 2}))
+        assert_that(self.graph.within('C0006142', 1).keys(), is_(['C1458155', 'C0024121']))
+        assert_that(self.graph.within('C0006826', 3, direction='reverse'),
+                    is_({'C0027651': 1, 'C0024121': 2, 'C0006142': 3}))
@@ -0,0 +1,47 @@
+import os
+import shutil
+import tempfile
+from datetime import datetime
+from unittest import TestCase
+from hamcrest import assert_that, is_, none, not_none
+
+from medgen.db.hgvs_index import HGVSIndex, write_hgvs_index, get_hgvs_index, epoch_text
+
+ROWS = [
+    ('NM_000059.3:c.68-7T>A', 2, 15041, 'RCV000031217'),
+    ('NM_000059.3:c.68-7T>A', 2, 15041, 'RCV000031218'),
+    ('NC_000013.11:g.32316455T>A', 2, 15041, 'RCV000031217'),
+    ('NM_007294.3:c.5266dupC', 17677, 32716, None),
+    ('NP_009225.1:p.Gln1756Profs', 17677, 32716, 'RCV000077484'),
+]
+
+class HGVSIndexTestCase(TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmpdir, 'clinvar.hgvsidx')
+        write_hgvs_index(self.path, ROWS, epoch=('2016-01-01', '2016-01'))
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_lookup(self):
+        index = HGVSIndex(self.path)
+        assert_that(len(index), is_(4))
+        assert_that(index.ids('NM_000059.3:c.68-7T>A'), is_([2]))
+        assert_that(index.ids('nm_000059.3:c.68-7t>a', 'RCVaccession'), is_(['RCV000031217', 'RCV000031218']))
+        assert_that(index.ids(u'NM_007294.3:c.5266dupC', 'AlleleID'), is_([32716]))
+        assert_that(index.ids('NM_007294.3:c.5266dupC', 'RCVaccession'), is_([]))
+        assert_that(index.lookup('NM_000059.3:c.1A>G'), is_([]))
+        assert_that('NP_009225.1:p.Gln1756Profs' in index, is_(True))
+
+    def test_epoch(self):
+        assert_that(get_hgvs_index(self.path, ('2016-01-01', '2016-01')).ids('NM_007294.3:c.5266dupC'), is_([17677]))
+        assert_that(get_hgvs_index(self.path, ('2016-02-01', '2016-02')), is_(none()))
+        # the driver's types do not matter: datetime and unicode parts match the strings exported
+        assert_that(epoch_text((datetime(2016, 1, 1), 2016L, u'x')), is_(epoch_text(('2016-01-01 00:00:00', 2016, 'x'))))
+        assert_that(get_hgvs_index(self.path, (u'2016-01-01', u'2016-01')), is_(not_none()))
+
+        # a new export replaces the file and is picked up
+        write_hgvs_index(self.path, ROWS[:1], epoch=('2016-02-01', '2016-02'))
+        assert_that(len(get_hgvs_index(self.path, ('2016-02-01', '2016-02'))), is_(1))
@@ -0,0 +1,53 @@
+import os
+import gzip
+import tempfile
+import datetime
+from unittest import TestCase
+from hamcrest import assert_that, is_, equal_to, contains_string
+
+from medgen.db.pubmed import iter_medline_citations, PubMedDB
+
+MEDLINE_XML = """<?xml version="1.0"?>
+<PubmedArticleSet>
+<PubmedArticle>
+<MedlineCitation Status="MEDLINE" Owner="NLM">
+<PMID Version="1">11429441</PMID>
+<DateCreated><Year>2001</Year><Month>06</Month><Day>21</Day></DateCreated>
+<DateCompleted><Year>2001</Year><Month>07</Month><Day>05</Day></DateCompleted>
+<DateRevised><Year>2010</Year><Month>11</Month><Day>18</Day></DateRevised>
+</MedlineCitation>
+<PubmedData/>
+</PubmedArticle>
+<PubmedArticle>
+<MedlineCitation Status="MEDLINE" Owner="NLM">
+<PMID Version="1">11429442</PMID>
+<DateCreated><Year>2001</Year><Month>06</Month><Day>22</Day></DateCreated>
+</MedlineCitation>
+</PubmedArticle>
+</PubmedArticleSet>
+"""
+
+class MedlineParseTestCase(TestCase):
+
+    def setUp(self):
+        handle, self.path = tempfile.mkstemp(suffix='.xml.gz')
+        os.close(handle)
+        with gzip.open(self.path, 'wb') as out:
+            out.write(MEDLINE_XML)
+
+    def tearDown(self):
+        os.remove(self.path)
+
+    def test_iter_medline_citations(self):
+        citations = list(iter_medline_citations(self.path))
+
+        assert_that([pmid for pmid, _, _ in citations], equal_to(['11429441', '11429442']))
+        assert_that(citations[0][1], is_(datetime.date(2010, 11, 18)))
+        assert_that(citations[1][1], is_(datetime.date(2001, 6, 22)))
+        assert_that(citations[0][2], contains_string('<DateRevised>'))
+
+    def test_citation_xml_matches_regex_parsing(self):
+        db = PubMedDB()
+        for pmid, last_date, xml in iter_medline_citations(self.path):
+            assert_that(db._get_PMID(xml), is_(pmid))
+            assert_that(db._get_last_date(xml), is_(last_date))
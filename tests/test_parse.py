@@ -19,5 +19,18 @@ class ParseTestCase(unittest.TestCase):
         #assert_that(Concept('C0007194').medgen_uid, equal_to(Concept(2881).medgen_uid))
         #self.assertEqual(Concept('C0007194').medgen_uid, Concept(2881).medgen_uid)
 
+    def test_lazy_canonical_ids(self):
+        # the identifier given is used as is, nothing is looked up until the other one is needed
+        assert_that(Gene(675).id, equal_to(675))
+        assert_that(Concept('C0007194').umls_cui, equal_to('C0007194'))
+
+    def test_resolve_many(self):
+        genes = Gene.resolve_many(['BRCA2', 675, '675', 'BRCA1'])
+        assert_that([gene.id for gene in genes], equal_to([675, 675, 675, 672]))
+        assert_that([gene.name for gene in genes], equal_to(['BRCA2', 'BRCA2', 'BRCA2', 'BRCA1']))
+
+        concepts = Concept.resolve_many(['C0007194', 2881])
+        assert_that(concepts[0], equal_to(concepts[1]))
+
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file
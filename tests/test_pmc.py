@@ -0,0 +1,162 @@
+import json
+import time
+import sqlite3
+import threading
+import urlparse
+from BaseHTTPServer import HTTPServer, BaseHTTPRequestHandler
+from unittest import TestCase
+from hamcrest import assert_that, is_
+
+from medgen.db.pmc import PMCIDMap, IdConverter, normalize_pmcid
+from medgen.db.epoch import check_epochs
+from medgen.db.dataset import SQLData
+from medgen.db.pubmed import PubMedDB
+
+# what the PMC ID Converter answers, PMCID -> PMID (None: in PMC without a PMID)
+IDCONV = {'PMC3110945': '15371902', 'PMC4000000': None}
+
+class IdConvHandler(BaseHTTPRequestHandler):
+    """
+    Stand-in for the PMC ID Converter: records the ids of every request.
+    """
+    def do_GET(self):
+        ids = urlparse.parse_qs(urlparse.urlparse(self.path).query)['ids'][0].split(',')
+        self.server.requests.append(ids)
+        records = []
+        for pmcid in ids:
+            if pmcid not in IDCONV:
+                records.append({'requested-id': pmcid, 'status': 'error', 'errmsg': 'invalid article id'})
+            elif IDCONV[pmcid] is None:
+                records.append({'pmcid': pmcid})
+            else:
+                records.append({'pmcid': pmcid, 'pmid': IDCONV[pmcid]})
+        body = json.dumps({'status': 'ok', 'records': records})
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+class BadStatusHandler(BaseHTTPRequestHandler):
+    """
+    Closes the connection without a response (httplib.BadStatusLine).
+    """
+    def do_GET(self):
+        self.close_connection = 1
+
+    def log_message(self, *args):
+        pass
+
+class _NoPMCIdsDB(PubMedDB):
+    """
+    PubMedDB of a dataset loaded without PMC-ids.csv, counting the lookups of the pmc_ids table.
+    """
+    epoch = ('2016-01-01',)
+    lookups = 0
+
+    def __init__(self):
+        SQLData.__init__(self, config_section='pubmed', backend='mysql', db_host='stub', dataset='no_pmc_ids')
+
+    def dataset_epoch(self):
+        return self.epoch
+
+    def pmcid_map(self):
+        _NoPMCIdsDB.lookups += 1
+        raise sqlite3.OperationalError('no such table: pmc_ids')
+
+def start_idconv_server(handler=IdConvHandler):
+    """
+    :return: HTTPServer serving handler from a thread, its URL is 'http://127.0.0.1:%d/' % server.server_port
+    """
+    server = HTTPServer(('127.0.0.1', 0), handler)
+    server.requests = []
+    thread = threading.Thread(target=server.serve_forever)
+    thread.daemon = True
+    thread.start()
+    return server
+
+
+class PMCIDMapTestCase(TestCase):
+
+    def test_pmid(self):
+        pmcid_map = PMCIDMap([('PMC3110945', 15371902), ('PMC13900', 11250746), ('PMC17000', None), ('bogus', 1)])
+        assert_that(len(pmcid_map), is_(2))
+        assert_that(pmcid_map.pmid('PMC3110945'), is_(15371902))
+        assert_that(pmcid_map.pmid('pmc13900'), is_(11250746))
+        assert_that(pmcid_map.pmid(13900), is_(11250746))
+        assert_that(pmcid_map.pmid('PMC17000'), is_(None))
+        assert_that(pmcid_map.pmid('PMC99999999'), is_(None))
+        assert_that(normalize_pmcid(' PMC3110945 '), is_(3110945))
+        assert_that(normalize_pmcid('PMCX'), is_(None))
+        assert_that(normalize_pmcid(u'PMC\xc51'), is_(None))
+        assert_that(pmcid_map.pmid(u'PMC13900'), is_(11250746))
+
+    def test_missing_table_remembered_per_epoch(self):
+        db = _NoPMCIdsDB()
+        assert_that(db.pmcid_to_pmid(['PMC3110945'], fallback=False), is_({'PMC3110945': None}))
+        assert_that(db.pmcid_to_pmid(['PMC3110945'], fallback=False), is_({'PMC3110945': None}))
+        assert_that(_NoPMCIdsDB.lookups, is_(1))
+
+        # loaded again, maybe with PMC-ids.csv this time
+        _NoPMCIdsDB.epoch = ('2016-02-01',)
+        check_epochs()
+        db.pmcid_to_pmid(['PMC3110945'], fallback=False)
+        assert_that(_NoPMCIdsDB.lookups, is_(2))
+
+
+class IdConverterTestCase(TestCase):
+
+    def setUp(self):
+        self.server = start_idconv_server()
+        self.url = 'http://127.0.0.1:%d/' % self.server.server_port
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def test_convert(self):
+        converter = IdConverter(self.url, batch_size=2, requests_per_second=100)
+        assert_that(converter.convert(['PMC3110945', 4000000, '5000000', 'bogus']),
+                    is_({3110945: 15371902, 4000000: None, 5000000: None}))
+        assert_that(self.server.requests, is_([['PMC3110945', 'PMC4000000'], ['PMC5000000']]))
+
+        # answers are kept, only new PMCIDs are requested
+        assert_that(converter.convert([3110945, 'PMC6000000']), is_({3110945: 15371902, 6000000: None}))
+        assert_that(self.server.requests[2:], is_([['PMC6000000']]))
+        assert_that(converter.requests, is_(3))
+
+    def test_answers_bounded(self):
+        converter = IdConverter(self.url, requests_per_second=0, max_answers=1)
+        converter.convert(['PMC3110945'])
+        converter.convert(['PMC4000000'])
+        assert_that(converter.convert(['PMC3110945']), is_({3110945: 15371902}))
+        assert_that(self.server.requests, is_([['PMC3110945'], ['PMC4000000'], ['PMC3110945']]))
+
+    def test_rate_limit(self):
+        converter = IdConverter(self.url, batch_size=1, requests_per_second=20)
+        started = time.time()
+        converter.convert(['PMC1', 'PMC2', 'PMC3'])
+        assert_that(len(self.server.requests), is_(3))
+        assert_that(time.time() - started >= 0.1, is_(True))
+
+    def test_failed_request(self):
+        # nothing listens on the port of a closed server: the PMCIDs are left out, and asked again next time
+        closed = HTTPServer(('127.0.0.1', 0), IdConvHandler)
+        closed.server_close()
+        converter = IdConverter('http://127.0.0.1:%d/' % closed.server_port, requests_per_second=0, timeout=5)
+        assert_that(converter.convert(['PMC3110945']), is_({}))
+        assert_that(converter.requests, is_(1))
+        converter.convert(['PMC3110945'])
+        assert_that(converter.requests, is_(2))
+
+    def test_bad_status_line(self):
+        server = start_idconv_server(BadStatusHandler)
+        try:
+            converter = IdConverter('http://127.0.0.1:%d/' % server.server_port, requests_per_second=0, timeout=5)
+            assert_that(converter.convert(['PMC3110945']), is_({}))
+        finally:
+            server.shutdown()
+            server.server_close()
@@ -0,0 +1,31 @@
+from array import array
+from unittest import TestCase
+from hamcrest import assert_that, is_, equal_to, instance_of
+
+from medgen.db.rows import format_rows, record_class
+
+COLUMNS = ['GeneID', 'Symbol', 'ClinicalSignificance']
+ROWS = [(675, u'BRCA2', u'Pathogenic'), (672, u'BRCA1', u'Pathogenic'), (7157, u'TP53', None)]
+
+class RowFormatTestCase(TestCase):
+
+    def test_tuple_rows_share_header(self):
+        rows = format_rows(COLUMNS, list(ROWS), 'tuple')
+        assert_that(rows.columns, equal_to(tuple(COLUMNS)))
+        assert_that(rows[0][rows.position('Symbol')], equal_to('BRCA2'))
+
+    def test_record_class_per_shape(self):
+        rows = format_rows(COLUMNS, list(ROWS), 'record')
+        assert_that(rows[1].Symbol, equal_to('BRCA1'))
+        assert_that(type(rows[0]) is record_class(COLUMNS), is_(True))
+
+    def test_columns(self):
+        result = format_rows(COLUMNS, [tuple(u'%s' % value if isinstance(value, unicode) else value for value in row)
+                                       for row in ROWS], 'columns')
+        assert_that(len(result), is_(3))
+        assert_that(result['GeneID'], instance_of(array))
+        assert_that(result['ClinicalSignificance'][0] is result['ClinicalSignificance'][1], is_(True))
+        assert_that(list(result)[2], equal_to(ROWS[2]))
+
+    def test_unknown_format(self):
+        self.assertRaises(ValueError, format_rows, COLUMNS, ROWS, 'xml')
@@ -0,0 +1,36 @@
+from unittest import TestCase, skipIf
+from hamcrest import assert_that, is_
+
+from medgen.db.significance import SignificanceMatrix, have_numpy
+
+ROWS = [
+    (675, 'BRCA2', 'Pathogenic', 900),
+    (675, 'BRCA2', 'Benign', 300),
+    (675, 'BRCA2', 'Likely pathogenic', 40),
+    (672, 'BRCA1', 'Pathogenic', 1200),
+    (672, 'BRCA1', 'Uncertain significance', 1500),
+    (4292, 'MLH1', 'Likely pathogenic', 3),
+    (-1, 'subset of 2 genes: BRCA1, BRCA2', 'Pathogenic', 7),
+]
+
+@skipIf(not have_numpy(), 'numpy is not installed')
+class SignificanceMatrixTestCase(TestCase):
+
+    def setUp(self):
+        self.matrix = SignificanceMatrix(ROWS, epoch=('2016-01-01', '2016-01'))
+
+    def test_frequency(self):
+        assert_that(len(self.matrix), is_(3))
+        assert_that(self.matrix.frequency('brca2'), is_([{'ClinicalSignificance': 'Pathogenic', 'cnt_variants': 900},
+                                                          {'ClinicalSignificance': 'Benign', 'cnt_variants': 300},
+                                                          {'ClinicalSignificance': 'Likely pathogenic', 'cnt_variants': 40}]))
+        assert_that(self.matrix.frequency(4292), is_([{'ClinicalSignificance': 'Likely pathogenic', 'cnt_variants': 3}]))
+        assert_that(self.matrix.frequency('NOTAGENE'), is_([]))
+        assert_that(self.matrix.gene_id('MLH1'), is_(4292))
+
+    def test_whole_genome(self):
+        assert_that(self.matrix.totals(), is_({'Pathogenic': 2100, 'Benign': 300, 'Likely pathogenic': 43,
+                                               'Uncertain significance': 1500}))
+        assert_that(self.matrix.genes_with('pathogenic', 1000), is_([672]))
+        assert_that(self.matrix.genes_with(['Pathogenic', 'Likely pathogenic']), is_([672, 675, 4292]))
+        assert_that(self.matrix.genes_with('protective'), is_([]))
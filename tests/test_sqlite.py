@@ -0,0 +1,305 @@
+import os
+import gzip
+import shutil
+import tempfile
+from unittest import TestCase, SkipTest
+from hamcrest import assert_that, is_, contains_inanyorder, has_entries, calling, raises, greater_than
+
+from medgen.config import config
+from medgen.exceptions import ConnectError
+from medgen.db.dataset import SQLData, missing_table
+from medgen.db import sqlite
+from medgen.db.sqlite import translate
+from medgen.db.loaders import load_directory
+from medgen.db.gene import GeneDB
+from medgen.db.gene_index import get_gene_symbol_index
+from medgen.db.clinvar import ClinVarDB
+from medgen.db.medgen import MedGenDB
+from medgen.db.bloom import get_key_filter
+from medgen.db.cache import cache_stats
+from medgen.db.epoch import dataset_epoch
+from medgen.db.significance import get_significance_matrix, have_numpy
+from medgen.db import shared
+from medgen.annotate.gene import annotate_gene_panel
+from medgen.db.crosswalk import IdentifierCrosswalk
+from medgen.db.pubmed import PubMedDB
+from medgen.parse.gene import Gene
+from medgen.annotate.ncbi_variant import ClinvarPubmeds
+from test_pmc import start_idconv_server
+
+VARIANT_SUMMARY_HEADER = ['AlleleID', 'Type', 'Name', 'GeneID', 'GeneSymbol', 'HGNC_ID', 'ClinicalSignificance',
+                          'ClinSigSimple', 'LastEvaluated', 'RS# (dbSNP)', 'nsv/esv (dbVar)', 'RCVaccession',
+                          'PhenotypeIDS', 'PhenotypeList', 'Origin', 'OriginSimple', 'Assembly', 'ChromosomeAccession',
+                          'Chromosome', 'Start', 'Stop', 'ReferenceAllele', 'AlternateAllele', 'Cytogenetic',
+                          'ReviewStatus', 'NumberSubmitters', 'Guidelines', 'TestedInGTR', 'OtherIDs',
+                          'SubmitterCategories', 'VariationID']
+
+DOWNLOADS = {
+    'Homo_sapiens.gene_info': [
+        '#tax_id\tGeneID\tSymbol\tLocusTag\tSynonyms\tdbXrefs\tchromosome\tmap_location\tdescription\ttype_of_gene\t'
+        'Symbol_from_nomenclature_authority\tFull_name_from_nomenclature_authority\tNomenclature_status\t'
+        'Other_designations\tModification_date\tFeature_type',
+        '9606\t675\tBRCA2\t-\tBRCC2|FACD|FANCD1\tMIM:600185\t13\t13q13.1\tBRCA2 DNA repair associated\tprotein-coding\t'
+        'BRCA2\tBRCA2 DNA repair associated\tO\tbreast cancer type 2 susceptibility protein\t20240101\t-',
+        '9606\t672\tBRCA1\t-\tBRCAI|FANCS\tMIM:113705\t17\t17q21.31\tBRCA1 DNA repair associated\tprotein-coding\t'
+        'BRCA1\tBRCA1 DNA repair associated\tO\tbreast cancer type 1 susceptibility protein\t20240101\t-',
+    ],
+    'gene2pubmed.gz': ['#tax_id\tGeneID\tPubMed_ID', '9606\t675\t9528852', '9606\t675\t10486320', '9606\t672\t7545954'],
+    'mim2gene_medgen': ['#MIM number\tGeneID\ttype\tSource\tMedGenCUI\tComment', '600185\t675\tgene\t-\tC1412344\t-'],
+    'variant_summary.txt': [
+        '#' + '\t'.join(VARIANT_SUMMARY_HEADER),
+        '\t'.join(['15041', 'single nucleotide variant', 'NM_000059.3(BRCA2):c.68-7T>A', '675', 'BRCA2', 'HGNC:1101',
+                   'Benign', '0', '-', '81002858', '-', 'RCV000031217', 'MedGen:C0677776', 'Hereditary cancer',
+                   'germline', 'germline', 'GRCh38', 'NC_000013.11', '13', '32316455', '32316455', 'T', 'A', '13q13.1',
+                   'reviewed by expert panel', '9', '-', 'N', '-', '3', '2']),
+    ],
+    'hgvs4variation.txt': [
+        '#Please note: expressions are per VariationID',
+        '#Symbol\tGeneID\tVariationID\tAlleleID\tType\tAssembly\tNucleotideExpression\tNucleotideChange\t'
+        'ProteinExpression\tProteinChange\tUsedForNaming\tSubmitted\tOnRefSeqGene',
+        'BRCA2\t675\t2\t15041\tcoding\t-\tNM_000059.3:c.68-7T>A\tc.68-7T>A\t-\t-\tYes\tYes\tNo',
+        'BRCA2\t675\t2\t15041\tgenomic\tGRCh38\tNC_000013.11:g.32316455T>A\tg.32316455T>A\t-\t-\tNo\tNo\tNo',
+    ],
+    'var_citations.txt': ['#AlleleID\tVariationID\trs\tnsv\tcitation_source\tcitation_id',
+                          '15041\t2\t81002858\t-\tPubMed\t20613862',
+                          '15041\t2\t81002858\t-\tPubMedCentral\t3110945',
+                          '15041\t2\t81002858\t-\tPubMedCentral\t4000000'],
+    'PMC-ids.csv.gz': ['Journal Title,ISSN,eISSN,Year,Volume,Issue,Page,DOI,PMCID,PMID,Manuscript Id,Release Date',
+                       '"Breast Cancer Res, Treat",0167-6806,1573-7217,2004,1,1,1,10.1000/a,PMC3110945,15371902,,live',
+                       'Nucleic Acids Res,0305-1048,1362-4962,2001,29,1,1,10.1093/nar/29.1.1,PMC29783,11125038,,live',
+                       'Nucleic Acids Res,0305-1048,1362-4962,2001,29,1,2,,PMC17000,,,live'],
+    'molecular_consequences.txt': ['#HGVS\tSO_id\tConsequence', 'NM_000059.3:c.68-7T>A\tSO:0001627\tintron variant'],
+    'NAMES.RRF': ['#CUI|name|source|SUPPRESS|',
+                  'C0006142|Malignant neoplasm of breast|SNOMEDCT_US|N|',
+                  'C1458155|Breast carcinoma in situ|SNOMEDCT_US|N|'],
+    'MGDEF.RRF': ['#CUI|DEF|source|SUPPRESS|',
+                  'C0006142|A primary or metastatic malignant neoplasm involving the breast.|NCI|N|'],
+    'MGREL.RRF': ['#CUI1|AUI1|STYPE1|REL|CUI2|AUI2|RELA|RUI|SAB|SL|SUPPRESS|',
+                  'C0006142|A1|SCUI|CHD|C1458155|A2|isa|R1|SNOMEDCT_US|SNOMEDCT_US|N|'],
+    'MGCONSO.RRF': ['#CUI|TS|STT|ISPREF|AUI|SAUI|SCUI|SDUI|SAB|TTY|CODE|STR|SUPPRESS|',
+                    'C0006142|P|PF|Y|A1||254837009||SNOMEDCT_US|PT|254837009|Malignant neoplasm of breast|N|',
+                    'C0006142|S|PF|Y|A3||D001943||MSH|MH|D001943|Breast Neoplasms|N|'],
+    'medgen_pubmed_lnk.txt': ['#UID|CUI|NAME|PMID|',
+                              '9092|C0006142|Malignant neoplasm of breast|123|',
+                              '9092|C0006142|Malignant neoplasm of breast|456|'],
+}
+
+class SQLiteBackendTestCase(TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.tmpdir = tempfile.mkdtemp()
+        downloads = os.path.join(cls.tmpdir, 'downloads')
+        os.mkdir(downloads)
+        for filename, lines in DOWNLOADS.items():
+            opener = gzip.open if filename.endswith('.gz') else open
+            with opener(os.path.join(downloads, filename), 'w') as out:
+                out.write('\n'.join(lines) + '\n')
+
+        cls.path = os.path.join(cls.tmpdir, 'medgen.sqlite')
+        cls.loaded = load_directory(cls.path, downloads)
+
+        cls.settings = dict((option, config.get('DEFAULT', option)) for option in ('backend', 'sqlite_path'))
+        config.set('DEFAULT', 'backend', 'sqlite')
+        config.set('DEFAULT', 'sqlite_path', cls.path)
+
+    @classmethod
+    def tearDownClass(cls):
+        for option, value in cls.settings.items():
+            config.set('DEFAULT', option, value)
+        shutil.rmtree(cls.tmpdir)
+
+    def test_translate(self):
+        assert_that(translate("select * from log where message like 'rows %%' and idx = %s", [1]),
+                    is_(("select * from log where message like 'rows %' and idx = ?", (1,))))
+        assert_that(translate("select * from log where message like 'rows %'"),
+                    is_(("select * from log where message like 'rows %'", ())))
+        assert_that(translate("insert ignore into t (a) values (%(a)s)", {'a': 1})[0],
+                    is_("insert or ignore into t (a) values (:a)"))
+        assert_that(translate("insert into t (a,b) values (%s,%s) on duplicate key update b=values(b)", [1, 2])[0],
+                    is_("insert into t (a,b) values (?,?) on conflict do update set b=excluded.b"))
+
+    def test_translate_before_sqlite_3_35(self):
+        on_conflict_update, sqlite.ON_CONFLICT_UPDATE = sqlite.ON_CONFLICT_UPDATE, False
+        try:
+            assert_that(sqlite._on_duplicate(sqlite._REWRITES[1][0].match(
+                        "insert into t (a,b) values (%s,%s) on duplicate key update a=values(a), b=values(b)")),
+                        is_("insert or replace into t (a,b) values (%s,%s)"))
+            assert_that(calling(sqlite._on_duplicate).with_args(sqlite._REWRITES[1][0].match(
+                        "insert into t (a,b) values (%s,%s) on duplicate key update b=greatest(b, values(b))")),
+                        raises(ValueError))
+        finally:
+            sqlite.ON_CONFLICT_UPDATE = on_conflict_update
+
+    def test_ping_missing_database(self):
+        db = SQLData(config_section='gene', sqlite_path=os.path.join(self.tmpdir, 'missing.sqlite'))
+        assert_that(db.ping(), is_(False))
+
+    def test_unreachable_database(self):
+        # the epoch probe fails and stays unknown, the lookup raises the connection error
+        config.set('DEFAULT', 'sqlite_path', os.path.join(self.tmpdir, 'missing.sqlite'))
+        try:
+            db = GeneDB()
+            assert_that(calling(db.get_gene_name).with_args(672), raises(ConnectError))
+            assert_that(dataset_epoch(db), is_(None))
+        finally:
+            config.set('DEFAULT', 'sqlite_path', self.path)
+
+    def test_loaded(self):
+        assert_that(self.loaded, has_entries({'gene_info': 2, 'gene2pubmed': 3, 'variant_summary': 1,
+                                              'clinvar_hgvs': 2, 'medgen_uid': 1}))
+
+    def test_gene(self):
+        db = GeneDB()
+        assert_that([row['PMID'] for row in db.gene2pubmed(675)], contains_inanyorder(9528852, 10486320))
+        assert_that(db.get_gene_id_for_gene_name_many(['brca2', 'BRCA1']), is_({'brca2': 675, 'BRCA1': 672}))
+        assert_that(db.get_gene_id_for_gene_name_many([u'brca2', u'BRC\xc51']), is_({u'brca2': 675, u'BRC\xc51': None}))
+        instances, shared._instances = shared._instances, {}
+        try:
+            assert_that(Gene.ids_many([u'brca2', 672, u'BRC\xc51']), is_([675, 672, None]))
+            config.set('gene', 'symbol_index', 'true')
+            assert_that([gene.id for gene in Gene.resolve_many([u'Brca2', u'BRC\xc51'])], is_([675, None]))
+        finally:
+            config.set('gene', 'symbol_index', 'false')
+            shared._instances = instances
+        index = get_gene_symbol_index(db)
+        assert_that(get_gene_symbol_index(db) is index, is_(True))
+        assert_that(index.gene_synonyms('fancd1'), is_(db.get_gene_synonyms('FANCD1')))
+        assert_that(db.get_gene_synonyms('fancd1'), is_(db.get_gene_synonyms('FANCD1')))
+        assert_that(cache_stats()['gene.GeneDB._gene_synonyms']['hits'], greater_than(0))
+        assert_that(db.gene2mim(675, fields='MIM')[0]['MIM'], is_(600185))
+        assert_that(db.get_gene_info(675, fields='Nomen_status'), is_({'Nomen_status': 'O'}))
+
+    def test_clinvar(self):
+        db = ClinVarDB()
+        assert_that(db.clinvar_ids('nm_000059.3:c.68-7T>A'), is_([2]))
+        assert_that(db.clinvar_ids('NM_000059.3:c.68-7T>A', 'RCVaccession'), is_(['RCV000031217']))
+        assert_that(db.variant_summary('NM_000059.3:c.68-7T>A')[0]['AlleleID'], is_(15041))
+        assert_that([len(rows) for _, rows in db.variant_summary_many([u'nm_000059.3:c.68-7T>A', u'NM_000059.3:c.68-7T>\xc5'])],
+                    is_([1, 0]))
+        assert_that(db.molecular_consequences('NM_000059.3:c.68-7T>A', fields='Consequence')[0]['Consequence'],
+                    is_('intron variant'))
+
+    def test_bloom_filters(self):
+        config.set('DEFAULT', 'bloom_filters', 'true')
+        try:
+            db = ClinVarDB()
+            get_key_filter(db, 'clinvar_hgvs', lambda db: db.iter_list('select hgvs_text from clinvar_hgvs', 'hgvs_text'),
+                           wait=True)
+            assert_that(db.clinvar_ids_many(['NM_000059.3:c.68-7T>A', 'NM_000059.3:c.1A>G']),
+                        is_([('NM_000059.3:c.68-7T>A', [2]), ('NM_000059.3:c.1A>G', [])]))
+        finally:
+            config.set('DEFAULT', 'bloom_filters', 'false')
+
+    def test_significance_matrix(self):
+        db = ClinVarDB()
+        expected = {675: [{'ClinicalSignificance': 'Benign', 'cnt_variants': 1}], 672: []}
+        # SQL, then the same answers from the matrix
+        for significance_matrix in ('false', 'true'):
+            if significance_matrix == 'true' and not have_numpy():
+                raise SkipTest('numpy is not installed')
+            config.set('clinvar', 'significance_matrix', significance_matrix)
+            try:
+                assert_that(db.significance_matrix() is not None, is_(significance_matrix == 'true'))
+                assert_that(db.gene_to_clinical_significance_type_frequency_many([675, 672]), is_(expected))
+                assert_that(db.genes_with_clinical_significance('benign'), is_([675]))
+                assert_that(db.clinical_significance_totals(), is_({'Benign': 1}))
+            finally:
+                config.set('clinvar', 'significance_matrix', 'false')
+        assert_that(len(get_significance_matrix(db)), is_(1))
+
+    def test_gene_panel(self):
+        # the API's shared instances must be created with the sqlite settings
+        instances, shared._instances = shared._instances, {}
+        try:
+            panel = annotate_gene_panel(['brca2', 672, 'NOTAGENE'],
+                                        facets=['info', 'synonyms', 'pubmed', 'mim', 'clinical_significance'])
+        finally:
+            shared._instances = instances
+        assert_that(panel.keys(), is_(['brca2', 672, 'NOTAGENE']))
+        assert_that(panel['brca2']['GeneID'], is_(675))
+        assert_that(panel['brca2']['info']['Nomen_status'], is_('O'))
+        assert_that(panel['brca2']['synonyms'], is_(['BRCA2', 'BRCC2', 'FACD', 'FANCD1']))
+        assert_that([row['PMID'] for row in panel['brca2']['pubmed']], contains_inanyorder(9528852, 10486320))
+        assert_that(panel['brca2']['clinical_significance'], is_([{'ClinicalSignificance': 'Benign', 'cnt_variants': 1}]))
+        assert_that(panel[672]['Symbol'], is_('BRCA1'))
+        assert_that(panel[672]['mim'], is_([]))
+        assert_that(panel['NOTAGENE'], is_({'GeneID': None, 'Symbol': 'NOTAGENE', 'info': None, 'synonyms': [],
+                                            'pubmed': [], 'mim': [], 'clinical_significance': []}))
+
+    def test_crosswalk(self):
+        crosswalk = IdentifierCrosswalk(GeneDB(), MedGenDB(), ClinVarDB())
+        assert_that(crosswalk.path('rs', 'Symbol'), is_(['rs', 'AlleleID', 'GeneID', 'Symbol']))
+        assert_that(crosswalk.convert([600185, 'MIM:113705'], 'MIM', 'Symbol'), is_({600185: ['BRCA2'], 'MIM:113705': []}))
+        assert_that(crosswalk.convert(['brca2', 'BRCA1'], 'Symbol', 'GeneID'), is_({'brca2': [675], 'BRCA1': [672]}))
+        assert_that(crosswalk.convert([u'brca2', u'BRC\xc51'], 'Symbol', 'GeneID'), is_({u'brca2': [675], u'BRC\xc51': []}))
+        assert_that(crosswalk.convert(['rs81002858'], 'rs', 'VariationID')['rs81002858'], is_([2]))
+        assert_that(crosswalk.convert([2], 'VariationID', 'Symbol')[2], is_(['BRCA2']))
+        assert_that(crosswalk.convert(['RCV000031217'], 'RCV', 'AlleleID')['RCV000031217'], is_([15041]))
+        assert_that(crosswalk.convert(['C0006142'], 'CUI', 'MedGenUID')['C0006142'], is_([9092]))
+        assert_that(crosswalk.convert([675], 'GeneID', 'CUI', via=['MIM'])[675], is_(['C1412344']))
+
+    def test_concepts_many(self):
+        concepts = MedGenDB().concepts_many(['C0006142', 9092, 'C1458155', 'C9999999', 'bogus'])
+        assert_that(concepts['C0006142']['name']['name'], is_('Malignant neoplasm of breast'))
+        assert_that(concepts[9092]['definition']['SAB'], is_('NCI'))
+        assert_that([row['SourceVocab'] for row in concepts[9092]['sources']], contains_inanyorder('SNOMEDCT_US', 'MSH'))
+        assert_that(concepts['C1458155'], has_entries({'CUI': 'C1458155', 'definition': None, 'sources': []}))
+        assert_that(concepts['C9999999'], is_({'CUI': 'C9999999', 'name': None, 'definition': None, 'sources': []}))
+        assert_that(concepts['bogus']['CUI'], is_(None))
+
+    def test_pmcid_to_pmid(self):
+        server = start_idconv_server()
+        idconv_url = config.get('pubmed', 'idconv_url')
+        config.set('pubmed', 'idconv_url', 'http://127.0.0.1:%d/' % server.server_port)
+        instances, shared._instances = shared._instances, {}
+        try:
+            assert_that(self.loaded['pmc_ids'], is_(3))
+            db = PubMedDB()
+            assert_that(db.pmcid_to_pmid(['PMC3110945', 29783, 'bogus'], fallback=False),
+                        is_({'PMC3110945': 15371902, 29783: 11125038, 'bogus': None}))
+            # only the PMCIDs without a PMID in pmc_ids are sent to the converter, in one request
+            assert_that(db.pmcid_to_pmid(['PMC29783', 'PMC17000', '4000000']),
+                        is_({'PMC29783': 11125038, 'PMC17000': None, '4000000': None}))
+            assert_that(server.requests, is_([['PMC17000', 'PMC4000000']]))
+            # only a missing table falls back to the converter, other errors are raised
+            for sql, missing in (('select PMCID from no_such_table', True), ('select no_such_column from pmc_ids', False)):
+                try:
+                    db.fetchall(sql)
+                except Exception as e:
+                    assert_that(missing_table(e), is_(missing))
+                else:
+                    self.fail('%s did not fail' % sql)
+            config.set('pubmed', 'pmc_ids_map', 'false')
+            assert_that(db.pmcid_to_pmid(['pmc3110945'], fallback=False), is_({'pmc3110945': 15371902}))
+            assert_that(ClinvarPubmeds('NM_000059.3:c.68-7T>A'), is_(set([20613862, 15371902])))
+        finally:
+            shared._instances = instances
+            config.set('pubmed', 'pmc_ids_map', 'true')
+            config.set('pubmed', 'idconv_url', idconv_url)
+            server.shutdown()
+            server.server_close()
+
+    def test_medgen_views(self):
+        db = MedGenDB()
+        assert_that(db.medgen2umls(9092), is_('C0006142'))
+        assert_that(db.umls2medgen_many(['C0006142']), is_({'C0006142': 9092}))
+        assert_that([row['SourceVocab'] for row in db.concept_sources('C0006142')],
+                    contains_inanyorder('SNOMEDCT_US', 'MSH'))
+        assert_that([row['DiseaseID'] for row in db.disease_subtypes('C0006142')], is_(['C1458155']))
+        assert_that([row['DiseaseID'] for row in db.disease_parents('C1458155')], is_(['C0006142']))
+        assert_that(db.disease_descendants('C0006142'), is_(['C1458155']))
+        assert_that(db.disease_ancestors('C1458155', max_depth=1), is_(['C0006142']))
+        assert_that(db.concept_neighbors_many(['C0006142', 'C1458155'], rel='CHD'),
+                    is_({'C0006142': ['C1458155'], 'C1458155': ['C0006142']}))
+        assert_that([row['REL'] for row in db.concept_relations('C1458155', fields=('REL',))], is_(['CHD']))
+
+    def test_writes(self):
+        db = SQLData(config_section='medgen')
+        db.execute('create table if not exists scratch (id integer primary key, name text)')
+        db.insert_many('scratch', [{'id': n, 'name': 'row %d' % n} for n in range(100)])
+        db.upsert_many('scratch', [{'id': 1, 'name': 'updated'}])
+        assert_that(db.fetchID('select name as ID from scratch where id = %s', args=[1]), is_('updated'))
+        assert_that(len(list(db.join_keys(range(50, 150), 'select S.id from scratch S join {keys} K on K.join_key = S.id'))),
+                    is_(50))
+        assert_that(db.dataset_epoch()[0] is not None, is_(True))